@@ -1,9 +1,175 @@
 from django.contrib import admin
-from .models import UserProfile, FoodLog, CardioLog
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
+from django.contrib.auth.models import User
+from django.utils import formats, timezone
+from django.utils.functional import cached_property
+from django.utils.text import capfirst
+from datetime import date, timedelta
+from .models import UserProfile, FoodLog, CardioLog, WeightMeasurement
+from .pagination import EstimatedCountPaginator
 
 # Register your models here.
 
 
+# large-table mode for the log changelists
+#
+# the stock changelist lists every user in the sidebar, counts the table
+# with COUNT(*) and builds the date drill-down from SELECT DISTINCT over
+# every row; these replacements each cost an index lookup or two
+
+
+def is_integer(value):
+    # str.isdigit is also true of digits int() rejects, like '²'
+    return str(value).isascii() and str(value).isdigit()
+
+
+class UserAutocompleteFilter(admin.SimpleListFilter):
+    """
+    Filter by user, picked with the admin's user autocomplete
+    """
+    title = 'user'
+    parameter_name = 'user'
+    template = 'admin/calorie_tracker/user_autocomplete_filter.html'
+
+    def __init__(self, request, params, model, model_admin):
+        super().__init__(request, params, model, model_admin)
+        self.opts = model._meta
+
+    def lookups(self, request, model_admin):
+        # only the selected user, never the whole table
+        if self.value() and is_integer(self.value()):
+            return User.objects.filter(pk=self.value()).values_list(
+                'pk', 'username')
+        return []
+
+    def has_output(self):
+        return True
+
+    def queryset(self, request, queryset):
+        if not self.value():
+            return queryset
+        if not is_integer(self.value()):
+            raise IncorrectLookupParameters(
+                f"Invalid user id {self.value()!r}")
+        return queryset.filter(user_id=int(self.value()))
+        return queryset
+
+
+class LargeTableChangeList(ChangeList):
+
+    def get_results(self, request):
+        # only while listing; actions get full rows from get_queryset
+        self.queryset = self.queryset.only(*self.model_admin.list_only)
+        super().get_results(request)
+
+    @cached_property
+    def index_date_hierarchy(self):
+        """
+        Date drill-down links spanning the filtered rows' first and last
+        dates, read from the date_hierarchy index
+
+        Shaped like the stock date_hierarchy tag's context; periods in the
+        span with no rows are listed too.
+        """
+        field = self.date_hierarchy
+        lookups = [
+            self.params.get(f'{field}__{part}')
+            for part in ('year', 'month', 'day')
+        ]
+        if not all(value is None or is_integer(value) for value in lookups):
+            return {'show': False}
+        year, month, day = [value and int(value) for value in lookups]
+        # a day or month alone has no place in the drill-down
+        if (day and not month) or (month and not year):
+            return {'show': False}
+
+        def link(**parts):
+            return self.get_query_string(
+                {f'{field}__{part}': value for part, value in parts.items()},
+                [f'{field}__'])
+
+        if day:
+            current = date(year, month, day)
+            return {
+                'show': True,
+                'back': {
+                    'link': link(year=year, month=month),
+                    'title': capfirst(
+                        formats.date_format(current, 'YEAR_MONTH_FORMAT')),
+                },
+                'choices': [{'title': capfirst(
+                    formats.date_format(current, 'MONTH_DAY_FORMAT'))}],
+            }
+
+        # two ordered lookups, each one index seek; a single query with
+        # both MIN and MAX is a full index scan on SQLite
+        values = self.queryset.values_list(field, flat=True)
+        span = [
+            values.order_by(field).first(),
+            values.order_by(f'-{field}').first(),
+        ]
+        if span[0] is None:
+            return {'show': False}
+        first, last = [
+            timezone.localtime(value).date() if timezone.is_aware(value)
+            else value.date()
+            for value in span
+        ]
+
+        if month:
+            return {
+                'show': True,
+                'back': {'link': link(year=year), 'title': str(year)},
+                'choices': [
+                    {
+                        'link': link(year=year, month=month, day=current.day),
+                        'title': capfirst(formats.date_format(
+                            current, 'MONTH_DAY_FORMAT')),
+                    }
+                    for current in (
+                        first + timedelta(days=offset)
+                        for offset in range((last - first).days + 1))
+                ],
+            }
+        if year:
+            return {
+                'show': True,
+                'back': {'link': link(), 'title': 'All dates'},
+                'choices': [
+                    {
+                        'link': link(year=year, month=current),
+                        'title': capfirst(formats.date_format(
+                            date(year, current, 1), 'YEAR_MONTH_FORMAT')),
+                    }
+                    for current in range(first.month, last.month + 1)
+                ],
+            }
+        return {
+            'show': True,
+            'back': None,
+            'choices': [
+                {'link': link(year=current), 'title': str(current)}
+                for current in range(first.year, last.year + 1)
+            ],
+        }
+
+
+class LargeTableAdminMixin:
+    """
+    Changelist settings for tables too large to count or scan
+
+    list_only names the columns the changelist loads.
+    """
+    list_only = ()
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    change_list_template = 'admin/calorie_tracker/large_change_list.html'
+
+    def get_changelist(self, request, **kwargs):
+        return LargeTableChangeList
+
+
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
     list_display = [
@@ -20,13 +186,36 @@ class UserProfileAdmin(admin.ModelAdmin):
         return super().get_queryset(request).select_related('user')
 
 
+@admin.register(WeightMeasurement)
+class WeightMeasurementAdmin(admin.ModelAdmin):
+    list_display = ['user', 'measured_at', 'weight']
+    list_filter = ['measured_at', UserAutocompleteFilter]
+    search_fields = ['user__username']
+    autocomplete_fields = ['user']
+    ordering = ['-measured_at']
+    date_hierarchy = 'measured_at'
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user')
+
+    def has_change_permission(self, request, obj=None):
+        # append-only, weigh-ins can be added, viewed and deleted
+        if obj is not None:
+            return False
+        return super().has_change_permission(request, obj)
+
+
 @admin.register(FoodLog)
-class FoodLogAdmin(admin.ModelAdmin):
+class FoodLogAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = [
         'user', 'timestamp', 'meal_name', 'meal_type', 'calories_in'
     ]
-    list_filter = ['meal_type', 'timestamp', 'user']
-    search_fields = ['meal_name', 'user__username', 'cardio_desc']
+    list_only = [
+        'user__username', 'timestamp', 'meal_name', 'meal_type',
+        'calories_in'
+    ]
+    list_filter = ['meal_type', 'timestamp', UserAutocompleteFilter]
+    search_fields = ['meal_name', 'user__username', 'meal_desc']
     readonly_fields = ['timestamp']
     ordering = ['-timestamp']
     date_hierarchy = 'timestamp'
@@ -46,11 +235,15 @@ class FoodLogAdmin(admin.ModelAdmin):
 
 
 @admin.register(CardioLog)
-class CardioLogAdmin(admin.ModelAdmin):
+class CardioLogAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = [
         'user', 'timestamp', 'cardio_name', 'duration', 'calories_out'
     ]
-    list_filter = ['timestamp', 'user']
+    list_only = [
+        'user__username', 'timestamp', 'cardio_name', 'duration',
+        'calories_out'
+    ]
+    list_filter = ['timestamp', UserAutocompleteFilter]
     search_fields = ['cardio_name', 'user__username', 'cardio_desc']
     readonly_fields = ['timestamp']
     ordering = ['-timestamp']
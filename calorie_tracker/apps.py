@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CalorieTrackerConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'calorie_tracker'
+
+    def ready(self):
+        # connects the query timer to every new database connection
+        from . import timing  # noqa: F401
@@ -0,0 +1,149 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from bisect import bisect_left, insort
+from collections import OrderedDict, deque
+from statistics import median
+import threading
+from .models import FoodLog
+from .summary_cache import data_version
+
+# per-user meal_name prefix index for the food form's autocomplete
+#
+# each user's distinct meal names are kept in a sorted list searched with
+# bisect, in a process-local LRU. An index is built from the user's logs on
+# first use and is only trusted while the user's data version is unchanged,
+# so changes made by other workers trigger a rebuild. New logs saved in
+# this process are added in place instead.
+
+MAX_USERS = 500
+RECENT_CALORIES = 5  # typical calories is the median of the latest few
+SUGGESTIONS = 8
+
+
+class MealEntry:
+    __slots__ = ('meal_name', 'meal_type', 'calories', 'count', 'last_used')
+
+    def __init__(self, meal_name):
+        self.meal_name = meal_name
+        self.meal_type = None
+        self.calories = deque(maxlen=RECENT_CALORIES)
+        self.count = 0
+        self.last_used = None
+
+    def as_dict(self):
+        return {
+            'meal_name': self.meal_name,
+            'meal_type': self.meal_type,
+            'calories_in': median(self.calories),
+        }
+
+
+class MealIndex:
+
+    def __init__(self, version):
+        self.version = version
+        self.keys = []
+        self.entries = {}
+
+    def add(self, meal_name, meal_type, calories_in, timestamp):
+        key = meal_name.strip().casefold()
+        if not key:
+            return
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = MealEntry(meal_name.strip())
+            insort(self.keys, key)
+        entry.count += 1
+        if entry.last_used is None or timestamp >= entry.last_used:
+            entry.meal_name = meal_name.strip()
+            entry.meal_type = meal_type
+            entry.last_used = timestamp
+        entry.calories.append(calories_in)
+
+    def search(self, prefix, limit=SUGGESTIONS):
+        """
+        Entries whose name starts with prefix, most used first
+        """
+        prefix = prefix.strip().casefold()
+        if not prefix:
+            return []
+        matches = []
+        for key in self.keys[bisect_left(self.keys, prefix):]:
+            if not key.startswith(prefix):
+                break
+            matches.append(self.entries[key])
+        matches.sort(key=lambda entry: (-entry.count, entry.meal_name))
+        return [entry.as_dict() for entry in matches[:limit]]
+
+    @classmethod
+    def build(cls, user_id, version):
+        index = cls(version)
+        rows = (
+            FoodLog.objects
+            .filter(user_id=user_id)
+            .order_by('timestamp')
+            .values_list('meal_name', 'meal_type', 'calories_in', 'timestamp')
+        )
+        for row in rows.iterator(chunk_size=2000):
+            index.add(*row)
+        return index
+
+
+_indexes = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_index(user_id):
+    version = data_version(user_id)
+    with _lock:
+        index = _indexes.get(user_id)
+        if index is not None and index.version == version:
+            _indexes.move_to_end(user_id)
+            return index
+
+    index = MealIndex.build(user_id, version)
+    with _lock:
+        _indexes[user_id] = index
+        _indexes.move_to_end(user_id)
+        while len(_indexes) > MAX_USERS:
+            _indexes.popitem(last=False)
+    return index
+
+
+def suggest_meals(user_id, prefix, limit=SUGGESTIONS):
+    if not prefix.strip():
+        return []
+    return get_index(user_id).search(prefix, limit)
+
+
+def _record_log(log):
+    with _lock:
+        index = _indexes.get(log.user_id)
+        if index is None:
+            return
+        index.add(log.meal_name, log.meal_type, log.calories_in, log.timestamp)
+        # the save bumped the data version; this index already includes it
+        # (a change another worker made in the same instant goes unnoticed
+        # until the user's next change)
+        index.version = data_version(log.user_id)
+
+
+def _forget_user(user_id):
+    with _lock:
+        _indexes.pop(user_id, None)
+
+
+@receiver(post_save, sender=FoodLog)
+def update_meal_index(sender, instance, created, **kwargs):
+    # runs after the rollup receivers, so after their version bump commits
+    if created:
+        transaction.on_commit(lambda: _record_log(instance))
+    else:
+        # a renamed or re-typed meal is simplest to rebuild
+        _forget_user(instance.user_id)
+
+
+@receiver(post_delete, sender=FoodLog)
+def forget_deleted_meal(sender, instance, **kwargs):
+    _forget_user(instance.user_id)
@@ -0,0 +1,251 @@
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+import django
+import platform
+import time
+from . import services, tables
+from .models import FoodLog, CardioLog, user_timezone
+from .summary_cache import bump_data_version
+from .windows import calendar_week_window, rolling_week_window
+
+# timing harness behind the bench_summaries command
+#
+# every summary function is timed through its uncached implementation, so
+# the numbers are the real aggregate cost, and every view twice: cold,
+# with the user's data version bumped before each request, and warm
+
+FUNCTIONS = {
+    'tables.get_day_summary': (
+        lambda user: tables.get_day_summary.uncached(user)),
+    'tables.get_week_summary[calendar]': (
+        lambda user: tables.get_week_summary.uncached(
+            user, calendar_week_window()[0])),
+    'tables.get_week_summary[rolling]': (
+        lambda user: tables.get_week_summary.uncached(
+            user, rolling_week_window()[0])),
+    'tables.get_year_summary': (
+        lambda user: tables.get_year_summary.uncached(user)),
+    'tables.get_dashboard_summary': (
+        lambda user: tables.get_dashboard_summary.uncached(user)),
+    'services.net_calorie_day': (
+        lambda user: services.net_calorie_day.uncached(user)),
+    'services.net_calorie_rolling_week': (
+        lambda user: services.net_calorie_rolling_week.uncached(user)),
+    'services.net_calorie_calendar_week': (
+        lambda user: services.net_calorie_calendar_week.uncached(user)),
+    'services.net_calorie_month': (
+        lambda user: services.net_calorie_month.uncached(user)),
+    'services.net_calorie_year': (
+        lambda user: services.net_calorie_year.uncached(user)),
+    'FoodLog.total_food_rolling_week': FoodLog.total_food_rolling_week,
+    'FoodLog.total_food_year': FoodLog.total_food_year,
+    'FoodLog.monthly_food_breakdown': FoodLog.monthly_food_breakdown,
+    'CardioLog.total_burn_rolling_week': CardioLog.total_burn_rolling_week,
+    'CardioLog.monthly_burn_breakdown': CardioLog.monthly_burn_breakdown,
+    'FoodLog.logs_for_year': (
+        lambda user: list(FoodLog.logs_for_year(user, None))),
+}
+
+VIEWS = [
+    'calorie_tracker:home',
+    'calorie_tracker:calendar_week_summary',
+    'calorie_tracker:rolling_week_summary',
+    'calorie_tracker:food_day',
+    'calorie_tracker:food_rolling_week',
+    'calorie_tracker:food_history',
+    'calorie_tracker:cardio_rolling_week',
+    'calorie_tracker:cardio_history',
+]
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(fraction * len(ordered)))
+    return ordered[index]
+
+
+def _summarise(timings, queries):
+    return {
+        'runs': len(timings),
+        'queries': max(queries),
+        'p50_ms': round(percentile(timings, 0.5), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'max_ms': round(max(timings), 3),
+    }
+
+
+def _measure(call, repeat, before=None):
+    timings, queries = [], []
+    for _ in range(repeat):
+        if before:
+            before()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            call()
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(len(captured))
+    return _summarise(timings, queries)
+
+
+def log_counts(model):
+    rows = model.objects.values_list('user').annotate(Count('id')).order_by()
+    return dict(rows)
+
+
+def pick_users(users):
+    """
+    The users with the fewest, median and most logs, keyed by tier
+    """
+    food, cardio = log_counts(FoodLog), log_counts(CardioLog)
+    ranked = sorted(
+        users,
+        key=lambda user: (food.get(user.pk, 0) + cardio.get(user.pk, 0),
+                          user.pk)
+    )
+    if not ranked:
+        return {}
+    return {
+        'small': ranked[0],
+        'median': ranked[len(ranked) // 2],
+        'heavy': ranked[-1],
+    }
+
+
+def _client_for(user):
+    host = next(
+        (host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'),
+        'localhost'
+    )
+    client = Client(HTTP_HOST=host)
+    client.force_login(user)
+    return client
+
+
+def bench_user(user, repeat):
+    results = {
+        'user': user.username,
+        'food_logs': FoodLog.objects.filter(user=user).count(),
+        'cardio_logs': CardioLog.objects.filter(user=user).count(),
+        'functions': {},
+        'views': {},
+    }
+    with timezone.override(user_timezone(user)):
+        for name, func in FUNCTIONS.items():
+            results['functions'][name] = _measure(
+                lambda: func(user), repeat)
+
+    client = _client_for(user)
+    secure = getattr(settings, 'SECURE_SSL_REDIRECT', False)
+    for name in VIEWS:
+        url = reverse(name)
+
+        def get():
+            response = client.get(url, secure=secure)
+            if response.status_code != 200:
+                raise RuntimeError(f"{url} returned {response.status_code}")
+
+        results['views'][f'{name}[cold]'] = _measure(
+            get, repeat, before=lambda: bump_data_version(user.pk))
+        results['views'][f'{name}[warm]'] = _measure(get, repeat)
+    return results
+
+
+def run_benchmarks(users, repeat):
+    return {
+        'started': timezone.now().isoformat(),
+        'repeat': repeat,
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'cache': settings.CACHES['default']['BACKEND'],
+        },
+        'users': {
+            tier: bench_user(user, repeat)
+            for tier, user in pick_users(users).items()
+        },
+    }
+
+
+# admin changelists, large-table mode against the stock ModelAdmin
+
+
+def stock_admin(model_admin):
+    """
+    The same changelist as a plain ModelAdmin, without large-table mode
+    """
+    attrs = {
+        name: getattr(model_admin, name)
+        for name in (
+            'list_display', 'search_fields', 'ordering', 'date_hierarchy')
+    }
+    attrs['list_filter'] = [
+        name if isinstance(name, str) else 'user'
+        for name in model_admin.list_filter
+    ]
+    stock = type(f'Stock{type(model_admin).__name__}', (admin.ModelAdmin,),
+                 attrs)
+    return stock(model_admin.model, model_admin.admin_site)
+
+
+def admin_pages(model, user):
+    """
+    Query strings for the changelist pages benchmarked, by name
+    """
+    latest = model.objects.filter(user=user).order_by('-timestamp').first()
+    pages = {'first page': {}, 'user filter': {'user': user.pk}}
+    if latest:
+        pages['year drill-down'] = {'timestamp__year': latest.timestamp.year}
+        pages['user filter, page 5'] = {'user': user.pk, 'p': 5}
+    return pages
+
+
+def bench_admin(user, repeat):
+    factory = RequestFactory()
+    staff = User(username='bench', is_staff=True, is_superuser=True)
+    results = {}
+    for model in (FoodLog, CardioLog):
+        model_admin = admin.site._registry[model]
+        name = model.__name__
+        results[name] = {
+            'rows': model.objects.count(),
+            'changelists': {},
+        }
+        for variant, instance in (
+                ('large', model_admin), ('stock', stock_admin(model_admin))):
+            for page, params in admin_pages(model, user).items():
+                def get():
+                    request = factory.get('/admin/', params)
+                    request.user = staff
+                    response = instance.changelist_view(request)
+                    if response.status_code != 200:
+                        raise RuntimeError(
+                            f"{name} {page} returned "
+                            f"{response.status_code}")
+                    response.render()
+
+                results[name]['changelists'][f'{variant}[{page}]'] = (
+                    _measure(get, repeat))
+    return results
+
+
+def run_admin_benchmarks(repeat):
+    users = pick_users(User.objects.order_by('pk'))
+    return {
+        'started': timezone.now().isoformat(),
+        'repeat': repeat,
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+        },
+        'users': User.objects.count(),
+        'models': bench_admin(users['heavy'], repeat) if users else {},
+    }
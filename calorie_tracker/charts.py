@@ -0,0 +1,74 @@
+import numpy as np
+from .models import WeightMeasurement
+
+# chart series, downsampled on the server
+#
+# long histories are reduced with Largest-Triangle-Three-Buckets: the
+# first and last points are kept, the rest are split into equal buckets,
+# and from each bucket the point forming the largest triangle with the
+# previously kept point and the next bucket's mean is kept. Peaks and dips
+# survive, unlike with plain averaging or striding.
+
+DEFAULT_POINTS = 300
+MAX_POINTS = 2000
+
+
+def lttb(x, y, threshold):
+    """
+    Indices of at most `threshold` points of (x, y) chosen by LTTB
+
+    x must be increasing. Series no longer than threshold, or thresholds
+    below 3, keep every point.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # threshold - 2 buckets between the first and last points
+    every = (n - 2) / (threshold - 2)
+    bounds = (np.arange(threshold - 1) * every).astype(np.intp) + 1
+    bounds[-1] = n - 1
+    starts, ends = bounds[:-1], bounds[1:]
+    sizes = ends - starts
+    mean_x = np.add.reduceat(x[:n - 1], starts) / sizes
+    mean_y = np.add.reduceat(y[:n - 1], starts) / sizes
+    # each bucket looks ahead to the next one's mean, the last to the end
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+
+    selected = np.empty(threshold, np.intp)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i, (start, end) in enumerate(zip(starts, ends)):
+        area = np.abs(
+            (x[a] - next_x[i]) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (next_y[i] - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def weight_series(user, points=DEFAULT_POINTS, start=None, end=None):
+    """
+    The user's weigh-ins as (measured_at, weight) pairs, downsampled
+
+    start and end are optional inclusive datetimes.
+    Returns (pairs, the number of weigh-ins before downsampling).
+    """
+    measurements = WeightMeasurement.objects.filter(user=user)
+    if start:
+        measurements = measurements.filter(measured_at__gte=start)
+    if end:
+        measurements = measurements.filter(measured_at__lte=end)
+    rows = list(
+        measurements
+        .order_by('measured_at', 'id')
+        .values_list('measured_at', 'weight')
+    )
+
+    x = np.fromiter(
+        (measured_at.timestamp() for measured_at, _ in rows),
+        float, len(rows))
+    y = np.fromiter((weight for _, weight in rows), float, len(rows))
+    return [rows[i] for i in lttb(x, y, points)], len(rows)
@@ -0,0 +1,236 @@
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from datetime import date
+import gzip
+import hashlib
+import json
+from .exporters import EXPORT_KINDS
+from .models import DailyTotals, archiving
+from .summary_cache import bump_data_version
+
+# retention compaction of old FoodLog/CardioLog rows
+#
+# a user's logs before a cutoff are moved, a batch of whole days at a
+# time, into gzipped NDJSON archives in the default storage (MEDIA_ROOT),
+# one file per batch. The batch's DailyTotals rows are reconciled and
+# flagged compacted, so every total and summary still reads the same,
+# then the raw rows are deleted. Each batch commits on its own, so an
+# interrupted run just continues from the oldest day still holding logs.
+# A batch's archive is written first, named after its days and the logs
+# it holds, so a retry of the same batch overwrites it and no other batch
+# ever does; logs back-dated onto compacted days go into archives of
+# their own. restore_archives puts the rows back.
+
+ARCHIVE_DIR = 'log_archives'
+BATCH_DAYS = 31
+# exported columns plus what a restore needs to recreate the same rows
+ARCHIVE_FIELDS = {
+    kind: (model, ['id', 'local_date', *fields])
+    for kind, (model, fields) in EXPORT_KINDS.items()
+}
+
+
+def archive_dir(user_id):
+    return f'{ARCHIVE_DIR}/{user_id}'
+
+
+def archive_name(user_id, first_day, last_day, records):
+    logs = sorted((record['kind'], record.get('id')) for record in records)
+    digest = hashlib.md5(
+        json.dumps(logs).encode(), usedforsecurity=False).hexdigest()[:12]
+    return (
+        f'{archive_dir(user_id)}/{first_day}_{last_day}_{digest}.ndjson.gz')
+
+
+def list_archives(user_id):
+    """
+    Get (first day, last day, name) for each of a user's archives, oldest
+    first
+    """
+    directory = archive_dir(user_id)
+    if not default_storage.exists(directory):
+        return []
+    archives = []
+    for filename in default_storage.listdir(directory)[1]:
+        if not filename.endswith('.ndjson.gz'):
+            continue
+        first, last, _ = filename.removesuffix('.ndjson.gz').split('_')
+        archives.append((
+            date.fromisoformat(first),
+            date.fromisoformat(last),
+            f'{directory}/{filename}',
+        ))
+    return sorted(archives)
+
+
+def days_to_compact(user_id, cutoff, limit=BATCH_DAYS):
+    """
+    The oldest `limit` days before cutoff that still have raw logs
+    """
+    days = set()
+    for model, _ in ARCHIVE_FIELDS.values():
+        days.update(
+            model.objects
+            .filter(user_id=user_id, local_date__lt=cutoff)
+            .order_by('local_date')
+            .values_list('local_date', flat=True)
+            .distinct()[:limit]
+        )
+    return sorted(days)[:limit]
+
+
+def _write_archive(user_id, days, records):
+    lines = ''.join(
+        json.dumps(record, cls=DjangoJSONEncoder) + '\n' for record in records)
+    name = archive_name(user_id, days[0], days[-1], records)
+    # only a retry of this same batch can have written this name; storage
+    # would save under a new name rather than overwrite
+    default_storage.delete(name)
+    default_storage.save(name, ContentFile(gzip.compress(lines.encode())))
+    return name
+
+
+def compact_days(user_id, days):
+    """
+    Archive and delete a user's logs on some days, keeping their totals
+
+    Returns the number of logs archived.
+    """
+    with transaction.atomic():
+        # the logs are locked before the totals, the order a log's save
+        # takes them in
+        records = []
+        archived = {}
+        for kind, (model, fields) in ARCHIVE_FIELDS.items():
+            rows = list(
+                model.objects
+                .select_for_update()
+                .filter(user_id=user_id, local_date__in=days)
+                .order_by('timestamp', 'id')
+                .values(*fields)
+            )
+            records += [{'kind': kind, **row} for row in rows]
+            archived[model] = [row['id'] for row in rows]
+        if not records:
+            return 0
+        _write_archive(user_id, days, records)
+
+        expected = DailyTotals.expected_for_user(user_id, days)
+        rows = {
+            row.date: row
+            for row in DailyTotals.objects.select_for_update().filter(
+                user_id=user_id, date__in=days)
+        }
+        to_update = []
+        for day, values in expected.items():
+            row = rows.get(day)
+            if row is None:
+                row = DailyTotals.objects.create(
+                    user_id=user_id, date=day, **values)
+            elif row.compacted:
+                # archived before, and already counting any later logs
+                continue
+            for field, value in values.items():
+                setattr(row, field, value)
+            row.compacted = True
+            to_update.append(row)
+        DailyTotals.objects.bulk_update(
+            to_update, [*DailyTotals.ROLLUP_COLUMNS, 'compacted'])
+
+        # only what went into the archive; a log added to these days since
+        # stays, counted, for a later batch to archive
+        token = archiving.set(True)
+        try:
+            for model, pks in archived.items():
+                model.objects.filter(pk__in=pks).delete()
+        finally:
+            archiving.reset(token)
+        bump_data_version(user_id)
+    return len(records)
+
+
+def compact_user(user_id, cutoff, batch_days=BATCH_DAYS):
+    """
+    Compact all of a user's logs before cutoff, one batch at a time
+
+    Yields (days, logs archived) after each committed batch.
+    """
+    while True:
+        days = days_to_compact(user_id, cutoff, batch_days)
+        if not days:
+            return
+        yield days, compact_days(user_id, days)
+
+
+def _archives_to_restore(user_id, start_date, end_date):
+    """
+    The archives overlapping a date range, plus any overlapping those
+
+    A compacted day's logs can be spread over several archives, e.g. when
+    logs were back-dated onto it, and its totals only match its logs once
+    all of them are back.
+    """
+    archives = list_archives(user_id)
+    selected = [
+        archive for archive in archives
+        if not (start_date and archive[1] < start_date)
+        and not (end_date and archive[0] > end_date)
+    ]
+    while selected:
+        first = min(archive[0] for archive in selected)
+        last = max(archive[1] for archive in selected)
+        overlapping = [
+            archive for archive in archives
+            if archive[1] >= first and archive[0] <= last
+        ]
+        if len(overlapping) == len(selected):
+            break
+        selected = overlapping
+    return selected
+
+
+def restore_archives(user_id, start_date=None, end_date=None):
+    """
+    Put back the logs of a user's archives overlapping a date range
+
+    Whole archives are restored and then deleted; their days stop being
+    compacted. Returns the number of logs restored.
+    """
+    restored = 0
+    for first, last, name in _archives_to_restore(
+            user_id, start_date, end_date):
+        with default_storage.open(name) as archive:
+            records = [
+                json.loads(line)
+                for line in gzip.decompress(archive.read()).splitlines()
+            ]
+
+        with transaction.atomic():
+            for kind, (model, fields) in ARCHIVE_FIELDS.items():
+                records_of_kind = [
+                    record for record in records if record['kind'] == kind]
+                # a retry, or the archive of an interrupted batch, holds
+                # logs that are already there
+                existing = set(model.objects.filter(
+                    pk__in=[record['id'] for record in records_of_kind]
+                ).values_list('pk', flat=True))
+                logs = [
+                    model(user_id=user_id, **{
+                        field: model._meta.get_field(field).to_python(
+                            record[field])
+                        for field in fields
+                    })
+                    for record in records_of_kind
+                    if record['id'] not in existing
+                ]
+                # the totals already count them
+                model.objects.bulk_create(logs, batch_size=2000)
+                restored += len(logs)
+            DailyTotals.objects.filter(
+                user_id=user_id, date__range=(first, last)
+            ).update(compacted=False)
+            bump_data_version(user_id)
+        default_storage.delete(name)
+    return restored
@@ -0,0 +1,89 @@
+import csv
+import json
+from .models import FoodLog, CardioLog
+from .pagination import keyset_filter
+
+# streaming export of a user's FoodLog/CardioLog history
+#
+# rows are read in keyset batches on (timestamp, id), each batch its own
+# short query, so no cursor or connection is held open while a slow client
+# downloads; columns match the importer so exports can be re-imported
+
+EXPORT_KINDS = {
+    'food': (
+        FoodLog,
+        ['timestamp', 'meal_name', 'meal_desc', 'meal_type', 'calories_in'],
+    ),
+    'cardio': (
+        CardioLog,
+        ['timestamp', 'cardio_name', 'cardio_desc', 'duration',
+         'calories_out'],
+    ),
+}
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+CHUNK_SIZE = 2000
+
+
+def iter_log_rows(kind, user, start_date=None, end_date=None,
+                  chunk_size=CHUNK_SIZE):
+    """
+    Yield value tuples for a user's logs, oldest first
+
+    start_date and end_date are optional inclusive local dates.
+    """
+    model, fields = EXPORT_KINDS[kind]
+    logs = model.objects.filter(user=user)
+    if start_date:
+        logs = logs.filter(local_date__gte=start_date)
+    if end_date:
+        logs = logs.filter(local_date__lte=end_date)
+
+    logs = logs.order_by('timestamp', 'id').values_list('id', *fields)
+    last = None
+    while True:
+        batch = logs
+        if last is not None:
+            batch = logs.filter(keyset_filter(*last))
+        rows = list(batch[:chunk_size].iterator(chunk_size=chunk_size))
+        for row in rows:
+            yield row[1:]
+        if len(rows) < chunk_size:
+            return
+        last = (rows[-1][1], rows[-1][0])
+
+
+class _Echo:
+    """
+    File-like object whose write() just returns the line, for csv.writer
+    """
+
+    def write(self, value):
+        return value
+
+
+def _format_value(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def stream_csv(kind, rows):
+    _, fields = EXPORT_KINDS[kind]
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([_format_value(value) for value in row])
+
+
+def stream_ndjson(kind, rows):
+    _, fields = EXPORT_KINDS[kind]
+    for row in rows:
+        record = dict(zip(fields, map(_format_value, row)))
+        yield json.dumps(record) + '\n'
+
+
+STREAMERS = {
+    'csv': stream_csv,
+    'ndjson': stream_ndjson,
+}
@@ -1,8 +1,13 @@
 from .models import UserProfile, FoodLog, CardioLog
 from django import forms
+import zoneinfo
+
+TIMEZONE_CHOICES = [(tz, tz) for tz in sorted(zoneinfo.available_timezones())]
 
 
 class ProfileForm(forms.ModelForm):
+    timezone = forms.ChoiceField(choices=TIMEZONE_CHOICES, initial='UTC')
+
     class Meta:
         model = UserProfile
         fields = [
@@ -10,6 +15,7 @@ class ProfileForm(forms.ModelForm):
             "weight",
             "weight_goal",
             "cardio_goal",
+            "timezone",
         ]
 
 
@@ -38,3 +44,15 @@ class CardioForm(forms.ModelForm):
             "duration",
             "calories_out",
         ]
+
+
+# form for uploading a history file to import
+
+
+class ImportForm(forms.Form):
+    kind = forms.ChoiceField(choices=[
+        ("food", "Food logs"),
+        ("cardio", "Cardio logs"),
+    ])
+    file = forms.FileField(
+        help_text="CSV with a header row, a JSON array or NDJSON")
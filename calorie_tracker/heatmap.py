@@ -0,0 +1,69 @@
+from array import array
+from datetime import timedelta
+import base64
+import sys
+from .models import DailyTotals
+from .summary_cache import cached_summary
+
+# dense per-day series for the multi-year calendar heatmap
+#
+# every day in the span gets a slot, indexed by its offset from the start
+# date, in float32 arrays sent as base64 of their little-endian bytes, so
+# five years of a series is about 10kB of JSON instead of a keyed object
+# per day. Clients decode with e.g. new Float32Array(bytes.buffer).
+
+MAX_DAYS = 5 * 366
+SERIES = ('calories_in', 'calories_out', 'net')
+ENCODING = 'base64-float32le'
+
+
+def encode_series(values):
+    """
+    Base64 of a float32 array's little-endian bytes
+    """
+    if sys.byteorder == 'big':
+        values = array('f', values)
+        values.byteswap()
+    return base64.b64encode(values.tobytes()).decode('ascii')
+
+
+def decode_series(data):
+    values = array('f', base64.b64decode(data))
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+@cached_summary
+def get_heatmap(user, start_date, end_date):
+    """
+    Per-day food, cardio and net calories between two dates (inclusive)
+
+    Read from the DailyTotals rollup in one query; days without logs are
+    zero.
+
+    :return:
+    dict containing
+    start, days, encoding, and each of SERIES encoded
+    """
+    days = (end_date - start_date).days + 1
+    series = {name: array('f', bytes(4 * days)) for name in SERIES}
+
+    rows = (
+        DailyTotals.objects
+        .filter(user=user, date__range=(start_date, end_date))
+        .values_list('date', 'calories_in', 'calories_out')
+    )
+    for day, calories_in, calories_out in rows:
+        offset = (day - start_date).days
+        series['calories_in'][offset] = calories_in
+        series['calories_out'][offset] = calories_out
+        series['net'][offset] = calories_in - calories_out
+
+    return {
+        'start': start_date,
+        'end': start_date + timedelta(days=days - 1),
+        'days': days,
+        'encoding': ENCODING,
+        **{name: encode_series(values) for name, values in series.items()},
+    }
@@ -0,0 +1,254 @@
+from django import forms
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+from datetime import datetime, timezone as dt_timezone
+import csv
+import hashlib
+import io
+import json
+from .forms import FoodForm, CardioForm
+from .models import (
+    FoodLog,
+    CardioLog,
+    DailyTotals,
+    FrequentMeal,
+    user_timezone
+)
+from .summary_cache import bump_data_version
+
+# streaming import of FoodLog/CardioLog history from CSV, JSON or NDJSON
+#
+# rows are validated with the same field rules as FoodForm/CardioForm,
+# de-duplicated by a content hash and inserted with bulk_create, one
+# transaction per batch, so memory stays flat whatever the file size
+
+IMPORT_KINDS = {
+    'food': (FoodLog, FoodForm),
+    'cardio': (CardioLog, CardioForm),
+}
+FORMATS = ['csv', 'json', 'ndjson']
+BATCH_SIZE = 1000
+JSON_CHUNK_SIZE = 64 * 1024
+MAX_REPORTED_ERRORS = 20
+
+
+def guess_format(filename):
+    name = filename.lower()
+    if name.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    if name.endswith('.json'):
+        return 'json'
+    return 'csv'
+
+
+def _text_stream(fileobj):
+    if isinstance(fileobj, io.TextIOBase):
+        return fileobj
+    return io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+
+
+def _iter_json_array(stream):
+    """
+    Yield the items of a top-level JSON array without loading it whole
+    """
+    decoder = json.JSONDecoder()
+    buffer, started, eof = '', False, False
+    while True:
+        buffer = buffer.lstrip(', \t\r\n' if started else ' \t\r\n')
+        if not buffer:
+            if eof:
+                raise ValueError("Unexpected end of JSON array")
+            chunk = stream.read(JSON_CHUNK_SIZE)
+            buffer, eof = chunk, not chunk
+            continue
+
+        if not started:
+            if buffer[0] != '[':
+                raise ValueError("Expected a JSON array of records")
+            buffer, started = buffer[1:], True
+            continue
+        if buffer[0] == ']':
+            return
+
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            # the next item is split across reads
+            if eof:
+                raise
+            chunk = stream.read(JSON_CHUNK_SIZE)
+            buffer, eof = buffer + chunk, not chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+
+
+def iter_records(fileobj, fmt):
+    """
+    Yield (line_number, dict) pairs from an open file, one record at a time
+    """
+    stream = _text_stream(fileobj)
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == 'ndjson':
+        for line_number, line in enumerate(stream, start=1):
+            if line.strip():
+                yield line_number, json.loads(line)
+    elif fmt == 'json':
+        for index, record in enumerate(_iter_json_array(stream), start=1):
+            yield index, record
+    else:
+        raise ValueError(f"Unknown import format {fmt}")
+
+
+class RecordCleaner:
+    """
+    Validate raw records with a log form's field rules
+
+    Each value goes through the form field's clean() and then the model
+    field's validators and choices, the checks a bound ModelForm would run,
+    without building a form or model instance per row.
+    """
+    timestamp_field = forms.DateTimeField()
+
+    def __init__(self, model, form_class):
+        self.fields = [
+            (name, field, model._meta.get_field(name))
+            for name, field in form_class.base_fields.items()
+        ]
+
+    def clean(self, record):
+        if not isinstance(record, dict):
+            raise ValidationError({'__all__': ["Expected an object"]})
+
+        errors = {}
+        cleaned = {}
+        try:
+            cleaned['timestamp'] = self.timestamp_field.clean(
+                record.get('timestamp'))
+        except ValidationError as e:
+            errors['timestamp'] = e.messages
+
+        for name, form_field, model_field in self.fields:
+            try:
+                value = form_field.clean(record.get(name))
+                cleaned[name] = model_field.clean(value, None)
+            except ValidationError as e:
+                errors[name] = e.messages
+
+        if errors:
+            raise ValidationError(errors)
+        return cleaned
+
+
+def content_hash(values):
+    """
+    Hash a log's content; timestamps compare in UTC, as the database
+    returns them, and a NULL description matches a blank one
+    """
+    values = {
+        name: (
+            value.astimezone(dt_timezone.utc).isoformat()
+            if isinstance(value, datetime) else
+            '' if value is None else value
+        )
+        for name, value in values.items()
+    }
+    payload = json.dumps(values, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode(), usedforsecurity=False).digest()
+
+
+class LogImporter:
+    """
+    Import one kind of log for a user from a stream of records
+    """
+
+    def __init__(self, user, kind, batch_size=BATCH_SIZE):
+        self.user = user
+        self.model, form_class = IMPORT_KINDS[kind]
+        self.cleaner = RecordCleaner(self.model, form_class)
+        self.hash_fields = ['timestamp', *form_class.base_fields]
+        self.batch_size = batch_size
+        self.tzinfo = user_timezone(user)
+        self.stats = {
+            'read': 0,
+            'created': 0,
+            'duplicates': 0,
+            'invalid': 0,
+            'errors': [],
+        }
+
+    def run(self, records):
+        batch = {}
+        # naive timestamps in the file are read as the user's local time
+        with timezone.override(self.tzinfo):
+            for line_number, record in records:
+                self.stats['read'] += 1
+                try:
+                    values = self.cleaner.clean(record)
+                except ValidationError as e:
+                    self._invalid(line_number, e.message_dict)
+                    continue
+
+                digest = content_hash(values)
+                if digest in batch:
+                    self.stats['duplicates'] += 1
+                    continue
+                batch[digest] = values
+                if len(batch) >= self.batch_size:
+                    self._flush(batch)
+                    batch = {}
+        self._flush(batch)
+        return self.stats
+
+    def _invalid(self, line_number, errors):
+        self.stats['invalid'] += 1
+        if len(self.stats['errors']) < MAX_REPORTED_ERRORS:
+            self.stats['errors'].append((line_number, errors))
+
+    def _existing_hashes(self, batch):
+        timestamps = {values['timestamp'] for values in batch.values()}
+        rows = (
+            self.model.objects
+            .filter(user=self.user, timestamp__in=timestamps)
+            .values(*self.hash_fields)
+        )
+        return {content_hash(row) for row in rows}
+
+    def _flush(self, batch):
+        if not batch:
+            return
+        with transaction.atomic():
+            # earlier batches are already inserted, so this also catches
+            # duplicates spread across the file
+            existing = self._existing_hashes(batch)
+            logs = []
+            for digest, values in batch.items():
+                if digest in existing:
+                    self.stats['duplicates'] += 1
+                    continue
+                log = self.model(user=self.user, **values)
+                log.local_date = timezone.localtime(
+                    log.timestamp, self.tzinfo).date()
+                logs.append(log)
+
+            self.model.objects.bulk_create(logs)
+            self._update_rollup(logs)
+        self.stats['created'] += len(logs)
+
+    def _update_rollup(self, logs):
+        # bulk_create skips the DailyTotals and FrequentMeal signal handlers
+        if self.model is FoodLog:
+            FrequentMeal.record(
+                self.user.pk, [log._meal_entry() for log in logs])
+        DailyTotals.add_bulk_created(self.user.pk, logs)
+        if logs:
+            bump_data_version(self.user.pk)
+
+
+def import_logs(user, kind, fileobj, fmt, batch_size=BATCH_SIZE):
+    importer = LogImporter(user, kind, batch_size)
+    return importer.run(iter_records(fileobj, fmt))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from calorie_tracker.benchmarks import run_admin_benchmarks
+import json
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the FoodLog and CardioLog admin changelists in large-table "
+        "mode and as stock ModelAdmins, and write the results as JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help="Runs per changelist page"
+        )
+        parser.add_argument(
+            '--output', default='bench_admin.json',
+            help="Where to write the JSON results, '-' for stdout"
+        )
+
+    def handle(self, *args, **options):
+        results = run_admin_benchmarks(options['repeat'])
+
+        for model, result in results['models'].items():
+            self.stderr.write(
+                f"{model}: {result['rows']} rows, {results['users']} users")
+            for name, stats in result['changelists'].items():
+                self.stderr.write(
+                    f"  {name:<36} {stats['queries']:>3} queries  "
+                    f"p50 {stats['p50_ms']:>9.2f}ms  "
+                    f"p95 {stats['p95_ms']:>9.2f}ms"
+                )
+
+        payload = json.dumps(results, indent=2)
+        if options['output'] == '-':
+            self.stdout.write(payload)
+        else:
+            with open(options['output'], 'w') as output:
+                output.write(payload + '\n')
+            self.stderr.write(self.style.SUCCESS(
+                f"Wrote results to {options['output']}"))
@@ -0,0 +1,56 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from calorie_tracker.benchmarks import run_benchmarks
+import json
+
+
+class Command(BaseCommand):
+    help = (
+        "Time every summary function and view for the small, median and "
+        "heavy users, and write the results as JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            action='append',
+            dest='usernames',
+            help="Only consider this username (can be repeated)"
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help="Runs per function or view"
+        )
+        parser.add_argument(
+            '--output', default='bench_summaries.json',
+            help="Where to write the JSON results, '-' for stdout"
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('pk')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+
+        results = run_benchmarks(users, options['repeat'])
+
+        for tier, result in results['users'].items():
+            self.stderr.write(
+                f"{tier}: {result['user']} ({result['food_logs']} food, "
+                f"{result['cardio_logs']} cardio logs)"
+            )
+            timings = {**result['functions'], **result['views']}
+            for name, stats in timings.items():
+                self.stderr.write(
+                    f"  {name:<52} {stats['queries']:>3} queries  "
+                    f"p50 {stats['p50_ms']:>8.2f}ms  "
+                    f"p95 {stats['p95_ms']:>8.2f}ms"
+                )
+
+        payload = json.dumps(results, indent=2)
+        if options['output'] == '-':
+            self.stdout.write(payload)
+        else:
+            with open(options['output'], 'w') as output:
+                output.write(payload + '\n')
+            self.stderr.write(self.style.SUCCESS(
+                f"Wrote results to {options['output']}"))
@@ -0,0 +1,59 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from datetime import date, timedelta
+from calorie_tracker.compaction import BATCH_DAYS, compact_user
+
+
+class Command(BaseCommand):
+    help = (
+        "Archive FoodLog and CardioLog rows older than a cutoff into "
+        "gzipped NDJSON under MEDIA_ROOT, keeping their daily totals"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than', type=float, default=3,
+            help="Compact logs more than this many years old (default 3)"
+        )
+        parser.add_argument(
+            '--before', type=date.fromisoformat,
+            help="Compact logs before this day (YYYY-MM-DD) instead"
+        )
+        parser.add_argument(
+            '--user',
+            action='append',
+            dest='usernames',
+            help="Only compact this username (can be repeated)"
+        )
+        parser.add_argument(
+            '--batch-days', type=int, default=BATCH_DAYS,
+            help="Days archived per batch and transaction"
+        )
+
+    def handle(self, *args, **options):
+        cutoff = options['before'] or (
+            timezone.localdate()
+            - timedelta(days=round(365 * options['older_than']))
+        )
+        if options['batch_days'] < 1:
+            raise CommandError("--batch-days must be at least 1")
+
+        users = User.objects.order_by('pk')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+
+        total = 0
+        for user_id, username in users.values_list('pk', 'username'):
+            archived = 0
+            for days, count in compact_user(
+                    user_id, cutoff, options['batch_days']):
+                archived += count
+                self.stdout.write(
+                    f"{username}: archived {count} logs "
+                    f"from {days[0]} to {days[-1]}"
+                )
+            total += archived
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {total} logs from before {cutoff}"))
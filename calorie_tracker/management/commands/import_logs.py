@@ -0,0 +1,57 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from calorie_tracker.importers import (
+    IMPORT_KINDS,
+    FORMATS,
+    BATCH_SIZE,
+    guess_format,
+    import_logs
+)
+import time
+
+
+class Command(BaseCommand):
+    help = "Import a user's FoodLog or CardioLog history from a file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('path')
+        parser.add_argument(
+            '--kind', choices=sorted(IMPORT_KINDS), default='food')
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help="File format, guessed from the extension by default"
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help="Rows per bulk insert and transaction"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['username']}")
+
+        fmt = options['format'] or guess_format(options['path'])
+        started = time.perf_counter()
+        with open(options['path'], 'rb') as fileobj:
+            stats = import_logs(
+                user,
+                options['kind'],
+                fileobj,
+                fmt,
+                batch_size=options['batch_size']
+            )
+        elapsed = time.perf_counter() - started
+
+        for line_number, errors in stats['errors']:
+            self.stderr.write(f"line {line_number}: {errors}")
+
+        rate = stats['read'] / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Read {stats['read']} rows in {elapsed:.1f}s "
+            f"({rate:.0f} rows/s): {stats['created']} created, "
+            f"{stats['duplicates']} duplicates, {stats['invalid']} invalid"
+        ))
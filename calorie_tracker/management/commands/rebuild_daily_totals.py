@@ -0,0 +1,46 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from calorie_tracker.models import DailyTotals
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the DailyTotals rollup from raw FoodLog and CardioLog "
+        "rows, fixing any drift"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            action='append',
+            dest='usernames',
+            help="Only reconcile this username (can be repeated)"
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Report drift without writing anything"
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('pk')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+
+        totals = [0, 0, 0]
+        for user_id, username in users.values_list('pk', 'username'):
+            counts = DailyTotals.reconcile_user(
+                user_id, dry_run=options['dry_run'])
+            if any(counts):
+                self.stdout.write(
+                    f"{username}: {counts[0]} created, "
+                    f"{counts[1]} updated, {counts[2]} deleted"
+                )
+            totals = [a + b for a, b in zip(totals, counts)]
+
+        verb = "Would fix" if options['dry_run'] else "Fixed"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {sum(totals)} rows "
+            f"({totals[0]} created, {totals[1]} updated, "
+            f"{totals[2]} deleted)"
+        ))
@@ -0,0 +1,30 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from datetime import date
+from calorie_tracker.compaction import restore_archives
+
+
+class Command(BaseCommand):
+    help = "Restore a user's logs archived by compact_logs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument(
+            '--start', type=date.fromisoformat,
+            help="Only archives reaching this day or later (YYYY-MM-DD)"
+        )
+        parser.add_argument(
+            '--end', type=date.fromisoformat,
+            help="Only archives starting on or before this day (YYYY-MM-DD)"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user {options['username']}")
+
+        restored = restore_archives(
+            user.pk, options['start'], options['end'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Restored {restored} logs for {user.username}"))
@@ -0,0 +1,84 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from datetime import date
+from calorie_tracker.seeding import PROFILES, BATCH_SIZE, seed_user
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed users with deterministic synthetic FoodLog and CardioLog "
+        "history, for benchmarks"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=3,
+            help="Number of users to create"
+        )
+        parser.add_argument(
+            '--years', type=float, default=1,
+            help="Years of history per user"
+        )
+        parser.add_argument(
+            '--profile',
+            action='append',
+            choices=sorted(PROFILES),
+            dest='profiles',
+            help=(
+                "Logging density, cycled across the users "
+                "(can be repeated, default light, median and heavy)"
+            )
+        )
+        parser.add_argument(
+            '--prefix', default='seed',
+            help="Username prefix; users are named <prefix>-<profile>-<n>"
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--end', type=date.fromisoformat,
+            help="Last day of history (YYYY-MM-DD), default today"
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help="Logs per bulk insert and transaction"
+        )
+
+    def handle(self, *args, **options):
+        profiles = options['profiles'] or ['light', 'median', 'heavy']
+        end_date = options['end'] or timezone.localdate()
+
+        usernames = [
+            (f"{options['prefix']}-{profiles[i % len(profiles)]}-{i}",
+             profiles[i % len(profiles)])
+            for i in range(options['users'])
+        ]
+        taken = User.objects.filter(
+            username__in=[name for name, _ in usernames])
+        if taken.exists():
+            raise CommandError(
+                f"Users already exist: "
+                f"{', '.join(taken.values_list('username', flat=True))}"
+            )
+
+        total = 0
+        started = time.perf_counter()
+        for username, profile in usernames:
+            user = User.objects.create_user(username)
+            created = seed_user(
+                user,
+                profile,
+                options['years'],
+                end_date,
+                seed=options['seed'],
+                batch_size=options['batch_size']
+            )
+            self.stdout.write(f"{username}: {created} logs")
+            total += created
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {total} logs for {len(usernames)} users "
+            f"in {elapsed:.1f}s"
+        ))
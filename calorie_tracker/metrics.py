@@ -0,0 +1,147 @@
+from django.core.cache import cache
+from bisect import bisect_left
+import os
+import socket
+import threading
+import time
+
+# in-process request histograms, merged across workers through the cache
+#
+# ServerTimingMiddleware observes every request's latency and query count
+# per URL name into fixed buckets. Each worker periodically writes its
+# cumulative counts to the cache, and the metrics view sums the snapshots
+# of all live workers into the Prometheus text format. With a per-process
+# cache (locmem) only the serving worker's numbers are visible.
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+WORKERS_KEY = 'calorie_tracker:metrics:workers'
+SNAPSHOT_KEY = 'calorie_tracker:metrics:worker:{worker}'
+FLUSH_INTERVAL = 10  # seconds between a worker's cache writes
+SNAPSHOT_TIMEOUT = 60 * 60  # a worker silent this long is dropped
+
+HISTOGRAMS = {
+    'latency': (
+        'calorie_tracker_request_duration_seconds',
+        'Request latency by URL name',
+        LATENCY_BUCKETS,
+    ),
+    'queries': (
+        'calorie_tracker_request_queries',
+        'Database queries per request by URL name',
+        QUERY_BUCKETS,
+    ),
+}
+
+
+class Histogram:
+    """
+    Cumulative counts in fixed buckets, plus a +Inf bucket
+    """
+
+    def __init__(self, buckets, counts=None, total=0):
+        self.buckets = buckets
+        self.counts = counts or [0] * (len(buckets) + 1)
+        self.total = total
+
+    def observe(self, value):
+        # Prometheus buckets are "less than or equal"
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+
+    def merge(self, counts, total):
+        self.counts = [a + b for a, b in zip(self.counts, counts)]
+        self.total += total
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self.worker = f'{socket.gethostname()}:{os.getpid()}'
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.last_flush = 0
+
+    def observe(self, url_name, seconds, queries):
+        values = {'latency': seconds, 'queries': queries}
+        with self.lock:
+            for kind, value in values.items():
+                key = (kind, url_name)
+                if key not in self.histograms:
+                    self.histograms[key] = Histogram(HISTOGRAMS[kind][2])
+                self.histograms[key].observe(value)
+            due = time.monotonic() - self.last_flush >= FLUSH_INTERVAL
+        if due:
+            self.flush()
+
+    def snapshot(self):
+        with self.lock:
+            return [
+                (kind, url_name, list(hist.counts), hist.total)
+                for (kind, url_name), hist in self.histograms.items()
+            ]
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        cache.set(
+            SNAPSHOT_KEY.format(worker=self.worker),
+            self.snapshot(),
+            SNAPSHOT_TIMEOUT
+        )
+        # racy read-modify-write, but every worker re-adds itself on each
+        # flush, so a lost update only hides a worker until its next one
+        workers = cache.get(WORKERS_KEY) or {}
+        now = time.time()
+        workers = {
+            worker: seen for worker, seen in workers.items()
+            if now - seen < SNAPSHOT_TIMEOUT
+        }
+        workers[self.worker] = now
+        cache.set(WORKERS_KEY, workers, None)
+
+
+registry = MetricsRegistry()
+
+
+def merged_histograms():
+    """
+    Sum the cached snapshots of every live worker, this one included
+    """
+    registry.flush()
+    workers = cache.get(WORKERS_KEY) or {}
+    snapshots = cache.get_many(
+        [SNAPSHOT_KEY.format(worker=worker) for worker in workers])
+
+    merged = {}
+    for snapshot in snapshots.values():
+        for kind, url_name, counts, total in snapshot:
+            key = (kind, url_name)
+            if key not in merged:
+                merged[key] = Histogram(HISTOGRAMS[kind][2])
+            merged[key].merge(counts, total)
+    return merged
+
+
+def _label(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"')
+
+
+def render_prometheus(histograms):
+    lines = []
+    for kind, (metric, help_text, buckets) in HISTOGRAMS.items():
+        lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} histogram']
+        for (hist_kind, url_name), hist in sorted(
+                histograms.items(), key=lambda item: str(item[0])):
+            if hist_kind != kind:
+                continue
+            label = f'url_name="{_label(url_name)}"'
+            cumulative = 0
+            for bound, count in zip([*buckets, '+Inf'], hist.counts):
+                cumulative += count
+                lines.append(
+                    f'{metric}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{{label}}} {hist.total}')
+            lines.append(f'{metric}_count{{{label}}} {cumulative}')
+    return '\n'.join(lines) + '\n'
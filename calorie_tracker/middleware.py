@@ -0,0 +1,141 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+import logging
+import time
+from .metrics import registry
+from .models import get_profile, user_timezone
+from .timing import RequestTimings, current_timings
+
+logger = logging.getLogger('calorie_tracker.timing')
+
+
+class UserTimezoneMiddleware:
+    """
+    Activate the logged-in user's timezone and set request.profile
+
+    Default dates in the log helpers and windows use timezone.localdate(),
+    so "today" follows the user's own day rather than the server's.
+    request.profile is the user's UserProfile, or None when logged out; it
+    shares the user's cached profile, so the timezone lookup and the views
+    read the profile table once per request.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        user = request.user
+        if user.is_authenticated:
+            request.profile = SimpleLazyObject(lambda: get_profile(user))
+            timezone.activate(user_timezone(user))
+        else:
+            request.profile = None
+            timezone.deactivate()
+        try:
+            return self.get_response(request)
+        finally:
+            timezone.deactivate()
+
+    async def __acall__(self, request):
+        # under ASGI, avoid hopping to a thread for the whole chain
+        user = await request.auser()
+        if user.is_authenticated:
+            # loaded up front, async views can't query lazily
+            request.profile = await sync_to_async(get_profile)(user)
+            timezone.activate(user_timezone(user))
+        else:
+            request.profile = None
+            timezone.deactivate()
+        try:
+            return await self.get_response(request)
+        finally:
+            timezone.deactivate()
+
+
+class ServerTimingMiddleware:
+    """
+    Report where each request's time went
+
+    Query count and time, view and template rendering time are sent as a
+    Server-Timing header and logged as one line per request, keyed by URL
+    name, and the latency and query count go into the metrics histograms.
+    Rendering is only timed with the TimedDjangoTemplates backend. Queries
+    on every thread serving the request are counted, see timing.py.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        return self.report(request, response, timings)
+
+    async def __acall__(self, request):
+        # so the async routes don't get pushed onto a thread under ASGI
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        return self.report(request, response, timings)
+
+    def report(self, request, response, timings):
+        timings.view_finished()
+        metrics = timings.metrics()
+        response['Server-Timing'] = ', '.join(
+            f'{name};dur={duration};desc="{desc}"'
+            for name, duration, desc in metrics
+        )
+
+        durations = {name: duration for name, duration, _ in metrics}
+        match = request.resolver_match
+        url_name = match.view_name if match else None
+        registry.observe(
+            url_name or 'unmatched',
+            durations['total'] / 1000,
+            timings.queries
+        )
+        logger.info(
+            "%s %s %s",
+            url_name,
+            response.status_code,
+            ' '.join(f'{name}={value}' for name, value in durations.items()),
+            extra={
+                'url_name': url_name,
+                'status': response.status_code,
+                'queries': timings.queries,
+                **{f'{name}_ms': value for name, value in durations.items()},
+            }
+        )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        current_timings.get().view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # the view has returned; a TemplateResponse renders after this
+        current_timings.get().view_finished()
+        return response
@@ -0,0 +1,47 @@
+from django.db import migrations
+
+# migration operations for tables too large to lock
+
+
+class AddIndexConcurrently(migrations.AddIndex):
+    """
+    Add an index without blocking writes to the table
+
+    On PostgreSQL this is django.contrib.postgres's AddIndexConcurrently,
+    CREATE INDEX CONCURRENTLY, which can't run in a transaction, so the
+    migration must set atomic = False. That module needs a PostgreSQL
+    driver to import, so it is only loaded there; other databases, e.g.
+    SQLite in development, get a plain CREATE INDEX. An index that
+    already exists is left alone.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        connection = schema_editor.connection
+        with connection.cursor() as cursor:
+            existing = connection.introspection.get_constraints(
+                cursor, model._meta.db_table)
+        if self.index.name in existing:
+            return
+        if connection.vendor != 'postgresql':
+            return super().database_forwards(
+                app_label, schema_editor, from_state, to_state)
+
+        from django.contrib.postgres.operations import (
+            AddIndexConcurrently as PostgresAddIndexConcurrently)
+        PostgresAddIndexConcurrently(
+            self.model_name, self.index
+        ).database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_backwards(
+                app_label, schema_editor, from_state, to_state)
+
+        from django.contrib.postgres.operations import (
+            AddIndexConcurrently as PostgresAddIndexConcurrently)
+        PostgresAddIndexConcurrently(
+            self.model_name, self.index
+        ).database_backwards(app_label, schema_editor, from_state, to_state)
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.1 on 2026-10-18 01:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calorie_tracker', '0008_alter_userprofile_user'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyTotals',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('breakfast', models.FloatField(default=0)),
+                ('lunch', models.FloatField(default=0)),
+                ('dinner', models.FloatField(default=0)),
+                ('snack', models.FloatField(default=0)),
+                ('calories_in', models.FloatField(default=0)),
+                ('calories_out', models.FloatField(default=0)),
+                ('food_count', models.IntegerField(default=0)),
+                ('cardio_count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_totals', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'date'), name='unique_daily_totals')],
+            },
+        ),
+    ]
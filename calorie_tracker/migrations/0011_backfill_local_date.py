@@ -0,0 +1,38 @@
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+
+BATCH_SIZE = 10000
+
+
+def backfill_local_date(apps, schema_editor):
+    """
+    Fill local_date in primary key ranges, one short transaction each
+
+    Every profile starts out on the new UTC default, so the local date is
+    the UTC date of the timestamp and each batch is a single UPDATE.
+    """
+    for model_name in ('FoodLog', 'CardioLog'):
+        model = apps.get_model('calorie_tracker', model_name)
+        bounds = model.objects.aggregate(
+            low=models.Min('pk'), high=models.Max('pk'))
+        if bounds['low'] is None:
+            continue
+        for start in range(bounds['low'], bounds['high'] + 1, BATCH_SIZE):
+            model.objects.filter(
+                pk__gte=start,
+                pk__lt=start + BATCH_SIZE,
+                local_date__isnull=True,
+            ).update(local_date=TruncDate('timestamp'))
+
+
+class Migration(migrations.Migration):
+    # batches commit on their own instead of holding one long transaction
+    atomic = False
+
+    dependencies = [
+        ('calorie_tracker', '0010_local_date'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_local_date, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.2.1 on 2026-10-18 01:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+import math
+
+# FrequentMeal.DECAY when this migration was written
+DECAY = math.log(2) / (30 * 24 * 60 * 60)
+
+
+def populate_frequent_meals(apps, schema_editor):
+    """
+    Score every (user, meal_type, meal name) from the existing food logs
+
+    The logs are streamed one user at a time, oldest first, and each
+    meal's score is kept as a running log-sum-exp, so memory is bounded by
+    one user's distinct meals rather than the whole table.
+    """
+    FoodLog = apps.get_model('calorie_tracker', 'FoodLog')
+    FrequentMeal = apps.get_model('calorie_tracker', 'FrequentMeal')
+
+    def flush(user_id, groups):
+        FrequentMeal.objects.bulk_create(
+            (
+                FrequentMeal(
+                    user_id=user_id, meal_type=meal_type, name_key=name_key,
+                    **group)
+                for (meal_type, name_key), group in groups.items()
+            ),
+            batch_size=1000,
+        )
+
+    logs = FoodLog.objects.order_by('user_id', 'timestamp', 'id').values_list(
+        'user_id', 'meal_type', 'meal_name', 'meal_desc', 'calories_in',
+        'timestamp')
+    current_user, groups = None, {}
+    for user_id, meal_type, name, desc, calories, timestamp in logs.iterator(
+            chunk_size=2000):
+        if user_id != current_user:
+            flush(current_user, groups)
+            current_user, groups = user_id, {}
+        name_key = name.strip().casefold()[:100]
+        if not name_key:
+            continue
+        weight = DECAY * timestamp.timestamp()
+        group = groups.get((meal_type, name_key))
+        if group is None:
+            group = groups[meal_type, name_key] = {'count': 0, 'score': weight}
+        else:
+            top = max(group['score'], weight)
+            group['score'] = top + math.log(
+                math.exp(group['score'] - top) + math.exp(weight - top))
+        group['count'] += 1
+        # ordered by timestamp, so the last log wins
+        group.update(
+            meal_name=name.strip(), meal_desc=desc, calories_in=calories,
+            last_used=timestamp)
+    flush(current_user, groups)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calorie_tracker', '0011_backfill_local_date'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FrequentMeal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('meal_type', models.CharField(choices=[('breakfast', 'Breakfast'), ('lunch', 'Lunch'), ('dinner', 'Dinner'), ('snack', 'Snack')], max_length=20)),
+                ('name_key', models.CharField(max_length=100)),
+                ('meal_name', models.CharField(max_length=100)),
+                ('meal_desc', models.TextField(blank=True, null=True)),
+                ('calories_in', models.FloatField()),
+                ('last_used', models.DateTimeField()),
+                ('count', models.IntegerField(default=0)),
+                ('score', models.FloatField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='frequent_meals', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'meal_type', '-score'], name='calorie_tra_user_id_0f178c_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'meal_type', 'name_key'), name='unique_frequent_meal')],
+            },
+        ),
+        migrations.RunPython(
+            populate_frequent_meals, migrations.RunPython.noop),
+    ]
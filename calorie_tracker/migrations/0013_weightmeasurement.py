@@ -0,0 +1,46 @@
+# Generated by Django 5.2.1 on 2026-10-18 02:04
+
+import django.core.validators
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def record_profile_weights(apps, schema_editor):
+    """
+    Start each user's history with the weight on their profile
+    """
+    UserProfile = apps.get_model('calorie_tracker', 'UserProfile')
+    WeightMeasurement = apps.get_model('calorie_tracker', 'WeightMeasurement')
+    WeightMeasurement.objects.bulk_create(
+        WeightMeasurement(
+            user_id=user_id, measured_at=timestamp, weight=weight)
+        for user_id, timestamp, weight in UserProfile.objects.filter(
+            weight__isnull=False).values_list('user_id', 'timestamp', 'weight')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calorie_tracker', '0012_frequentmeal'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WeightMeasurement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('measured_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('weight', models.DecimalField(decimal_places=2, max_digits=5, validators=[django.core.validators.MinValueValidator(0)])),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='weight_measurements', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'measured_at'], name='calorie_tra_user_id_59d80d_idx')],
+            },
+        ),
+        migrations.RunPython(
+            record_profile_weights, migrations.RunPython.noop),
+    ]
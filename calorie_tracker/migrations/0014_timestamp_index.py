@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-18 02:07
+
+from django.conf import settings
+from django.db import migrations, models
+from calorie_tracker.migration_operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # the log tables are large enough that a locking CREATE INDEX would
+    # block writes; building concurrently can't happen in a transaction
+    atomic = False
+
+    dependencies = [
+        ('calorie_tracker', '0013_weightmeasurement'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='cardiolog',
+            index=models.Index(fields=['timestamp'], name='calorie_tra_timesta_84afec_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='foodlog',
+            index=models.Index(fields=['timestamp'], name='calorie_tra_timesta_6c0b2a_idx'),
+        ),
+    ]
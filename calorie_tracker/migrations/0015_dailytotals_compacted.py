@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 02:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calorie_tracker', '0014_timestamp_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailytotals',
+            name='compacted',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations, models
+from calorie_tracker.migration_operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # the (user, local_date) indexes are built without locking the log
+    # tables for writes, which can't happen inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('calorie_tracker', '0015_dailytotals_compacted'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='cardiolog',
+            index=models.Index(fields=['user', 'local_date'], name='calorie_tra_user_id_a171e2_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='foodlog',
+            index=models.Index(fields=['user', 'local_date'], name='calorie_tra_user_id_e3fe32_idx'),
+        ),
+    ]
@@ -0,0 +1,80 @@
+from django.db import migrations, transaction
+from django.db.models import Count, F, Q, Sum
+
+MEAL_TYPES = ['breakfast', 'lunch', 'dinner', 'snack']
+RENAMED = {'food_total': 'calories_in', 'cardio_total': 'calories_out'}
+
+
+def populate_daily_totals(apps, schema_editor):
+    """
+    Build the DailyTotals rows from the existing logs, one user at a time
+
+    Each user's days are aggregated in the database over the (user,
+    local_date) index and written in a transaction of their own, so
+    memory is bounded by one user's days. Users who already have rows,
+    from an interrupted run or a database migrated when 0009 still filled
+    the table, are skipped.
+    """
+    FoodLog = apps.get_model('calorie_tracker', 'FoodLog')
+    CardioLog = apps.get_model('calorie_tracker', 'CardioLog')
+    DailyTotals = apps.get_model('calorie_tracker', 'DailyTotals')
+
+    user_ids = sorted({
+        *FoodLog.objects.values_list('user_id', flat=True).distinct(),
+        *CardioLog.objects.values_list('user_id', flat=True).distinct(),
+    })
+    for user_id in user_ids:
+        with transaction.atomic():
+            if DailyTotals.objects.filter(user_id=user_id).exists():
+                continue
+            food_rows = (
+                FoodLog.objects
+                .filter(user_id=user_id)
+                .values(day=F('local_date'))
+                .annotate(
+                    food_total=Sum('calories_in'),
+                    food_count=Count('id'),
+                    **{
+                        meal: Sum('calories_in', filter=Q(meal_type=meal))
+                        for meal in MEAL_TYPES
+                    }
+                )
+                .order_by()
+            )
+            cardio_rows = (
+                CardioLog.objects
+                .filter(user_id=user_id)
+                .values(day=F('local_date'))
+                .annotate(
+                    cardio_total=Sum('calories_out'),
+                    cardio_count=Count('id'))
+                .order_by()
+            )
+            totals = {}
+            for row in [*food_rows, *cardio_rows]:
+                totals.setdefault(row.pop('day'), {}).update({
+                    RENAMED.get(field, field): value or 0
+                    for field, value in row.items()
+                })
+            DailyTotals.objects.bulk_create(
+                [
+                    DailyTotals(user_id=user_id, date=day, **values)
+                    for day, values in totals.items()
+                ],
+                batch_size=1000
+            )
+
+
+class Migration(migrations.Migration):
+    # each user's rows commit on their own instead of holding one long
+    # transaction over both log tables
+    atomic = False
+
+    dependencies = [
+        ('calorie_tracker', '0016_local_date_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            populate_daily_totals, migrations.RunPython.noop),
+    ]
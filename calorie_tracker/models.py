@@ -1,15 +1,41 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, pre_save, post_delete
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
-from django.db.models import Sum
+from django.db.models import Sum, Count, F, Q, OuterRef, Subquery, Window
+from django.db.models.functions import RowNumber, TruncMonth
 from django.dispatch import receiver
 from django.utils import timezone
-from datetime import timedelta, date
-from calendar import monthrange
+from collections import defaultdict, namedtuple
+from contextvars import ContextVar
+from datetime import date
+import math
+import zoneinfo
+from .summary_cache import bump_data_version
+from .windows import (
+    day_window,
+    rolling_week_window,
+    calendar_week_window,
+    month_window,
+    year_window,
+    days_window,
+    date_filter
+)
 
 # Create your models here.
 
+# the fields of a FoodLog that FrequentMeal keeps, see the quick-log
+# signal handlers below
+MEAL_ENTRY_FIELDS = (
+    'meal_type', 'meal_name', 'meal_desc', 'calories_in', 'timestamp')
+MealUse = namedtuple('MealUse', MEAL_ENTRY_FIELDS)
+
+
+def validate_timezone(value):
+    if value not in zoneinfo.available_timezones():
+        raise ValidationError(f"{value} is not a known timezone")
+
 
 class UserProfile(models.Model):
     user = models.OneToOneField(
@@ -18,15 +44,22 @@ class UserProfile(models.Model):
 
     height = models.DecimalField(
         max_digits=5, decimal_places=2, null=True, blank=True)
+    # the latest WeightMeasurement, set by its signal handlers
     weight = models.DecimalField(
         max_digits=5, decimal_places=2, null=True, blank=True)
     weight_goal = models.DecimalField(
         max_digits=5, decimal_places=2, null=True, blank=True)
     cardio_goal = models.IntegerField(null=True, blank=True)
+    timezone = models.CharField(
+        max_length=63, default='UTC', validators=[validate_timezone])
 
     def __str__(self):
         return f"{self.user.username}'s Profile"
 
+    @property
+    def tzinfo(self):
+        return zoneinfo.ZoneInfo(self.timezone)
+
     @property
     def bmi(self):
         if self.height and self.weight:
@@ -39,119 +72,209 @@ class UserProfile(models.Model):
             return float(self.weight) - float(self.weight_goal)
 
 
+def user_timezone(user):
+    """
+    Get the timezone a user's logs are bucketed into days with
+    """
+    try:
+        return user.profile.tzinfo
+    except (UserProfile.DoesNotExist, zoneinfo.ZoneInfoNotFoundError):
+        return timezone.get_default_timezone()
+
+
+def get_profile(user):
+    """
+    Get a user's profile, creating it for users made before the signal
+
+    The result is cached on the user instance, as user.profile is.
+    """
+    try:
+        return user.profile
+    except UserProfile.DoesNotExist:
+        profile, created = UserProfile.objects.get_or_create(user=user)
+        user.profile = profile
+        return profile
+
+
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
+    # only on signup; every login saves the user to set last_login
     if created:
         UserProfile.objects.create(user=instance)
-    else:
-        UserProfile.objects.get_or_create(user=instance)
+        bump_data_version(instance.pk)
+
+
+class WeightMeasurement(models.Model):
+    """
+    A weigh-in; append-only, UserProfile.weight caches the latest one
+    """
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='weight_measurements')
+    measured_at = models.DateTimeField(default=timezone.now)
+    weight = models.DecimalField(
+        max_digits=5, decimal_places=2, validators=[MinValueValidator(0)])
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'measured_at']),
+        ]
+
+    def __str__(self):
+        return (
+            f"{self.user} -"
+            f"{self.measured_at:%Y-%m-%d %H:%M} -"
+            f"{self.weight} kg"
+        )
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Weight measurements cannot be changed")
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def refresh_profile_weight(cls, user_id):
+        """
+        Set the user's UserProfile.weight to their latest measurement
+        """
+        latest = (
+            cls.objects
+            .filter(user_id=OuterRef('user_id'))
+            .order_by('-measured_at', '-id')
+            .values('weight')[:1]
+        )
+        UserProfile.objects.filter(user_id=user_id).update(
+            weight=Subquery(latest))
+        bump_data_version(user_id)
+
+
+@receiver(post_save, sender=WeightMeasurement)
+@receiver(post_delete, sender=WeightMeasurement)
+def update_profile_weight(sender, instance, **kwargs):
+    WeightMeasurement.refresh_profile_weight(instance.user_id)
 
 
 class BaseLog(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     timestamp = models.DateTimeField(default=timezone.now)
+    # the timestamp's day in the user's timezone, set on save
+    local_date = models.DateField(null=True, editable=False)
 
     class Meta:
         abstract = True
         indexes = [
-            models.Index(fields=['user', 'timestamp'])
+            models.Index(fields=['user', 'timestamp']),
+            models.Index(fields=['user', 'local_date']),
+            # the admin changelist's ordering and date drill-down
+            models.Index(fields=['timestamp']),
         ]
 
+    def save(self, *args, **kwargs):
+        self.local_date = self.local_date_for(self.user, self.timestamp)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'timestamp' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'local_date'}
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def local_date_for(user, timestamp):
+        return timezone.localtime(timestamp, user_timezone(user)).date()
+
+    @classmethod
+    def refresh_local_dates(cls, user, tzinfo=None, batch_size=2000):
+        """
+        Re-bucket a user's logs after their timezone changed
+
+        bulk_update skips the rollup signals, rebuild DailyTotals afterwards.
+        """
+        tzinfo = tzinfo or user_timezone(user)
+        logs = cls.objects.filter(user=user).only('timestamp', 'local_date')
+        batch = []
+        for log in logs.iterator(chunk_size=batch_size):
+            local_date = timezone.localtime(log.timestamp, tzinfo).date()
+            if log.local_date != local_date:
+                log.local_date = local_date
+                batch.append(log)
+            if len(batch) >= batch_size:
+                cls.objects.bulk_update(batch, ['local_date'])
+                batch = []
+        cls.objects.bulk_update(batch, ['local_date'])
+
     # class methods for totalling calories for day and weeks
+    # these read the pre-aggregated DailyTotals rows, not the raw logs
 
     @classmethod
-    def _total_for_day(cls, user, field_name, date=None):
-        date = date or timezone.now().date()
+    def _rollup_total(cls, user, field_name, window):
+        """
+        Sum a DailyTotals column over a half-open date window
+        """
         return (
-            cls.objects
-            .filter(user=user, timestamp__date=date)
+            DailyTotals.objects
+            .filter(date_filter(window), user=user)
             .aggregate(total=Sum(field_name))['total']
             or 0
         )
 
+    @classmethod
+    def _total_for_day(cls, user, field_name, date=None):
+        return cls._rollup_total(user, field_name, day_window(date))
+
     @classmethod
     def _total_for_rolling_week(cls, user, field_name, reference_date=None):
-        reference_date = reference_date or timezone.now().date()
-        start_date = reference_date - timedelta(days=6)
-        return (
-            cls.objects
-            .filter(
-                user=user,
-                timestamp__date__range=(start_date, reference_date)
-            )
-            .aggregate(total=Sum(field_name))['total']
-            or 0
-        )
+        return cls._rollup_total(
+            user, field_name, rolling_week_window(reference_date))
 
     @classmethod
     def _total_for_calendar_week(cls, user, field_name, reference_date=None):
-        reference_date = reference_date or timezone.now().date()
-        start_of_week = (
-            reference_date - timedelta(days=reference_date.weekday())
-        )  # Monday
-        end_of_week = start_of_week + timedelta(days=6)  # Sunday
-        return (
-            cls.objects
-            .filter(
-                user=user,
-                timestamp__date__range=(start_of_week, end_of_week))
-            .aggregate(total=Sum(field_name))['total']
-            or 0
-        )
+        return cls._rollup_total(
+            user, field_name, calendar_week_window(reference_date))
 
     @classmethod
     def _total_for_month(cls, user, field_name, year=None, month=None):
         """
         Get total for a specific moonth and year
         """
-        if year is None or month is None:
-            today = timezone.now().date()
-            year = year or today.year
-            month = month or today.month
+        return cls._rollup_total(
+            user, field_name, month_window(year, month))
 
-        # get first and last day of month
-        start_date = date(year, month, 1)
-        _, last_day = monthrange(year, month)
-        end_date = date(year, month, last_day)
+    @classmethod
+    def _monthly_totals_for_year(cls, user, field_name, year=None):
+        """
+        Get the totals for all 12 months of a year in a single query
 
-        return (
-            cls.objects.filter(
-                user=user,
-                timestamp__date__range=(start_date, end_date)
-            )
-            .aggregate(total=Sum(field_name))['total']
-            or 0
+        Returns a list indexed by month - 1, with 0 for empty months.
+        """
+        rows = (
+            DailyTotals.objects
+            .filter(date_filter(year_window(year)), user=user)
+            .annotate(month=TruncMonth('date'))
+            .values('month')
+            .annotate(total=Sum(field_name))
+            .order_by()
         )
 
+        totals = [0] * 12
+        for row in rows:
+            totals[row['month'].month - 1] = row['total'] or 0
+        return totals
+
+    @classmethod
     def _total_for_year(cls, user, field_name, year=None):
         """
         Get total for the year
         """
+        return sum(cls._monthly_totals_for_year(user, field_name, year))
 
-        year = year or timezone.now().date().year
-        start_date = date(year, 1, 1)
-        end_date = date(year, 12, 31)
-
-        return (
-            cls.objects
-            .filter(
-                user=user,
-                timestamp__date__range=(start_date, end_date)
-            )
-            .aggregate(total=Sum(field_name))['total']
-            or 0
-        )
-
+    @classmethod
     def _monthly_breakdown_for_year(cls, user, field_name, year=None):
         """
         Get monthly totals for each month in a year
         """
 
-        year = year or timezone.now().date().year
+        year = year or timezone.localdate().year
+        monthly_totals = cls._monthly_totals_for_year(user, field_name, year)
         monthly_data = []
 
-        for month in range(1, 13):
-            total = cls._total_for_month(user, field_name, year, month)
+        for month, total in enumerate(monthly_totals, start=1):
             monthly_data.append({
                 'month': month,
                 'month_name': date(year, month, 1).strftime('%B'),
@@ -161,62 +284,85 @@ class BaseLog(models.Model):
 
         return monthly_data
 
+    @classmethod
+    def _daily_totals(
+            cls, user, field_name, start_date, end_date, columns=()):
+        """
+        Get per-day totals between two dates (inclusive) in a single query
+
+        columns lists extra DailyTotals columns (e.g. meal types) returned
+        alongside the day total.
+        Returns a dict keyed by date.
+        """
+        rows = (
+            DailyTotals.objects
+            .filter(
+                date_filter(days_window(start_date, end_date)),
+                user=user
+            )
+            .values_list('date', field_name, *columns)
+        )
+        return {
+            row[0]: dict(zip(('total', *columns), row[1:]))
+            for row in rows
+        }
+
+    # rollup bookkeeping, see the DailyTotals signal handlers below
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._rollup_snapshot = instance._rollup_entry()
+        return instance
+
+    def _rollup_entry(self):
+        """
+        Get (user_id, date, deltas) for this log's DailyTotals contribution
+
+        Returns None when a needed field was deferred and is not loaded.
+        """
+        deferred = self.get_deferred_fields()
+        if deferred & {'user_id', 'local_date', *self.ROLLUP_FIELDS}:
+            return None
+        if self.local_date is None:
+            return None
+        return self.user_id, self.local_date, self.rollup_deltas()
+
     # queryset methods for the views
+    # all of them range-scan the (user, local_date) index, see windows.py
+
+    @classmethod
+    def _logs_in_window(cls, user, window):
+        return cls.objects.filter(
+            date_filter(window, 'local_date'), user=user)
 
     @classmethod
     def logs_for_day(cls, user, date=None):
-        date = date or timezone.now().date()
-        return cls.objects.filter(user=user, timestamp__date=date)
+        return cls._logs_in_window(user, day_window(date))
 
     @classmethod
     def logs_for_rolling_week(cls, user, reference_date=None):
-        reference_date = reference_date or timezone.now().date()
-        start_date = reference_date - timedelta(days=6)
-        return cls.objects.filter(user=user, timestamp__date__range=(
-            start_date, reference_date))
+        return cls._logs_in_window(
+            user, rolling_week_window(reference_date))
 
     @classmethod
     def logs_for_calendar_week(cls, user, reference_date=None):
-        reference_date = reference_date or timezone.now().date()
-        start_of_week = reference_date - timedelta(
-            days=reference_date.weekday())
-        end_of_week = start_of_week + timedelta(days=6)
-        return cls.objects.filter(user=user, timestamp__date__range=(
-            start_of_week, end_of_week))
+        return cls._logs_in_window(
+            user, calendar_week_window(reference_date))
 
     @classmethod
     def logs_for_months(cls, user, year=None, month=None):
         """
         Get all logs for a specific month
         """
-        if year is None or month is None:
-            today = timezone.now().date()
-            year = year or today.year
-            month = month or today.month
-
-        start_date = date(year, month, 1)
-        _, last_day = monthrange(year, month)
-        end_date = date(year, month, last_day)
-
-        return cls.objects.filter(
-            user=user,
-            timestamp__date__range=(start_date, end_date)
-        )
+        return cls._logs_in_window(user, month_window(year, month))
 
     @classmethod
     def logs_for_year(cls, user, field_name, year=None):
         """
         Get all logs for a specific year
         """
-
-        year = year or timezone.now().date().year
-        start_date = date(year, 1, 1)
-        end_date = date(year, 12, 31)
-
-        return cls.objects.filter(
-            user=user,
-            timestamp__date__range=(start_date, end_date)
-        )
+        return cls._logs_in_window(user, year_window(year))
 
 
 class FoodLog(BaseLog):
@@ -237,6 +383,8 @@ class FoodLog(BaseLog):
     meal_type = models.CharField(max_length=20, choices=MEAL_CHOICES)
     calories_in = models.FloatField(validators=[MinValueValidator(1)])
 
+    ROLLUP_FIELDS = ('meal_type', 'calories_in')
+
     def __str__(self):
         return (
             f"{self.user} -"
@@ -246,6 +394,27 @@ class FoodLog(BaseLog):
             f"{self.calories_in}"
         )
 
+    def rollup_deltas(self):
+        return {
+            self.meal_type: self.calories_in,
+            'calories_in': self.calories_in,
+            'food_count': 1,
+        }
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._meal_snapshot = instance._meal_entry()
+        return instance
+
+    def _meal_entry(self):
+        """
+        Get this log's FrequentMeal use, or None if a field is deferred
+        """
+        if self.get_deferred_fields() & {'user_id', *MEAL_ENTRY_FIELDS}:
+            return None
+        return MealUse(*(getattr(self, field) for field in MEAL_ENTRY_FIELDS))
+
     @classmethod
     def total_food_day(cls, user, date=None):
         return cls._total_for_day(user, 'calories_in', date)
@@ -271,6 +440,19 @@ class FoodLog(BaseLog):
     def monthly_food_breakdown(cls, user, year=None):
         return cls._monthly_breakdown_for_year(user, 'calories_in', year)
 
+    @classmethod
+    def daily_food_breakdown(cls, user, start_date, end_date):
+        """
+        Get per-day food totals split by meal type
+        """
+        return cls._daily_totals(
+            user,
+            'calories_in',
+            start_date,
+            end_date,
+            columns=[meal for meal, _ in cls.MEAL_CHOICES]
+        )
+
 
 class CardioLog(BaseLog):
     cardio_name = models.CharField(max_length=100)
@@ -279,6 +461,8 @@ class CardioLog(BaseLog):
         help_text="Duration in Minutes", validators=[MinValueValidator(1)])
     calories_out = models.FloatField(validators=[MinValueValidator(0)])
 
+    ROLLUP_FIELDS = ('calories_out',)
+
     def __str__(self):
         return (
             f"{self.user} -"
@@ -287,6 +471,12 @@ class CardioLog(BaseLog):
             f"{self.calories_out}"
         )
 
+    def rollup_deltas(self):
+        return {
+            'calories_out': self.calories_out,
+            'cardio_count': 1,
+        }
+
     @classmethod
     def total_burn_day(cls, user, date=None):
         return cls._total_for_day(user, 'calories_out', date)
@@ -316,3 +506,479 @@ class CardioLog(BaseLog):
     @classmethod
     def monthly_burn_breakdown(cls, user, year=None):
         return cls._monthly_breakdown_for_year(user, 'calories_out', year)
+
+    @classmethod
+    def daily_burn_totals(cls, user, start_date, end_date):
+        return cls._daily_totals(user, 'calories_out', start_date, end_date)
+
+
+class DailyTotals(models.Model):
+    """
+    Per-user, per-day rollup of FoodLog and CardioLog entries
+
+    Kept current by the signal handlers below and rebuilt by the
+    rebuild_daily_totals management command, except on compacted days.
+    """
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='daily_totals')
+    date = models.DateField()
+
+    breakfast = models.FloatField(default=0)
+    lunch = models.FloatField(default=0)
+    dinner = models.FloatField(default=0)
+    snack = models.FloatField(default=0)
+    calories_in = models.FloatField(default=0)
+    calories_out = models.FloatField(default=0)
+
+    food_count = models.IntegerField(default=0)
+    cardio_count = models.IntegerField(default=0)
+
+    # the day's older logs were archived by compact_logs; the row is then
+    # the only record of them and is never reconciled against raw logs
+    compacted = models.BooleanField(default=False)
+
+    ROLLUP_COLUMNS = [
+        'breakfast',
+        'lunch',
+        'dinner',
+        'snack',
+        'calories_in',
+        'calories_out',
+        'food_count',
+        'cardio_count',
+    ]
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'date'], name='unique_daily_totals')
+        ]
+
+    def __str__(self):
+        return (
+            f"{self.user} -"
+            f"{self.date:%Y-%m-%d} -"
+            f"{self.calories_in} in -"
+            f"{self.calories_out} out"
+        )
+
+    @classmethod
+    def apply_deltas(cls, user_id, date, deltas, create=True):
+        """
+        Atomically add deltas to the (user, date) row
+
+        The row is created when missing, unless create is False.
+        """
+        deltas = {field: value for field, value in deltas.items() if value}
+        if not deltas:
+            return
+
+        updates = {field: F(field) + value for field, value in deltas.items()}
+        with transaction.atomic():
+            if cls.objects.filter(user_id=user_id, date=date).update(
+                    **updates) or not create:
+                return
+            try:
+                with transaction.atomic():
+                    cls.objects.create(user_id=user_id, date=date, **deltas)
+            except IntegrityError:
+                # another request created the row first
+                cls.objects.filter(user_id=user_id, date=date).update(
+                    **updates)
+
+    @classmethod
+    def apply_bulk_deltas(cls, user_id, changes):
+        """
+        Add {date: deltas} for many days of one user in a few queries
+
+        Used by bulk inserts, which bypass the signal handlers.
+        """
+        changes = {day: deltas for day, deltas in changes.items() if deltas}
+        if not changes:
+            return
+        fields = sorted({field for deltas in changes.values()
+                         for field in deltas})
+        try:
+            with transaction.atomic():
+                missing = dict(changes)
+                existing = cls.objects.filter(
+                    user_id=user_id, date__in=list(changes)).only('date')
+                to_update = []
+                for row in existing:
+                    deltas = missing.pop(row.date)
+                    for field in fields:
+                        setattr(row, field, F(field) + deltas.get(field, 0))
+                    to_update.append(row)
+                cls.objects.bulk_update(to_update, fields, batch_size=500)
+                cls.objects.bulk_create(
+                    [
+                        cls(user_id=user_id, date=day, **deltas)
+                        for day, deltas in missing.items()
+                    ],
+                    batch_size=500
+                )
+        except IntegrityError:
+            # a row was created concurrently, fall back to one day at a time
+            for day, deltas in changes.items():
+                cls.apply_deltas(user_id, day, deltas)
+
+    @classmethod
+    def add_bulk_created(cls, user_id, logs):
+        """
+        Count FoodLogs and CardioLogs of one user saved by bulk_create
+
+        Adds the deltas their signal handlers would have, summed per day.
+        """
+        changes = {}
+        for log in logs:
+            deltas = changes.setdefault(log.local_date, {})
+            for field, value in log.rollup_deltas().items():
+                deltas[field] = deltas.get(field, 0) + value
+        cls.apply_bulk_deltas(user_id, changes)
+
+    @classmethod
+    def expected_for_user(cls, user_id, days=None):
+        """
+        Recompute every (date -> column values) row for a user from raw logs
+
+        Uses one grouped query per log model. days optionally limits the
+        rows to some dates.
+        """
+        expected = {}
+        logs = Q(user_id=user_id)
+        if days is not None:
+            logs &= Q(local_date__in=days)
+        food_rows = (
+            FoodLog.objects
+            .filter(logs)
+            .values(day=F('local_date'))
+            .annotate(
+                food_total=Sum('calories_in'),
+                food_count=Count('id'),
+                **{
+                    meal: Sum('calories_in', filter=Q(meal_type=meal))
+                    for meal, _ in FoodLog.MEAL_CHOICES
+                }
+            )
+            .order_by()
+        )
+        cardio_rows = (
+            CardioLog.objects
+            .filter(logs)
+            .values(day=F('local_date'))
+            .annotate(
+                cardio_total=Sum('calories_out'),
+                cardio_count=Count('id')
+            )
+            .order_by()
+        )
+        # the sums can't share a name with the model fields they read
+        renamed = {'food_total': 'calories_in', 'cardio_total': 'calories_out'}
+        for row in [*food_rows, *cardio_rows]:
+            day = row.pop('day')
+            values = expected.setdefault(
+                day, {field: 0 for field in cls.ROLLUP_COLUMNS})
+            values.update({
+                renamed.get(field, field): value or 0
+                for field, value in row.items()
+            })
+        return expected
+
+    @classmethod
+    def reconcile_user(cls, user_id, dry_run=False):
+        """
+        Bring a user's rows in line with their raw logs
+
+        Compacted days are left alone, their logs are archived.
+        Returns (created, updated, deleted) row counts.
+        """
+        expected = cls.expected_for_user(user_id)
+        existing = {
+            row.date: row for row in cls.objects.filter(user_id=user_id)
+        }
+
+        to_create = [
+            cls(user_id=user_id, date=day, **values)
+            for day, values in expected.items()
+            if day not in existing
+        ]
+        to_update = []
+        for day, row in existing.items():
+            values = expected.get(day)
+            if values is None or row.compacted:
+                continue
+            # float sums drift slightly under incremental updates
+            if any(abs(getattr(row, field) - value) > 1e-6
+                   for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(row, field, value)
+                to_update.append(row)
+        to_delete = [
+            row.pk for day, row in existing.items()
+            if day not in expected and not row.compacted
+        ]
+
+        if not dry_run and (to_create or to_update or to_delete):
+            with transaction.atomic():
+                cls.objects.bulk_create(to_create, batch_size=500)
+                cls.objects.bulk_update(
+                    to_update, cls.ROLLUP_COLUMNS, batch_size=500)
+                cls.objects.filter(pk__in=to_delete).delete()
+                bump_data_version(user_id)
+
+        return len(to_create), len(to_update), len(to_delete)
+
+
+class FrequentMeal(models.Model):
+    """
+    A meal a user logs repeatedly, ranked for the quick-log panel
+
+    score is log(sum(exp(DECAY * t))) over the timestamps t (in seconds)
+    of the user's logs of this meal, a frequency in which each log's weight
+    halves every HALF_LIFE_DAYS. Every weight decays at the same rate, so
+    ordering by score ranks by recency-weighted frequency at any moment,
+    without rescoring rows as time passes. Kept current by the signal
+    handlers below, and by the importer for bulk inserts.
+    """
+    HALF_LIFE_DAYS = 30
+    DECAY = math.log(2) / (HALF_LIFE_DAYS * 24 * 60 * 60)
+    TOP_N = 5
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='frequent_meals')
+    meal_type = models.CharField(
+        max_length=20, choices=FoodLog.MEAL_CHOICES)
+    # meal_name stripped and case-folded, so "Toast" and "toast " match
+    name_key = models.CharField(max_length=100)
+
+    # the most recent log, used as the template for quick logging
+    meal_name = models.CharField(max_length=100)
+    meal_desc = models.TextField(blank=True, null=True)
+    calories_in = models.FloatField()
+    last_used = models.DateTimeField()
+
+    count = models.IntegerField(default=0)
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'meal_type', 'name_key'],
+                name='unique_frequent_meal')
+        ]
+        indexes = [
+            models.Index(fields=['user', 'meal_type', '-score']),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.meal_type} - {self.meal_name}"
+
+    @staticmethod
+    def key_for(meal_name):
+        return meal_name.strip().casefold()[:100]
+
+    @classmethod
+    def _log_weight(cls, uses):
+        """
+        log(sum(exp(DECAY * t))) for some uses, computed without overflow
+        """
+        weights = [cls.DECAY * use.timestamp.timestamp() for use in uses]
+        top = max(weights)
+        return top + math.log(math.fsum(math.exp(w - top) for w in weights))
+
+    @classmethod
+    def record(cls, user_id, uses, sign=1):
+        """
+        Add uses of meals (MealUse tuples), or remove them with sign=-1
+        """
+        grouped = defaultdict(list)
+        for use in uses:
+            if use is not None and cls.key_for(use.meal_name):
+                grouped[use.meal_type, cls.key_for(use.meal_name)].append(use)
+        if not grouped:
+            return
+
+        with transaction.atomic():
+            rows = {
+                (row.meal_type, row.name_key): row
+                for row in cls.objects.select_for_update().filter(
+                    user_id=user_id,
+                    name_key__in={key for _, key in grouped})
+            }
+            for (meal_type, name_key), group in grouped.items():
+                row = rows.get((meal_type, name_key))
+                if sign > 0:
+                    cls._add_uses(user_id, meal_type, name_key, row, group)
+                elif row is not None:
+                    cls._remove_uses(row, group)
+
+    @classmethod
+    def _add_uses(cls, user_id, meal_type, name_key, row, uses):
+        weight = cls._log_weight(uses)
+        latest = max(uses, key=lambda use: use.timestamp)
+        if row is None:
+            row = cls(
+                user_id=user_id, meal_type=meal_type, name_key=name_key,
+                score=weight, last_used=latest.timestamp)
+        else:
+            top = max(row.score, weight)
+            row.score = top + math.log(
+                math.exp(row.score - top) + math.exp(weight - top))
+        row.count += len(uses)
+        if latest.timestamp >= row.last_used:
+            row.meal_name = latest.meal_name.strip()
+            row.meal_desc = latest.meal_desc
+            row.calories_in = latest.calories_in
+            row.last_used = latest.timestamp
+        row.save()
+
+    @classmethod
+    def _remove_uses(cls, row, uses):
+        row.count -= len(uses)
+        if row.count <= 0:
+            row.delete()
+            return
+        # log(exp(score) - exp(weight)); when the difference is lost to
+        # rounding the remaining uses are rescored from the logs
+        remaining = -math.expm1(cls._log_weight(uses) - row.score)
+        if remaining > 1e-9:
+            row.score += math.log(remaining)
+            row.save(update_fields=['count', 'score'])
+            return
+        # matched by key_for, as the row was; iexact on the stored name
+        # misses logs saved with surrounding whitespace
+        logs = FoodLog.objects.filter(
+            user_id=row.user_id,
+            meal_type=row.meal_type,
+        ).values_list(*MEAL_ENTRY_FIELDS)
+        uses = [
+            use for use in (MealUse(*values) for values in logs.iterator())
+            if cls.key_for(use.meal_name) == row.name_key
+        ]
+        if not uses:
+            row.delete()
+            return
+        row.count = len(uses)
+        row.score = cls._log_weight(uses)
+        row.save(update_fields=['count', 'score'])
+
+    @classmethod
+    def top_for_user(cls, user, per_type=TOP_N):
+        """
+        The user's top meals for each meal type, in one windowed query
+        """
+        return (
+            cls.objects
+            .filter(user=user)
+            .annotate(rank=Window(
+                RowNumber(),
+                partition_by=F('meal_type'),
+                order_by=F('score').desc()))
+            .filter(rank__lte=per_type)
+            .order_by('meal_type', 'rank')
+        )
+
+    @classmethod
+    def rebuild_user(cls, user_id):
+        """
+        Recompute a user's rows from all of their food logs
+        """
+        logs = FoodLog.objects.filter(user_id=user_id).values_list(
+            *MEAL_ENTRY_FIELDS)
+        with transaction.atomic():
+            cls.objects.filter(user_id=user_id).delete()
+            cls.record(user_id, [MealUse(*values) for values in logs])
+
+
+# set while compaction deletes the logs it archived, whose values stay in
+# DailyTotals and FrequentMeal; see compaction.py
+archiving = ContextVar('archiving', default=False)
+
+
+def _merge_rollup(changes, entry, sign):
+    if entry is None:
+        return
+    user_id, day, deltas = entry
+    bucket = changes.setdefault((user_id, day), {})
+    for field, value in deltas.items():
+        bucket[field] = bucket.get(field, 0) + sign * value
+
+
+@receiver(pre_save, sender=FoodLog)
+@receiver(pre_save, sender=CardioLog)
+def snapshot_log_rollup(sender, instance, **kwargs):
+    # logs loaded with deferred fields have no snapshot yet
+    if instance._state.adding or instance.__dict__.get('_rollup_snapshot'):
+        return
+    previous = sender.objects.filter(pk=instance.pk).first()
+    instance._rollup_snapshot = previous and previous._rollup_entry()
+
+
+@receiver(post_save, sender=FoodLog)
+@receiver(post_save, sender=CardioLog)
+def update_rollup_on_save(sender, instance, created, **kwargs):
+    changes = {}
+    if not created:
+        _merge_rollup(
+            changes, instance.__dict__.get('_rollup_snapshot'), -1)
+    current = instance._rollup_entry()
+    _merge_rollup(changes, current, 1)
+
+    for (user_id, day), deltas in changes.items():
+        DailyTotals.apply_deltas(user_id, day, deltas)
+        bump_data_version(user_id)
+    instance._rollup_snapshot = current
+
+
+@receiver(post_delete, sender=FoodLog)
+@receiver(post_delete, sender=CardioLog)
+def update_rollup_on_delete(sender, instance, **kwargs):
+    if archiving.get():
+        return
+    entry = (
+        instance.__dict__.get('_rollup_snapshot')
+        or instance._rollup_entry()
+    )
+    if entry is None:
+        return
+    user_id, day, deltas = entry
+    # the row may already be gone when the user is being deleted
+    DailyTotals.apply_deltas(
+        user_id,
+        day,
+        {field: -value for field, value in deltas.items()},
+        create=False
+    )
+    bump_data_version(user_id)
+
+
+# quick-log bookkeeping, FoodLog changes update FrequentMeal
+
+
+@receiver(pre_save, sender=FoodLog)
+def snapshot_meal_use(sender, instance, **kwargs):
+    if instance._state.adding or instance.__dict__.get('_meal_snapshot'):
+        return
+    previous = sender.objects.filter(pk=instance.pk).first()
+    instance._meal_snapshot = previous and previous._meal_entry()
+
+
+@receiver(post_save, sender=FoodLog)
+def update_frequent_meals_on_save(sender, instance, created, **kwargs):
+    current = instance._meal_entry()
+    previous = None if created else instance.__dict__.get('_meal_snapshot')
+    if previous != current:
+        FrequentMeal.record(instance.user_id, [previous], sign=-1)
+        FrequentMeal.record(instance.user_id, [current])
+    instance._meal_snapshot = current
+
+
+@receiver(post_delete, sender=FoodLog)
+def update_frequent_meals_on_delete(sender, instance, **kwargs):
+    if archiving.get():
+        return
+    FrequentMeal.record(
+        instance.user_id,
+        [instance.__dict__.get('_meal_snapshot') or instance._meal_entry()],
+        sign=-1
+    )
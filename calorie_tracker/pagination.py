@@ -0,0 +1,132 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from datetime import datetime
+import base64
+import json
+
+# keyset pagination for log history, newest first
+#
+# pages continue from the (timestamp, id) of the last row shown rather than
+# an OFFSET, so every page is one range scan of the (user, timestamp) index
+# and costs the same however deep it is; one extra row is fetched to tell
+# whether another page follows, instead of a COUNT(*)
+
+PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(timestamp, pk):
+    payload = json.dumps([timestamp.isoformat(), pk]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        timestamp, pk = json.loads(payload)
+        timestamp = datetime.fromisoformat(timestamp)
+        pk = int(pk)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor("Invalid page cursor") from e
+    if timestamp.tzinfo is None:
+        raise InvalidCursor("Invalid page cursor")
+    return timestamp, pk
+
+
+def keyset_filter(timestamp, pk, descending=False):
+    """
+    Rows after (timestamp, pk) in (timestamp, id) order
+
+    The OR alone can't bound an index scan, so the redundant inclusive
+    timestamp bound is what lets the planner seek straight to the cursor.
+    """
+    lookup = 'lt' if descending else 'gt'
+    return Q(**{f'timestamp__{lookup}e': timestamp}) & (
+        Q(**{f'timestamp__{lookup}': timestamp})
+        | Q(timestamp=timestamp, **{f'id__{lookup}': pk})
+    )
+
+
+def keyset_page(queryset, cursor=None, page_size=PAGE_SIZE):
+    """
+    Get one newest-first page of logs and the cursor for the next page
+
+    :return: (list of logs, next cursor or None on the last page)
+    """
+    logs = queryset.order_by('-timestamp', '-id')
+    if cursor:
+        logs = logs.filter(
+            keyset_filter(*decode_cursor(cursor), descending=True))
+
+    page = list(logs[:page_size + 1])
+    if len(page) <= page_size:
+        return page, None
+    page = page[:page_size]
+    return page, encode_cursor(page[-1].timestamp, page[-1].pk)
+
+
+# estimated counts for the admin changelists of very large tables
+#
+# an exact COUNT(*) reads the whole table or index; past EXACT_COUNT_LIMIT
+# rows, unfiltered lists are counted from the database's own statistics
+# and filtered ones are cut off at EXACT_COUNT_LIMIT rows, which the
+# changelist says, so narrower filters reach the rest
+
+EXACT_COUNT_LIMIT = 10000
+
+
+def estimated_table_rows(model, using='default'):
+    """
+    The database's estimate of a table's row count, or None
+    """
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # planner statistics, -1 until the table is first analyzed
+            cursor.execute(
+                "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+                [quote(table)])
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                "SELECT table_rows FROM information_schema.tables "
+                "WHERE table_schema = DATABASE() AND table_name = %s",
+                [table])
+        else:
+            # the top of the primary key index, too high after deletes
+            cursor.execute(
+                f"SELECT MAX({quote(model._meta.pk.column)}) "
+                f"FROM {quote(table)}")
+        row = cursor.fetchone()
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator counting at most EXACT_COUNT_LIMIT rows exactly
+
+    capped is true once count stops short of the filtered rows.
+    """
+    capped = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_table_rows(queryset.model, queryset.db)
+            if estimate is not None and estimate > EXACT_COUNT_LIMIT:
+                return estimate
+        # counting a slice stops at the limit, one row past it tells
+        # whether there are more
+        count = queryset.order_by()[:EXACT_COUNT_LIMIT + 1].count()
+        self.capped = count > EXACT_COUNT_LIMIT
+        return min(count, EXACT_COUNT_LIMIT)
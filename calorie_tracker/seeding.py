@@ -0,0 +1,144 @@
+from django.db import transaction
+from datetime import datetime, time, timedelta
+import random
+from .models import (
+    FoodLog,
+    CardioLog,
+    DailyTotals,
+    FrequentMeal,
+    user_timezone
+)
+from .summary_cache import bump_data_version
+
+# deterministic synthetic log history for benchmarks and load tests
+#
+# every user gets their own random.Random seeded from (seed, username), so
+# the same arguments always produce the same rows, and logs are written
+# with bulk_create plus one rollup update per batch, as the importer does
+
+BATCH_SIZE = 2000
+
+# calorie mean and standard deviation, and usual hours, per meal type
+MEALS = {
+    FoodLog.BREAKFAST: (420, 110, (6, 9)),
+    FoodLog.LUNCH: (650, 160, (11, 14)),
+    FoodLog.DINNER: (780, 200, (17, 21)),
+    FoodLog.SNACK: (190, 80, (9, 22)),
+}
+MEAL_NAMES = {
+    FoodLog.BREAKFAST: ['Porridge', 'Toast', 'Eggs', 'Yoghurt', 'Cereal'],
+    FoodLog.LUNCH: ['Sandwich', 'Salad', 'Soup', 'Wrap', 'Leftovers'],
+    FoodLog.DINNER: ['Pasta', 'Curry', 'Stir fry', 'Chicken', 'Pizza'],
+    FoodLog.SNACK: ['Apple', 'Crisps', 'Nuts', 'Biscuit', 'Banana'],
+}
+# (name, calories burnt per minute)
+CARDIO = [
+    ('Running', 11),
+    ('Cycling', 8),
+    ('Rowing', 9),
+    ('Swimming', 10),
+    ('Walking', 4),
+]
+
+# how much a user logs: share of days with any logs, food entries per
+# meal, snacks per day and cardio sessions per week
+PROFILES = {
+    'light': {
+        'active_days': 0.4, 'items': (1, 1), 'snacks': (0, 1),
+        'cardio_per_week': 1,
+    },
+    'median': {
+        'active_days': 0.8, 'items': (1, 2), 'snacks': (0, 2),
+        'cardio_per_week': 3,
+    },
+    'heavy': {
+        'active_days': 1.0, 'items': (2, 4), 'snacks': (1, 4),
+        'cardio_per_week': 6,
+    },
+}
+
+
+def _at(rng, day, hours, tzinfo):
+    return datetime.combine(
+        day,
+        time(rng.randint(*hours), rng.randrange(60)),
+        tzinfo=tzinfo
+    )
+
+
+def generate_logs(user, profile, start_date, end_date, rng):
+    """
+    Yield unsaved FoodLog and CardioLog instances, day by day
+    """
+    density = PROFILES[profile]
+    tzinfo = user_timezone(user)
+    day = start_date
+    while day <= end_date:
+        if rng.random() < density['active_days']:
+            meals = [FoodLog.BREAKFAST, FoodLog.LUNCH, FoodLog.DINNER]
+            meals += [FoodLog.SNACK] * rng.randint(*density['snacks'])
+            for meal_type in meals:
+                mean, spread, hours = MEALS[meal_type]
+                items = 1 if meal_type == FoodLog.SNACK else rng.randint(
+                    *density['items'])
+                timestamp = _at(rng, day, hours, tzinfo)
+                for _ in range(items):
+                    yield FoodLog(
+                        user=user,
+                        timestamp=timestamp,
+                        local_date=day,
+                        meal_name=rng.choice(MEAL_NAMES[meal_type]),
+                        meal_type=meal_type,
+                        calories_in=max(
+                            1, round(rng.gauss(mean, spread) / items)),
+                    )
+
+            if rng.random() < density['cardio_per_week'] / 7:
+                name, rate = rng.choice(CARDIO)
+                duration = rng.randint(20, 75)
+                burn = duration * rate * rng.uniform(0.8, 1.2)
+                yield CardioLog(
+                    user=user,
+                    timestamp=_at(rng, day, (6, 20), tzinfo),
+                    local_date=day,
+                    cardio_name=name,
+                    duration=duration,
+                    calories_out=round(burn),
+                )
+        day += timedelta(days=1)
+
+
+def _flush(user, batch):
+    with transaction.atomic():
+        for model in (FoodLog, CardioLog):
+            model.objects.bulk_create(
+                [log for log in batch if isinstance(log, model)])
+        # bulk_create skips the DailyTotals and FrequentMeal signal handlers
+        DailyTotals.add_bulk_created(user.pk, batch)
+        FrequentMeal.record(user.pk, [
+            log._meal_entry() for log in batch if isinstance(log, FoodLog)
+        ])
+
+
+def seed_user(user, profile, years, end_date, seed=0,
+              batch_size=BATCH_SIZE):
+    """
+    Write `years` of synthetic history ending on end_date for a user
+
+    Returns the number of logs created.
+    """
+    rng = random.Random(f'{seed}:{user.username}')
+    start_date = end_date - timedelta(days=round(365 * years) - 1)
+    created = 0
+    batch = []
+    for log in generate_logs(user, profile, start_date, end_date, rng):
+        batch.append(log)
+        if len(batch) >= batch_size:
+            _flush(user, batch)
+            created += len(batch)
+            batch = []
+    if batch:
+        _flush(user, batch)
+        created += len(batch)
+    bump_data_version(user.pk)
+    return created
@@ -1,45 +1,56 @@
-from .models import FoodLog, CardioLog
-from django.utils import timezone
+from .models import DailyTotals
+from .windows import (
+    day_window,
+    rolling_week_window,
+    calendar_week_window,
+    month_window,
+    year_window,
+    date_filter
+)
+from .summary_cache import cached_summary
+from django.db.models import Sum
 
 # methods for getting net calories
+# each reads both sides from the DailyTotals rollup in a single query
 
 
+def _net_for_window(user, window):
+    totals = (
+        DailyTotals.objects
+        .filter(date_filter(window), user=user)
+        .aggregate(
+            calories_in=Sum('calories_in'),
+            calories_out=Sum('calories_out')
+        )
+    )
+    return (totals['calories_in'] or 0) - (totals['calories_out'] or 0)
+
+
+@cached_summary
 def net_calorie_day(user, date=None):
-    date = date or timezone.now().date()
-    calories_in = FoodLog.total_food_day(user, date)
-    calories_out = CardioLog.total_burn_day(user, date)
-    net_day = calories_in - calories_out
+    net_day = _net_for_window(user, day_window(date))
     return net_day
 
 
+@cached_summary
 def net_calorie_rolling_week(user, date=None):
-    date = date or timezone.now().date()
-    calories_in = FoodLog.total_food_rolling_week(user, date)
-    calories_out = CardioLog.total_burn_rolling_week(user, date)
-    net_rolling_week = calories_in - calories_out
+    net_rolling_week = _net_for_window(user, rolling_week_window(date))
     return net_rolling_week
 
 
+@cached_summary
 def net_calorie_calendar_week(user, date=None):
-    date = date or timezone.now().date()
-    calories_in = FoodLog.total_food_calendar_week(user, date)
-    calories_out = CardioLog.total_burn_calendar_week(user, date)
-    net_calendar_week = calories_in - calories_out
+    net_calendar_week = _net_for_window(user, calendar_week_window(date))
     return net_calendar_week
 
 
+@cached_summary
 def net_calorie_month(user, year=None, month=None):
-    year = year or timezone.now().date().year
-    month = month or timezone.now().date().month
-    calories_in = FoodLog.total_food_month(user, year, month)
-    calories_out = CardioLog.total_burn_month(user, year, month)
-    net_month = calories_in - calories_out
+    net_month = _net_for_window(user, month_window(year, month))
     return net_month
 
 
+@cached_summary
 def net_calorie_year(user, year=None):
-    year = year or timezone.now().date().year
-    calories_in = FoodLog.total_food_year(user, year)
-    calories_out = CardioLog.total_burn_year(user, year)
-    net_year = calories_in - calories_out
+    net_year = _net_for_window(user, year_window(year))
     return net_year
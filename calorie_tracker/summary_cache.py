@@ -0,0 +1,104 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+import functools
+import hashlib
+import time
+
+# versioned per-user cache for the summary tables and net calorie values
+#
+# every key embeds the user's data version, which is bumped whenever one of
+# their logs changes, so stale entries are simply never read again and
+# expire on their own
+
+VERSION_KEY = 'calorie_tracker:version:{user_id}'
+SUMMARY_KEY = 'calorie_tracker:summary:{user_id}:{version}:{name}:{args}'
+SUMMARY_TIMEOUT = 60 * 60 * 24
+LOCK_TIMEOUT = 10  # seconds a recompute may hold the lock
+LOCK_WAIT = 2  # seconds a concurrent miss waits before computing anyway
+LOCK_POLL = 0.05
+
+_MISSING = object()
+
+
+def data_version(user_id):
+    """
+    Get the user's current data version, a time.time_ns() value
+    """
+    key = VERSION_KEY.format(user_id=user_id)
+    version = cache.get(key)
+    if version is None:
+        # cold or evicted, any fresh value invalidates what was cached
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_data_version(user_id):
+    def bump():
+        cache.set(VERSION_KEY.format(user_id=user_id), time.time_ns(), None)
+
+    # bump now for readers inside the transaction, and again once it
+    # commits so nothing computed from uncommitted data outlives it
+    bump()
+    transaction.on_commit(bump)
+
+
+def summary_key(user_id, name, args):
+    digest = hashlib.md5(repr(args).encode(), usedforsecurity=False)
+    return SUMMARY_KEY.format(
+        user_id=user_id,
+        version=data_version(user_id),
+        name=name,
+        args=digest.hexdigest(),
+    )
+
+
+def get_or_compute(user_id, name, args, compute):
+    """
+    Return the cached value for (user, name, args), computing it on a miss
+
+    Only one caller per key recomputes at a time; concurrent misses wait
+    briefly for its result before falling back to computing themselves.
+    """
+    key = summary_key(user_id, name, args)
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, LOCK_TIMEOUT):
+        try:
+            value = compute()
+            cache.set(key, value, SUMMARY_TIMEOUT)
+        finally:
+            cache.delete(lock_key)
+        return value
+
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL)
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+    return compute()
+
+
+def cached_summary(func):
+    """
+    Cache a summary function taking the user as its first argument
+
+    The user's local date is part of the key, so calls relying on a
+    default of "today" roll over at midnight.
+    """
+    @functools.wraps(func)
+    def wrapper(user, *args, **kwargs):
+        return get_or_compute(
+            user.pk,
+            f'{func.__module__}.{func.__qualname__}',
+            (timezone.localdate(), args, sorted(kwargs.items())),
+            lambda: func(user, *args, **kwargs),
+        )
+
+    wrapper.uncached = func
+    return wrapper
@@ -1,7 +1,7 @@
-from django.db.models import Sum
 from django.utils import timezone
-from datetime import timedelta
-from .models import FoodLog, CardioLog
+from datetime import timedelta, date
+from .models import FoodLog, CardioLog, DailyTotals
+from .summary_cache import cached_summary
 
 MEAL_TYPES = [
     FoodLog.BREAKFAST,
@@ -10,33 +10,32 @@ MEAL_TYPES = [
     FoodLog.SNACK
 ]
 
+MONTHS = [
+    'Jan',
+    'Feb',
+    'Mar',
+    'Apr',
+    'May',
+    'Jun',
+    'Jul',
+    'Aug',
+    'Sep',
+    'Oct',
+    'Nov',
+    'Dec'
+]
 
-def get_day_summary(user, day=None):
-    day = day or timezone.now().date()
 
-    meal_types = [
-        FoodLog.BREAKFAST,
-        FoodLog.LUNCH,
-        FoodLog.DINNER,
-        FoodLog.SNACK
-    ]
+# table builders, shared by the per-table helpers and the dashboard engine
+# food_by_day maps dates to {'total': ..., <meal type>: ...}
+# cardio_by_day maps dates to {'total': ...}
 
-    table_data = {}
-
-    for meal in meal_types:
-        total = (
-            FoodLog.objects.filter(
-                user=user,
-                meal_type=meal,
-                timestamp__date=day
-            )
-            .aggregate(Sum('calories_in'))['calories_in__sum']
-            or 0
-        )
-        table_data[meal] = total
-
-    food_total = FoodLog.total_food_day(user, date=day)
-    exercise_total = CardioLog.total_burn_day(user, date=day)
+
+def _day_table(day, food_day, cardio_day):
+    table_data = {meal: food_day.get(meal, 0) for meal in MEAL_TYPES}
+
+    food_total = food_day.get('total', 0)
+    exercise_total = cardio_day.get('total', 0)
     net_calories = food_total - exercise_total
 
     return {
@@ -48,40 +47,20 @@ def get_day_summary(user, day=None):
     }
 
 
-def get_week_summary(user, start_date, days_count=7, reverse_order=False):
-    """
-    Generate summary data for a sequence of days starting from start_date.
-
-
-    :param user: User object
-    :param start_date: First day in the period (date object)
-    :param days_count: Number of days (default 7)
-    :param reverse_order: If True, reverse the order of days
-    :return:
-    dict containing
-    days,
-    table_data,
-    food_totals,
-    exercise_totals,
-    net_calories
-    """
-    days = [start_date + timedelta(days=i) for i in range(days_count)]
+def _week_table(days, food_by_day, cardio_by_day, reverse_order=False):
+    days = list(days)
     day_names = [day.strftime("%a") for day in days]
 
     table_data = {meal: [] for meal in MEAL_TYPES}
     food_totals, exercise_totals, net_calories = [], [], []
 
     for day in days:
+        food_day = food_by_day.get(day, {})
         for meal in MEAL_TYPES:
-            total = (
-                FoodLog.objects.filter(
-                    user=user, meal_type=meal, timestamp__date=day
-                ).aggregate(Sum('calories_in'))['calories_in__sum'] or 0
-            )
-            table_data[meal].append(total)
-
-        food_total = FoodLog.total_food_day(user, date=day)
-        exercise_total = CardioLog.total_burn_day(user, date=day)
+            table_data[meal].append(food_day.get(meal, 0))
+
+        food_total = food_day.get('total', 0)
+        exercise_total = cardio_by_day.get(day, {}).get('total', 0)
         net = food_total - exercise_total
 
         food_totals.append(food_total)
@@ -99,14 +78,6 @@ def get_week_summary(user, start_date, days_count=7, reverse_order=False):
 
     meal_totals = {meal: sum(table_data[meal]) for meal in MEAL_TYPES}
 
-    meal_rows = []
-    for meal in MEAL_TYPES:
-        meal_rows.append({
-            "meal": meal,
-            "values": table_data[meal],
-            "total": sum(table_data[meal])
-        })
-
     return {
         "days": day_names,
         "table_data": table_data,
@@ -117,59 +88,142 @@ def get_week_summary(user, start_date, days_count=7, reverse_order=False):
     }
 
 
+def _year_table(food_monthly, cardio_monthly):
+    net_monthly = [
+        food - cardio for food, cardio in zip(food_monthly, cardio_monthly)
+    ]
+
+    return {
+        "months": MONTHS,
+        "food_totals": food_monthly,
+        "exercise_totals": cardio_monthly,
+        "net_calories": net_monthly,
+        "yearly_totals": {
+            'food_year': sum(food_monthly),
+            'cardio_year': sum(cardio_monthly),
+            'net_year': sum(net_monthly),
+        }
+    }
+
+
+@cached_summary
+def get_day_summary(user, day=None):
+    day = day or timezone.localdate()
+
+    food_day = FoodLog.daily_food_breakdown(user, day, day).get(day, {})
+    cardio_day = CardioLog.daily_burn_totals(user, day, day).get(day, {})
+
+    return _day_table(day, food_day, cardio_day)
+
+
+@cached_summary
+def get_week_summary(user, start_date, days_count=7, reverse_order=False):
+    """
+    Generate summary data for a sequence of days starting from start_date.
+
+
+    :param user: User object
+    :param start_date: First day in the period (date object)
+    :param days_count: Number of days (default 7)
+    :param reverse_order: If True, reverse the order of days
+    :return:
+    dict containing
+    days,
+    table_data,
+    food_totals,
+    exercise_totals,
+    net_calories
+    """
+    days = [start_date + timedelta(days=i) for i in range(days_count)]
+
+    # one grouped query per model, whatever the number of days
+    food_by_day = FoodLog.daily_food_breakdown(user, days[0], days[-1])
+    cardio_by_day = CardioLog.daily_burn_totals(user, days[0], days[-1])
+
+    return _week_table(days, food_by_day, cardio_by_day, reverse_order)
+
+
 def get_calendar_week_summary(user, reference_date=None):
-    today = reference_date or timezone.now().date()
+    today = reference_date or timezone.localdate()
     start_of_week = today - timedelta(days=today.weekday())  # Monday
     return get_week_summary(user, start_of_week)
 
 
 def get_rolling_week_summary(user, reference_date=None):
-    today = reference_date or timezone.now().date()
+    today = reference_date or timezone.localdate()
     start_of_rolling = today - timedelta(days=6)  # Last 7 days including today
     return get_week_summary(user, start_of_rolling, reverse_order=False)
 
 
+@cached_summary
 def get_year_summary(user, year=None):
     """
     Generate summary data for all 12 months in a year
     """
-    year = year or timezone.now().date().year
-    months = [
-        'Jan',
-        'Feb',
-        'Mar',
-        'Apr',
-        'May',
-        'Jun',
-        'Jul',
-        'Aug',
-        'Sep',
-        'Oct',
-        'Nov',
-        'Dec'
+    year = year or timezone.localdate().year
+
+    # one month-bucketed query per model
+    food_monthly = [
+        month['total'] for month in FoodLog.monthly_food_breakdown(user, year)
+    ]
+    cardio_monthly = [
+        month['total']
+        for month in CardioLog.monthly_burn_breakdown(user, year)
     ]
 
-    food_monthly = []
-    cardio_monthly = []
-    net_monthly = []
+    return _year_table(food_monthly, cardio_monthly)
+
+
+@cached_summary
+def get_dashboard_summary(user, today=None):
+    """
+    Build every dashboard table from a single fetch
 
-    for month in range(1, 13):
-        food_total = FoodLog.total_food_month(user, year, month)
-        cardio_total = CardioLog.total_burn_month(user, year, month)
-        net_total = food_total - cardio_total
+    The rolling week, calendar week and year overlap, so the user's
+    DailyTotals rows for the widest of those windows are read once as
+    plain tuples and partitioned in Python.
 
-        food_monthly.append(food_total)
-        cardio_monthly.append(cardio_total)
-        net_monthly.append(net_total)
+    :return:
+    dict containing
+    daily, rolling, calendar and year tables shaped like the
+    get_*_summary helpers, and net with the day and week net calories
+    """
+    today = today or timezone.localdate()
+    rolling_days = [today - timedelta(days=i) for i in range(6, -1, -1)]
+    start_of_week = today - timedelta(days=today.weekday())
+    calendar_days = [start_of_week + timedelta(days=i) for i in range(7)]
+
+    start_date = min(rolling_days[0], start_of_week, date(today.year, 1, 1))
+    end_date = max(calendar_days[-1], date(today.year, 12, 31))
+
+    rows = (
+        DailyTotals.objects
+        .filter(user=user, date__range=(start_date, end_date))
+        .values_list('date', 'calories_in', 'calories_out', *MEAL_TYPES)
+    )
+
+    food_by_day, cardio_by_day = {}, {}
+    food_monthly, cardio_monthly = [0] * 12, [0] * 12
+    for day, calories_in, calories_out, *meals in rows:
+        food_by_day[day] = dict(zip(MEAL_TYPES, meals), total=calories_in)
+        cardio_by_day[day] = {'total': calories_out}
+        if day.year == today.year:
+            food_monthly[day.month - 1] += calories_in
+            cardio_monthly[day.month - 1] += calories_out
+
+    daily = _day_table(
+        today, food_by_day.get(today, {}), cardio_by_day.get(today, {}))
+    rolling = _week_table(rolling_days, food_by_day, cardio_by_day)
+    calendar = _week_table(calendar_days, food_by_day, cardio_by_day)
 
     return {
-        "months": months,
-        "food_totals": food_monthly,
-        "exercise_totals": cardio_monthly,
-        "net_calories": net_monthly,
-        "yearly_totals": {
-            'food_year': sum(food_monthly),
-            'cardio_year': sum(cardio_monthly),
-            'net_year': sum(net_monthly),
+        "daily": daily,
+        "rolling": rolling,
+        "calendar": calendar,
+        "year": _year_table(food_monthly, cardio_monthly),
+        "net": {
+            "day": daily["net_calories"],
+            "rolling_week": sum(rolling["net_calories"]),
+            "calendar_week": sum(calendar["net_calories"]),
         }
     }
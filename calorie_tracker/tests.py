@@ -1,3 +1,1841 @@
-from django.test import TestCase
+from asgiref.sync import sync_to_async
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+import gzip
+import io
+import json
+import re
+import tempfile
+import threading
+import numpy as np
+from collections import Counter
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, get_resolver, reverse
+from django.utils import timezone
+from .models import (
+    UserProfile,
+    FoodLog,
+    CardioLog,
+    DailyTotals,
+    FrequentMeal,
+    WeightMeasurement
+)
+from .services import net_calorie_day, net_calorie_rolling_week
+from . import (
+    autocomplete,
+    charts,
+    compaction,
+    exporters,
+    heatmap,
+    importers,
+    metrics,
+    pagination,
+    summary_cache,
+    trends,
+    views
+)
+from .importers import import_logs
+from .seeding import seed_user
+from .timing import RequestTimings
+from .tables import (
+    get_day_summary,
+    get_week_summary,
+    get_calendar_week_summary,
+    get_year_summary,
+    get_rolling_week_summary,
+    get_dashboard_summary,
+)
 
-# Create your tests here.
+
+def at(day, hour=12):
+    return timezone.make_aware(datetime.combine(day, time(hour)))
+
+
+class SummaryTableTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester', password='secret')
+        cls.monday = date(2025, 9, 1)
+        for offset in range(7):
+            day = cls.monday + timedelta(days=offset)
+            FoodLog.objects.create(
+                user=cls.user, timestamp=at(day, 8), meal_name='Oats',
+                meal_type=FoodLog.BREAKFAST, calories_in=300)
+            FoodLog.objects.create(
+                user=cls.user, timestamp=at(day, 19), meal_name='Pasta',
+                meal_type=FoodLog.DINNER, calories_in=700 + offset)
+            CardioLog.objects.create(
+                user=cls.user, timestamp=at(day, 7), cardio_name='Run',
+                duration=30, calories_out=250)
+
+    def test_day_summary(self):
+        summary = get_day_summary(self.user, self.monday)
+        self.assertEqual(summary['table_data'], {
+            FoodLog.BREAKFAST: 300,
+            FoodLog.LUNCH: 0,
+            FoodLog.DINNER: 700,
+            FoodLog.SNACK: 0,
+        })
+        self.assertEqual(summary['food_total'], 1000)
+        self.assertEqual(summary['exercise_total'], 250)
+        self.assertEqual(summary['net_calories'], 750)
+
+    def test_week_summary_values(self):
+        summary = get_calendar_week_summary(self.user, self.monday)
+        self.assertEqual(
+            summary['days'],
+            ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'])
+        self.assertEqual(
+            summary['table_data'][FoodLog.DINNER],
+            [700, 701, 702, 703, 704, 705, 706])
+        self.assertEqual(summary['exercise_totals'], [250] * 7)
+        self.assertEqual(summary['net_calories'][0], 750)
+        self.assertEqual(summary['meal_totals'][FoodLog.BREAKFAST], 2100)
+
+    def test_week_summary_query_count_is_fixed(self):
+        for days_count in (7, 28):
+            with CaptureQueriesContext(connection) as ctx:
+                get_week_summary(self.user, self.monday, days_count)
+            self.assertEqual(len(ctx), 2)
+
+    def test_week_summary_views_render(self):
+        self.client.force_login(self.user)
+        for name in ('calendar_week_summary', 'rolling_week_summary'):
+            response = self.client.get(
+                f'/tracker/{name.replace("_", "-")}/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.context['days']), 7)
+
+
+class YearSummaryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('yearly', password='secret')
+        for month in (1, 6, 12):
+            FoodLog.objects.create(
+                user=cls.user, timestamp=at(date(2025, month, 15)),
+                meal_name='Soup', meal_type=FoodLog.LUNCH,
+                calories_in=100 * month)
+        CardioLog.objects.create(
+            user=cls.user, timestamp=at(date(2025, 6, 2)),
+            cardio_name='Swim', duration=40, calories_out=150)
+        # outside the year, must not leak into the totals
+        FoodLog.objects.create(
+            user=cls.user, timestamp=at(date(2024, 12, 31)),
+            meal_name='Cake', meal_type=FoodLog.SNACK, calories_in=999)
+
+    def test_year_totals(self):
+        self.assertEqual(FoodLog.total_food_year(self.user, 2025), 1900)
+        self.assertEqual(CardioLog.total_burn_year(self.user, 2025), 150)
+        breakdown = FoodLog.monthly_food_breakdown(self.user, 2025)
+        self.assertEqual(breakdown[5]['month_name'], 'June')
+        self.assertEqual(breakdown[5]['total'], 600)
+
+    def test_year_summary_uses_one_query_per_model(self):
+        with CaptureQueriesContext(connection) as ctx:
+            summary = get_year_summary(self.user, 2025)
+        self.assertEqual(len(ctx), 2)
+        self.assertEqual(summary['net_calories'][5], 450)
+        self.assertEqual(summary['yearly_totals'], {
+            'food_year': 1900,
+            'cardio_year': 150,
+            'net_year': 1750,
+        })
+
+
+class DailyTotalsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('rollup', password='secret')
+        cls.day = date(2025, 3, 10)
+
+    def totals(self, day=None):
+        return DailyTotals.objects.get(user=self.user, date=day or self.day)
+
+    def test_create_update_and_delete_keep_rollup_current(self):
+        log = FoodLog.objects.create(
+            user=self.user, timestamp=at(self.day), meal_name='Toast',
+            meal_type=FoodLog.BREAKFAST, calories_in=200)
+        FoodLog.objects.create(
+            user=self.user, timestamp=at(self.day), meal_name='Salad',
+            meal_type=FoodLog.LUNCH, calories_in=400)
+        CardioLog.objects.create(
+            user=self.user, timestamp=at(self.day), cardio_name='Row',
+            duration=20, calories_out=180)
+        row = self.totals()
+        self.assertEqual(
+            (row.breakfast, row.lunch, row.calories_in, row.calories_out),
+            (200, 400, 600, 180))
+        self.assertEqual((row.food_count, row.cardio_count), (2, 1))
+
+        # move the log to another day and meal type
+        log = FoodLog.objects.get(pk=log.pk)
+        log.timestamp = at(self.day + timedelta(days=1))
+        log.meal_type = FoodLog.SNACK
+        log.calories_in = 250
+        log.save()
+        row = self.totals()
+        self.assertEqual((row.breakfast, row.calories_in), (0, 400))
+        moved = self.totals(self.day + timedelta(days=1))
+        self.assertEqual((moved.snack, moved.food_count), (250, 1))
+
+        log.delete()
+        moved.refresh_from_db()
+        self.assertEqual((moved.calories_in, moved.food_count), (0, 0))
+
+    def test_helpers_read_from_rollup(self):
+        DailyTotals.objects.create(
+            user=self.user, date=self.day, calories_in=900,
+            calories_out=100)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(net_calorie_day(self.user, self.day), 800)
+        self.assertEqual(len(ctx), 1)
+        self.assertNotIn('foodlog', ctx[0]['sql'])
+        self.assertEqual(FoodLog.total_food_month(self.user, 2025, 3), 900)
+
+    def test_reconcile_fixes_drift(self):
+        FoodLog.objects.create(
+            user=self.user, timestamp=at(self.day), meal_name='Rice',
+            meal_type=FoodLog.DINNER, calories_in=500)
+        FoodLog.objects.filter(user=self.user).update(calories_in=550)
+        DailyTotals.objects.create(
+            user=self.user, date=date(2020, 1, 1), calories_in=1)
+
+        self.assertEqual(
+            DailyTotals.reconcile_user(self.user.pk), (0, 1, 1))
+        self.assertEqual(self.totals().dinner, 550)
+        self.assertEqual(
+            DailyTotals.reconcile_user(self.user.pk), (0, 0, 0))
+
+
+class WindowQueryPlanTests(TestCase):
+    """
+    EXPLAIN the helper querysets to check the (user, local_date) index is
+    range-scanned rather than only matched on user
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('planner', password='secret')
+
+    def assertRangeScan(self, queryset):
+        plan = queryset.explain()
+        if connection.vendor == 'sqlite':
+            self.assertRegex(plan, r'USING INDEX calorie_tra_user_id_\w+')
+            self.assertIn('local_date>?', plan)
+            self.assertIn('local_date<?', plan)
+        elif connection.vendor == 'postgresql':
+            self.assertIn('Index Cond', plan)
+            self.assertRegex(plan, r'local_date >= ')
+        else:
+            self.skipTest(f'no plan expectations for {connection.vendor}')
+
+    def test_log_helpers_range_scan_the_index(self):
+        for model in (FoodLog, CardioLog):
+            self.assertRangeScan(model.logs_for_day(self.user))
+            self.assertRangeScan(model.logs_for_rolling_week(self.user))
+            self.assertRangeScan(model.logs_for_calendar_week(self.user))
+            self.assertRangeScan(model.logs_for_months(self.user))
+            self.assertRangeScan(model.logs_for_year(self.user, None))
+
+    def test_window_bounds_are_half_open(self):
+        log = FoodLog.objects.create(
+            user=self.user, timestamp=at(date(2025, 2, 1), 0),
+            meal_name='Midnight', meal_type=FoodLog.SNACK, calories_in=90)
+        self.assertQuerySetEqual(
+            FoodLog.logs_for_months(self.user, 2025, 2), [log])
+        self.assertFalse(FoodLog.logs_for_months(self.user, 2025, 1))
+        self.assertFalse(
+            FoodLog.logs_for_day(self.user, date(2025, 1, 31)))
+
+
+class LocalDateTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tokyo', password='secret')
+        cls.user.profile.timezone = 'Asia/Tokyo'
+        cls.user.profile.save()
+
+    def test_logs_bucket_into_the_users_day(self):
+        # 20:00 UTC on the 1st is the morning of the 2nd in Tokyo
+        log = FoodLog.objects.create(
+            user=self.user, timestamp=at(date(2025, 5, 1), 20),
+            meal_name='Natto', meal_type=FoodLog.BREAKFAST, calories_in=150)
+        self.assertEqual(log.local_date, date(2025, 5, 2))
+        self.assertQuerySetEqual(
+            FoodLog.logs_for_day(self.user, date(2025, 5, 2)), [log])
+        self.assertEqual(
+            FoodLog.total_food_day(self.user, date(2025, 5, 2)), 150)
+        self.assertEqual(
+            FoodLog.total_food_day(self.user, date(2025, 5, 1)), 0)
+
+    def test_timezone_change_rebuckets_history(self):
+        FoodLog.objects.create(
+            user=self.user, timestamp=at(date(2025, 5, 1), 20),
+            meal_name='Natto', meal_type=FoodLog.BREAKFAST, calories_in=150)
+        self.client.force_login(self.user)
+        response = self.client.post('/tracker/profile/update', {
+            'timezone': 'UTC',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            FoodLog.objects.get(user=self.user).local_date, date(2025, 5, 1))
+        self.assertEqual(
+            FoodLog.total_food_day(self.user, date(2025, 5, 1)), 150)
+
+
+class ProfileTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('profiled', password='secret')
+
+    def test_login_leaves_the_profile_table_alone(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(
+                self.client.login(username='profiled', password='secret'))
+        self.assertTrue(queries)
+        self.assertFalse([
+            query for query in queries
+            if 'calorie_tracker_userprofile' in query['sql']
+        ])
+
+    def test_request_profile_is_read_once_and_created_if_missing(self):
+        UserProfile.objects.filter(user=self.user).delete()
+        self.client.force_login(self.user)
+        response = self.client.get('/tracker/profile/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.context['user_profile'],
+            UserProfile.objects.get(user=self.user))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/tracker/profile/')
+        self.assertEqual(len([
+            query for query in queries
+            if 'calorie_tracker_userprofile' in query['sql']
+        ]), 1)
+
+
+class SummaryCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('cached', password='secret')
+        cls.day = date(2025, 4, 7)
+
+    def log_food(self, calories):
+        return FoodLog.objects.create(
+            user=self.user, timestamp=at(self.day), meal_name='Wrap',
+            meal_type=FoodLog.LUNCH, calories_in=calories)
+
+    def test_summaries_are_cached_until_the_users_data_changes(self):
+        self.log_food(500)
+        self.assertEqual(get_day_summary(self.user, self.day)['food_total'],
+                         500)
+        with self.assertNumQueries(0):
+            get_day_summary(self.user, self.day)
+            get_day_summary(self.user, self.day)
+
+        log = self.log_food(250)
+        self.assertEqual(get_day_summary(self.user, self.day)['food_total'],
+                         750)
+        log.delete()
+        self.assertEqual(net_calorie_day(self.user, self.day), 500)
+
+    def test_concurrent_miss_waits_for_the_lock_holder(self):
+        args = (timezone.localdate(), (self.day,), [])
+        name = 'calorie_tracker.services.net_calorie_day'
+        key = summary_cache.summary_key(self.user.pk, name, args)
+        # another worker holds the lock and publishes its result shortly
+        cache.add(f'{key}:lock', 1)
+        threading.Timer(0.1, cache.set, (key, 1234)).start()
+        with self.assertNumQueries(0):
+            self.assertEqual(net_calorie_day(self.user, self.day), 1234)
+
+
+class DashboardSummaryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('dash', password='secret')
+        cls.today = date(2025, 1, 2)  # Thursday, week starts in 2024
+        for offset in range(-10, 3):
+            day = cls.today + timedelta(days=offset)
+            FoodLog.objects.create(
+                user=cls.user, timestamp=at(day), meal_name='Stew',
+                meal_type=FoodLog.DINNER, calories_in=600 + offset)
+            CardioLog.objects.create(
+                user=cls.user, timestamp=at(day), cardio_name='Bike',
+                duration=45, calories_out=300)
+
+    def test_engine_matches_per_table_helpers(self):
+        with self.assertNumQueries(1):
+            summary = get_dashboard_summary.uncached(self.user, self.today)
+        self.assertEqual(
+            summary['daily'],
+            get_day_summary.uncached(self.user, self.today))
+        self.assertEqual(
+            summary['rolling'],
+            get_rolling_week_summary(self.user, self.today))
+        self.assertEqual(
+            summary['calendar'],
+            get_calendar_week_summary(self.user, self.today))
+        self.assertEqual(
+            summary['year'], get_year_summary.uncached(self.user, 2025))
+        self.assertEqual(
+            summary['net']['rolling_week'],
+            net_calorie_rolling_week.uncached(self.user, self.today))
+
+    def test_dashboard_query_count_does_not_grow_with_history(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as before:
+            self.assertEqual(self.client.get('/').status_code, 200)
+        for offset in range(1, 60):
+            FoodLog.objects.create(
+                user=self.user, timestamp=timezone.now()
+                - timedelta(days=offset), meal_name='Pie',
+                meal_type=FoodLog.SNACK, calories_in=300)
+        with CaptureQueriesContext(connection) as after:
+            self.client.get('/')
+        self.assertEqual(len(after), len(before))
+        self.assertLessEqual(len(after), 6)
+
+    def test_unchanged_dashboard_reuses_cached_panels(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        FoodLog.objects.create(
+            user=self.user, timestamp=timezone.now(), meal_name='Soup',
+            meal_type=FoodLog.LUNCH, calories_in=777)
+        self.assertContains(self.client.get('/'), '777')
+
+        with mock.patch(
+                'calorie_tracker.views.get_dashboard_summary') as summary, \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/')
+        self.assertContains(response, '777')
+        summary.assert_not_called()
+        # session, user and profile; no summary or cardio log queries
+        self.assertEqual(len(queries), 3)
+
+        # a new log bumps the data version and the panels render afresh
+        FoodLog.objects.create(
+            user=self.user, timestamp=timezone.now(), meal_name='Bread',
+            meal_type=FoodLog.LUNCH, calories_in=111)
+        self.assertContains(self.client.get('/'), '888')
+
+
+class ImportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('importer', password='secret')
+
+    def test_csv_import_validates_dedupes_and_updates_rollup(self):
+        data = (
+            "timestamp,meal_name,meal_desc,meal_type,calories_in\n"
+            "2025-06-01 08:00,Eggs,,breakfast,320\n"
+            "2025-06-01 08:00,Eggs,,breakfast,320\n"
+            "2025-06-01 13:00,Soup,Tomato,lunch,0\n"
+            "2025-06-01 19:00,Curry,,brunch,700\n"
+            "2025-06-02 19:00,Curry,,dinner,700\n"
+        )
+        stats = import_logs(
+            self.user, 'food', io.BytesIO(data.encode()), 'csv',
+            batch_size=2)
+        self.assertEqual(stats['created'], 2)
+        self.assertEqual(stats['duplicates'], 1)
+        self.assertEqual(stats['invalid'], 2)
+        self.assertEqual(
+            {line for line, _ in stats['errors']}, {4, 5})
+        self.assertEqual(
+            FoodLog.total_food_day(self.user, date(2025, 6, 1)), 320)
+
+        # re-importing the same file creates nothing new
+        stats = import_logs(
+            self.user, 'food', io.BytesIO(data.encode()), 'csv')
+        self.assertEqual(stats['created'], 0)
+        self.assertEqual(FoodLog.objects.filter(user=self.user).count(), 2)
+
+    def test_json_array_is_parsed_across_read_boundaries(self):
+        records = [
+            {
+                'timestamp': f'2025-06-{day:02d}T07:00:00Z',
+                'cardio_name': 'Run',
+                'duration': 30,
+                'calories_out': 250.5,
+            }
+            for day in range(1, 21)
+        ]
+        payload = io.StringIO(json.dumps(records, indent=2))
+        with mock.patch.object(importers, 'JSON_CHUNK_SIZE', 64):
+            stats = import_logs(self.user, 'cardio', payload, 'json')
+        self.assertEqual(stats['created'], 20)
+        self.assertEqual(
+            CardioLog.total_burn_month(self.user, 2025, 6), 20 * 250.5)
+
+    def test_upload_view(self):
+        self.client.force_login(self.user)
+        upload = SimpleUploadedFile(
+            'history.ndjson',
+            b'{"timestamp": "2025-06-03 12:00", "meal_name": "Bagel", '
+            b'"meal_type": "snack", "calories_in": 280}\n')
+        response = self.client.post(
+            '/tracker/import/', {'kind': 'food', 'file': upload})
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(FoodLog.objects.filter(meal_name='Bagel').exists())
+
+
+class ExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('exporter', password='secret')
+        for day in range(1, 8):
+            FoodLog.objects.create(
+                user=cls.user, timestamp=at(date(2025, 7, day)),
+                meal_name=f'Meal {day}', meal_type=FoodLog.LUNCH,
+                calories_in=100 * day)
+        other = User.objects.create_user('someone', password='secret')
+        FoodLog.objects.create(
+            user=other, timestamp=at(date(2025, 7, 1)), meal_name='Hidden',
+            meal_type=FoodLog.LUNCH, calories_in=1)
+
+    def test_keyset_batches_cover_every_row_once(self):
+        rows = list(exporters.iter_log_rows('food', self.user, chunk_size=3))
+        self.assertEqual([row[1] for row in rows],
+                         [f'Meal {day}' for day in range(1, 8)])
+
+    def test_csv_export_filters_by_date(self):
+        self.client.force_login(self.user)
+        response = self.client.get(
+            '/tracker/export/food.csv?start=2025-07-02&end=2025-07-03')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        body = b''.join(response.streaming_content).decode()
+        self.assertEqual(body.splitlines(), [
+            'timestamp,meal_name,meal_desc,meal_type,calories_in',
+            '2025-07-02T12:00:00+00:00,Meal 2,,lunch,200.0',
+            '2025-07-03T12:00:00+00:00,Meal 3,,lunch,300.0',
+        ])
+
+    def test_ndjson_export_is_gzipped_and_reimportable(self):
+        self.client.force_login(self.user)
+        response = self.client.get(
+            '/tracker/export/food.ndjson', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        body = gzip.decompress(b''.join(response.streaming_content))
+
+        stats = import_logs(self.user, 'food', io.BytesIO(body), 'ndjson')
+        self.assertEqual((stats['read'], stats['duplicates']), (7, 7))
+
+    def test_bad_requests(self):
+        self.client.force_login(self.user)
+        self.assertEqual(
+            self.client.get('/tracker/export/food.xml').status_code, 404)
+        self.assertEqual(
+            self.client.get(
+                '/tracker/export/food.csv?start=July').status_code, 400)
+
+
+class SummaryApiTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('poller', password='secret')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        FoodLog.objects.create(
+            user=self.user, timestamp=timezone.now(), meal_name='Toast',
+            meal_type=FoodLog.BREAKFAST, calories_in=300)
+
+    def test_day_summary_json(self):
+        response = self.client.get('/tracker/api/summary/day/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header('ETag'))
+        self.assertEqual(response.json()['food_total'], 300)
+
+    def test_unchanged_data_revalidates_without_recomputing(self):
+        url = '/tracker/api/summary/rolling-week/'
+        etag = self.client.get(url)['ETag']
+
+        summary = mock.Mock()
+        with mock.patch.dict(
+                views.SUMMARY_PANELS, {'rolling-week': summary}):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        summary.assert_not_called()
+
+        FoodLog.objects.create(
+            user=self.user, timestamp=timezone.now(), meal_name='Soup',
+            meal_type=FoodLog.LUNCH, calories_in=200)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(sum(response.json()['food_totals']), 500)
+
+    def test_year_parameter(self):
+        response = self.client.get('/tracker/api/summary/year/?year=2020')
+        self.assertEqual(response.json()['yearly_totals']['food_year'], 0)
+        for year in ('last', '0', '-1', '9999', '10000', '\u00b2', '\u0662'):
+            response = self.client.get(
+                '/tracker/api/summary/year/', {'year': year})
+            self.assertEqual(response.status_code, 400, year)
+            self.assertIn('error', response.json())
+        self.assertEqual(
+            self.client.get('/tracker/api/summary/month/').status_code, 404)
+
+
+class HistoryPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('historian', password='secret')
+        # two logs share each timestamp, so ties are broken by id
+        for day in range(1, 6):
+            for name in ('A', 'B'):
+                FoodLog.objects.create(
+                    user=cls.user, timestamp=at(date(2025, 8, day)),
+                    meal_name=f'{name}{day}', meal_type=FoodLog.SNACK,
+                    calories_in=100)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_api_walks_every_log_once_newest_first(self):
+        seen, cursor = [], ''
+        while True:
+            with CaptureQueriesContext(connection) as queries:
+                data = self.client.get(
+                    '/tracker/api/history/food/',
+                    {'page_size': 3, 'cursor': cursor}).json()
+            self.assertFalse(
+                any('COUNT(' in q['sql'] for q in queries.captured_queries))
+            seen += [log['meal_name'] for log in data['results']]
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+
+        expected = FoodLog.objects.filter(user=self.user).order_by(
+            '-timestamp', '-id').values_list('meal_name', flat=True)
+        self.assertEqual(seen, list(expected))
+
+    def test_history_view_follows_cursor(self):
+        first = self.client.get('/tracker/food/history/')
+        self.assertEqual(len(first.context['food_logs']), 10)
+        self.assertIsNone(first.context['next_cursor'])
+
+        _, cursor = pagination.keyset_page(
+            FoodLog.objects.filter(user=self.user), page_size=4)
+        response = self.client.get(
+            '/tracker/food/history/', {'cursor': cursor})
+        self.assertEqual(
+            response.context['food_logs'][0].pk,
+            FoodLog.objects.filter(user=self.user).order_by(
+                '-timestamp', '-id')[4].pk)
+
+    def test_deep_pages_seek_the_index(self):
+        cursor_filter = pagination.keyset_filter(
+            at(date(2025, 8, 3)), 5, descending=True)
+        plan = (
+            FoodLog.objects.filter(user=self.user)
+            .filter(cursor_filter)
+            .order_by('-timestamp', '-id')[:26]
+            .explain()
+        )
+        if connection.vendor == 'sqlite':
+            self.assertIn('(user_id=? AND timestamp<?)', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+        elif connection.vendor == 'postgresql':
+            self.assertRegex(plan, r'Index Cond: .*timestamp <= ')
+        else:
+            self.skipTest(f'no plan expectations for {connection.vendor}')
+
+    def test_bad_cursor(self):
+        self.assertEqual(
+            self.client.get(
+                '/tracker/food/history/?cursor=nope').status_code, 400)
+        self.assertEqual(
+            self.client.get(
+                '/tracker/api/history/food/?page_size=0').status_code, 400)
+
+
+class AsyncDashboardTests(TransactionTestCase):
+    """
+    The async views run the summary on a connection of its own, which
+    can't see a TestCase's uncommitted rows, hence TransactionTestCase
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('async', password='secret')
+        FoodLog.objects.create(
+            user=self.user, timestamp=timezone.now(), meal_name='Rice',
+            meal_type=FoodLog.DINNER, calories_in=650)
+        CardioLog.objects.create(
+            user=self.user, timestamp=timezone.now(), cardio_name='Row',
+            duration=20, calories_out=180)
+
+    async def test_async_dashboard_matches_sync(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get('/tracker/async/')
+        self.assertEqual(response.status_code, 200)
+
+        await sync_to_async(self.client.force_login)(self.user)
+        expected = await sync_to_async(self.client.get)('/tracker/')
+        for key in ('net_calorie_day', 'net_calorie_rolling_week',
+                    'daily', 'rolling', 'calendar', 'year', 'bmi'):
+            self.assertEqual(response.context[key], expected.context[key])
+        self.assertEqual(
+            [log.cardio_name for log in response.context['cardio_logs_day']],
+            ['Row'])
+
+    async def test_server_timing_counts_queries_on_worker_threads(self):
+        await self.async_client.aforce_login(self.user)
+        await sync_to_async(self.client.force_login)(self.user)
+        await sync_to_async(cache.clear)()
+        expected = await sync_to_async(self.client.get)('/tracker/')
+        await sync_to_async(cache.clear)()
+        response = await self.async_client.get('/tracker/async/')
+
+        # the summary's query runs on a thread of its own
+        def db(response):
+            return response['Server-Timing'].split(',')[0]
+
+        self.assertIn('desc="5 queries"', db(expected))
+        self.assertIn('desc="5 queries"', db(response))
+
+    async def test_async_summary_views(self):
+        response = await self.async_client.get('/tracker/async/')
+        self.assertEqual(response.status_code, 302)
+
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(
+            '/tracker/async/rolling-week-summary/')
+        self.assertEqual(sum(response.context['food_totals']), 650)
+        response = await self.async_client.get(
+            '/tracker/async/yearly-summary/2020/')
+        self.assertEqual(response.context['summary_stats']['food_year'], 0)
+        for year in (0, 9999, 10000):
+            response = await self.async_client.get(
+                f'/tracker/async/yearly-summary/{year}/')
+            self.assertEqual(response.status_code, 404)
+
+
+class SeedAndBenchTests(TestCase):
+
+    def seed(self, prefix):
+        call_command(
+            'seed_logs', users=2, years=0.1, prefix=prefix, seed=7,
+            end=date(2025, 6, 30), stdout=io.StringIO())
+
+    def logs(self, username):
+        return list(
+            FoodLog.objects.filter(user__username=username)
+            .order_by('timestamp', 'id')
+            .values_list('timestamp', 'meal_type', 'calories_in'))
+
+    def test_seeding_is_deterministic_and_keeps_rollup_in_step(self):
+        self.seed('a')
+        rows = self.logs('a-light-0')
+        self.assertTrue(rows)
+        User.objects.filter(username__startswith='a-').delete()
+
+        self.seed('a')
+        self.assertEqual(self.logs('a-light-0'), rows)
+        for user in User.objects.filter(username__startswith='a-'):
+            self.assertEqual(
+                DailyTotals.reconcile_user(user.pk, dry_run=True), (0, 0, 0))
+
+    def test_existing_users_are_not_reseeded(self):
+        self.seed('b')
+        with self.assertRaises(CommandError):
+            self.seed('b')
+
+    def test_bench_writes_json_per_tier(self):
+        self.seed('c')
+        out = io.StringIO()
+        with self.settings(ALLOWED_HOSTS=['localhost']):
+            call_command(
+                'bench_summaries', repeat=1, output='-',
+                stdout=out, stderr=io.StringIO())
+        results = json.loads(out.getvalue())
+        self.assertEqual(set(results['users']), {'small', 'median', 'heavy'})
+        heavy = results['users']['heavy']
+        self.assertEqual(heavy['user'], 'c-median-1')
+        self.assertEqual(
+            heavy['functions']['tables.get_dashboard_summary']['queries'], 1)
+        self.assertIn('calorie_tracker:home[cold]', heavy['views'])
+
+
+# query budgets
+#
+# every routed GET is requested as a user with seeded history and must stay
+# within a declared number of queries and of rows fetched; a new route
+# without a budget fails too, so N+1s can't creep in unnoticed
+
+QUERY_BUDGETS = {
+    # name: (max queries, max rows fetched, None where rows grow with the
+    # requested data by design)
+    # session, user and profile lookups account for three of each, the
+    # profile read once by UserTimezoneMiddleware and shared as
+    # request.profile
+    'home': (5, 400),
+    'calorie_tracker:home': (5, 400),
+    'calorie_tracker:calendar_week_summary': (5, 20),
+    'calorie_tracker:rolling_week_summary': (5, 20),
+    'calorie_tracker:profile_detail': (3, 3),
+    'calorie_tracker:profile_update': (3, 3),
+    'calorie_tracker:food_day': (4, 40),
+    'calorie_tracker:add_food': (4, 23),
+    'calorie_tracker:meal_autocomplete': (3, 3),
+    'calorie_tracker:food_detail': (4, 4),
+    'calorie_tracker:update_food': (4, 4),
+    'calorie_tracker:delete_food': (4, 4),
+    'calorie_tracker:food_calendar_week': (5, 150),
+    'calorie_tracker:food_rolling_week': (5, 150),
+    'calorie_tracker:food_history': (4, 29),
+    'calorie_tracker:cardio_day': (4, 10),
+    'calorie_tracker:add_cardio': (3, 3),
+    'calorie_tracker:cardio_detail': (4, 4),
+    'calorie_tracker:update_cardio': (4, 4),
+    'calorie_tracker:delete_cardio': (4, 4),
+    'calorie_tracker:cardio_calendar_week': (5, 20),
+    'calorie_tracker:cardio_rolling_week': (5, 20),
+    'calorie_tracker:cardio_history': (4, 29),
+    'calorie_tracker:import_logs': (3, 3),
+    'calorie_tracker:export_logs': (4, None),
+    'calorie_tracker:summary_api': (5, 5),
+    'calorie_tracker:history_api': (4, 29),
+    'calorie_tracker:metrics': (3, 3),
+    'calorie_tracker:quick_log': (12, 5),
+    'calorie_tracker:quick_log_api': (4, 23),
+    'calorie_tracker:heatmap_api': (4, 370),
+    'calorie_tracker:trends': (4, None),
+    'calorie_tracker:weight_series_api': (4, None),
+    # async views, see AsyncQueryBudgetTests
+    'calorie_tracker:home_async': (5, 400),
+    'calorie_tracker:async_daily_summary': (5, 10),
+    'calorie_tracker:async_calendar_week_summary': (5, 20),
+    'calorie_tracker:async_rolling_week_summary': (5, 20),
+    'calorie_tracker:async_yearly_summary': (5, 20),
+}
+# routes that only accept POST, requested with an empty POST instead
+POST_ROUTES = {'calorie_tracker:quick_log'}
+# URL kwargs by converter name; pk is filled with one of the user's rows
+ROUTE_KWARGS = {
+    'kind': 'food',
+    'fmt': 'csv',
+    'panel': 'day',
+    'year': 2025,
+}
+# third-party apps
+SKIPPED_ROUTES = ('admin/', 'accounts/', '__debug__/')
+# async views, whose queries run on connections of their own; measured by
+# AsyncQueryBudgetTests
+ASYNC_ROUTES = ('tracker/async/',)
+
+
+def walk_routes(patterns, prefix='', namespace=None):
+    """
+    Yield (route, URL name) for every pattern, following includes
+    """
+    for pattern in patterns:
+        route = prefix + str(pattern.pattern)
+        if isinstance(pattern, URLResolver):
+            yield from walk_routes(
+                pattern.url_patterns, route,
+                pattern.namespace or namespace)
+        elif pattern.name:
+            name = f'{namespace}:{pattern.name}' if namespace else pattern.name
+            yield route, name, pattern
+
+
+def sql_shape(sql):
+    # collapse IN lists so batches of different sizes group together
+    return re.sub(r'IN \((%s(, )?)+\)', 'IN (...)', sql)
+
+
+class QueryLog:
+    """
+    execute_wrapper recording each statement, to count the rows afterwards
+    """
+
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.statements.append((sql, params))
+        return execute(sql, params, many, context)
+
+    def rows_fetched(self):
+        total = 0
+        with connection.cursor() as cursor:
+            for sql, params in self.statements:
+                if sql.lstrip().upper().startswith('SELECT'):
+                    cursor.execute(
+                        f'SELECT COUNT(*) FROM ({sql}) AS fetched', params)
+                    total += cursor.fetchone()[0]
+        return total
+
+    def report(self):
+        shapes = Counter(sql_shape(sql) for sql, _ in self.statements)
+        return '\n'.join(
+            f'  {count} x {shape}' for shape, count in shapes.most_common())
+
+
+def over_budget(name, url, log):
+    """
+    A failure message if the route's queries went over its budget
+    """
+    max_queries, max_rows = QUERY_BUDGETS[name]
+    queries, rows = len(log.statements), log.rows_fetched()
+    if queries > max_queries or (max_rows is not None and rows > max_rows):
+        return (
+            f"{name} ({url}): {queries} queries, {rows} rows, "
+            f"budget {max_queries} queries, {max_rows} rows\n"
+            f"{log.report()}"
+        )
+
+
+class QueryBudgetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('budget', password='secret')
+        seed_user(cls.user, 'heavy', 0.25, timezone.localdate(), seed=1)
+
+    def route_kwargs(self, name, pattern):
+        kwargs = {}
+        for param in pattern.pattern.converters:
+            if param == 'pk':
+                model = (
+                    FrequentMeal if 'quick' in name
+                    else CardioLog if 'cardio' in name
+                    else FoodLog
+                )
+                kwargs['pk'] = model.objects.filter(user=self.user).first().pk
+            else:
+                kwargs[param] = ROUTE_KWARGS[param]
+        return kwargs
+
+    def measure(self, url, method='get'):
+        cache.clear()
+        log = QueryLog()
+        with connection.execute_wrapper(log):
+            response = getattr(self.client, method)(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400, url)
+        return log
+
+    def test_every_route_stays_within_its_budget(self):
+        self.client.force_login(self.user)
+        failures = []
+        for route, name, pattern in walk_routes(get_resolver().url_patterns):
+            if route.startswith(SKIPPED_ROUTES + ASYNC_ROUTES):
+                continue
+            if name not in QUERY_BUDGETS:
+                failures.append(f"{name} ({route}) has no query budget")
+                continue
+
+            url = reverse(name, kwargs=self.route_kwargs(name, pattern))
+            log = self.measure(
+                url, 'post' if name in POST_ROUTES else 'get')
+            failures.append(over_budget(name, url, log))
+
+        failures = [failure for failure in failures if failure]
+        if failures:
+            self.fail('\n'.join(failures))
+
+    def test_over_budget_report_groups_sql_by_shape(self):
+        log = QueryLog()
+        with connection.execute_wrapper(log):
+            for log_id in (1, 2, 3):
+                list(FoodLog.objects.filter(pk=log_id))
+            list(FoodLog.objects.filter(pk__in=[1, 2]))
+            list(FoodLog.objects.filter(pk__in=[1, 2, 3]))
+        report = log.report().splitlines()
+        self.assertEqual(len(report), 2)
+        self.assertTrue(report[0].startswith('  3 x SELECT'))
+        self.assertIn('IN (...)', report[1])
+
+
+class AsyncQueryBudgetTests(TransactionTestCase):
+    """
+    The async routes, requested with the AsyncClient
+
+    Their summaries run on worker threads with connections of their own,
+    which can't see a TestCase's uncommitted rows, and which a wrapper on
+    the test's connection doesn't see either. Every connection reports
+    to the request's RequestTimings (see timing.py), so statements are
+    collected there.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('async-budget')
+        seed_user(self.user, 'heavy', 0.25, timezone.localdate(), seed=1)
+
+    async def measure(self, url):
+        await sync_to_async(cache.clear)()
+        log = QueryLog()
+        timed = RequestTimings.__call__
+
+        def record(timings, execute, sql, params, many, context):
+            log.statements.append((sql, params))
+            return timed(timings, execute, sql, params, many, context)
+
+        with mock.patch.object(RequestTimings, '__call__', record):
+            response = await self.async_client.get(url)
+        self.assertLess(response.status_code, 400, url)
+        return log
+
+    async def test_every_async_route_stays_within_its_budget(self):
+        await self.async_client.aforce_login(self.user)
+        failures = []
+        routes = [
+            (route, name, pattern)
+            for route, name, pattern in walk_routes(
+                get_resolver().url_patterns)
+            if route.startswith(ASYNC_ROUTES)
+        ]
+        self.assertTrue(routes)
+        for route, name, pattern in routes:
+            if name not in QUERY_BUDGETS:
+                failures.append(f"{name} ({route}) has no query budget")
+                continue
+            url = reverse(name, kwargs={
+                param: ROUTE_KWARGS[param]
+                for param in pattern.pattern.converters
+            })
+            log = await self.measure(url)
+            failures.append(
+                await sync_to_async(over_budget)(name, url, log))
+
+        failures = [failure for failure in failures if failure]
+        if failures:
+            self.fail('\n'.join(failures))
+
+
+class ServerTimingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('timed', password='secret')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def timings(self, response):
+        return {
+            name: dict(part.split('=', 1) for part in params)
+            for name, *params in (
+                metric.strip().split(';')
+                for metric in response['Server-Timing'].split(',')
+            )
+        }
+
+    def test_header_and_log_line(self):
+        with self.assertLogs('calorie_tracker.timing', 'INFO') as logs:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/tracker/')
+
+        timings = self.timings(response)
+        self.assertEqual(
+            set(timings), {'db', 'view', 'render', 'total'})
+        self.assertEqual(
+            timings['db']['desc'], f'"{len(queries)} queries"')
+        self.assertGreater(float(timings['render']['dur']), 0)
+
+        record = logs.records[0]
+        self.assertEqual(record.url_name, 'calorie_tracker:home')
+        self.assertEqual(record.queries, len(queries))
+        self.assertTrue(record.getMessage().startswith(
+            'calorie_tracker:home 200 db='))
+
+    def test_render_inside_view_is_not_view_time(self):
+        # rolling_week_summary renders with render(), the dashboard with a
+        # TemplateResponse; both report a render phase
+        response = self.client.get('/tracker/rolling-week-summary/')
+        timings = self.timings(response)
+        self.assertGreater(float(timings['render']['dur']), 0)
+        self.assertLessEqual(
+            float(timings['view']['dur']) + float(timings['render']['dur']),
+            float(timings['total']['dur']) + 0.2)
+
+
+class MetricsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('member', password='secret')
+        cls.staff = User.objects.create_user(
+            'ops', password='secret', is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+        self.registry = metrics.MetricsRegistry()
+        patcher = mock.patch.object(metrics, 'registry', self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # the middleware imported the module-level registry by name
+        patcher = mock.patch(
+            'calorie_tracker.middleware.registry', self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_histogram_buckets_are_upper_inclusive(self):
+        hist = metrics.Histogram((1, 5))
+        for value in (1, 2, 5, 9):
+            hist.observe(value)
+        self.assertEqual(hist.counts, [1, 2, 1])
+        self.assertEqual(hist.total, 17)
+
+    def test_requests_are_observed_and_exposed(self):
+        self.client.force_login(self.user)
+        self.client.get('/tracker/')
+        self.client.get('/tracker/')
+
+        self.client.force_login(self.staff)
+        response = self.client.get('/tracker/metrics/')
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode()
+        self.assertIn(
+            '# TYPE calorie_tracker_request_duration_seconds histogram', body)
+        self.assertIn(
+            'calorie_tracker_request_duration_seconds_count'
+            '{url_name="calorie_tracker:home"} 2', body)
+        self.assertIn(
+            'calorie_tracker_request_queries_bucket'
+            '{url_name="calorie_tracker:home",le="+Inf"} 2', body)
+
+    def test_worker_snapshots_are_merged(self):
+        other = metrics.MetricsRegistry()
+        other.worker = 'elsewhere:1'
+        other.observe('calorie_tracker:home', 0.02, 4)
+        other.flush()
+        self.registry.observe('calorie_tracker:home', 0.2, 6)
+
+        merged = metrics.merged_histograms()
+        latency = merged[('latency', 'calorie_tracker:home')]
+        self.assertEqual(sum(latency.counts), 2)
+        self.assertAlmostEqual(latency.total, 0.22)
+
+    def test_staff_only(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/tracker/metrics/').status_code, 302)
+
+
+class MealAutocompleteTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('hungry', password='secret')
+        for day, (name, meal_type, calories) in enumerate([
+            ('Porridge', FoodLog.BREAKFAST, 300),
+            ('Pasta bake', FoodLog.DINNER, 700),
+            ('porridge', FoodLog.SNACK, 350),
+            ('Pizza', FoodLog.DINNER, 900),
+            ('Porridge', FoodLog.BREAKFAST, 320),
+        ], start=1):
+            FoodLog.objects.create(
+                user=cls.user, timestamp=at(date(2025, 9, day)),
+                meal_name=name, meal_type=meal_type, calories_in=calories)
+
+    def setUp(self):
+        cache.clear()
+        autocomplete._indexes.clear()
+
+    def test_prefix_search_ranks_by_use(self):
+        results = autocomplete.suggest_meals(self.user.pk, 'p')
+        self.assertEqual(
+            [r['meal_name'] for r in results],
+            ['Porridge', 'Pasta bake', 'Pizza'])
+        self.assertEqual(results[0], {
+            'meal_name': 'Porridge',
+            'meal_type': FoodLog.BREAKFAST,
+            'calories_in': 320,
+        })
+        self.assertEqual(
+            autocomplete.suggest_meals(self.user.pk, 'PA')[0]['meal_name'],
+            'Pasta bake')
+        self.assertEqual(autocomplete.suggest_meals(self.user.pk, 'q'), [])
+
+    def test_index_is_reused_and_updated_in_place(self):
+        autocomplete.suggest_meals(self.user.pk, 'p')
+        with self.captureOnCommitCallbacks(execute=True):
+            FoodLog.objects.create(
+                user=self.user, timestamp=at(date(2025, 9, 9)),
+                meal_name='Quiche', meal_type=FoodLog.LUNCH, calories_in=450)
+
+        with self.assertNumQueries(0):
+            results = autocomplete.suggest_meals(self.user.pk, 'qu')
+        self.assertEqual(results[0]['calories_in'], 450)
+
+    def test_changes_elsewhere_rebuild_the_index(self):
+        autocomplete.suggest_meals(self.user.pk, 'p')
+        FoodLog.objects.filter(meal_name='Pizza').update(
+            meal_name='Quesadilla')
+        summary_cache.bump_data_version(self.user.pk)
+        self.assertEqual(
+            autocomplete.suggest_meals(self.user.pk, 'q')[0]['meal_name'],
+            'Quesadilla')
+
+    def test_endpoint(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/tracker/food/autocomplete/?q=piz')
+        self.assertEqual(response.json()['results'][0]['meal_type'], 'dinner')
+
+
+class FrequentMealTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('regular', password='secret')
+        # toast was logged often, but months ago; porridge lately
+        for day in range(1, 11):
+            FoodLog.objects.create(
+                user=cls.user, timestamp=at(date(2025, 3, day)),
+                meal_name='Toast', meal_type=FoodLog.BREAKFAST,
+                calories_in=250)
+        for day in range(1, 4):
+            FoodLog.objects.create(
+                user=cls.user, timestamp=at(date(2025, 9, day)),
+                meal_name='Porridge', meal_type=FoodLog.BREAKFAST,
+                calories_in=300 + day)
+
+    def assertMatchesRebuild(self):
+        def rows():
+            return {
+                (row.meal_type, row.name_key): (row.count, row.score)
+                for row in FrequentMeal.objects.filter(user=self.user)
+            }
+        kept = rows()
+        FrequentMeal.rebuild_user(self.user.pk)
+        rebuilt = rows()
+        self.assertEqual(kept.keys(), rebuilt.keys())
+        for key, (count, score) in rebuilt.items():
+            self.assertEqual(kept[key][0], count)
+            self.assertAlmostEqual(kept[key][1], score, places=6)
+
+    def test_recent_use_outranks_older_frequent_use(self):
+        meals = list(FrequentMeal.top_for_user(self.user))
+        self.assertEqual(
+            [(meal.meal_name, meal.count) for meal in meals],
+            [('Porridge', 3), ('Toast', 10)])
+        # the latest log is the template for quick logging
+        self.assertEqual(meals[0].calories_in, 303)
+
+    def test_saves_and_deletes_keep_rows_incremental(self):
+        log = FoodLog.objects.create(
+            user=self.user, timestamp=at(date(2025, 9, 5)),
+            meal_name='toast ', meal_type=FoodLog.BREAKFAST, calories_in=260)
+        self.assertEqual(
+            FrequentMeal.objects.get(name_key='toast').count, 11)
+        self.assertMatchesRebuild()
+
+        log = FoodLog.objects.get(pk=log.pk)
+        log.meal_type = FoodLog.SNACK
+        log.save()
+        self.assertMatchesRebuild()
+
+        FoodLog.objects.filter(meal_name='Porridge').first().delete()
+        self.assertMatchesRebuild()
+        FoodLog.objects.get(pk=log.pk).delete()
+        self.assertFalse(FrequentMeal.objects.filter(
+            meal_type=FoodLog.SNACK).exists())
+        self.assertMatchesRebuild()
+
+    def test_rescoring_matches_names_saved_with_whitespace(self):
+        # removing a use that dominates the score falls back to rescoring
+        # the remaining logs, which must be matched by name_key
+        FoodLog.objects.create(
+            user=self.user, timestamp=at(date(2020, 1, 1)),
+            meal_name=' Soup ', meal_type=FoodLog.LUNCH, calories_in=200)
+        recent = FoodLog.objects.create(
+            user=self.user, timestamp=at(date(2025, 9, 1)),
+            meal_name='Soup', meal_type=FoodLog.LUNCH, calories_in=220)
+        recent.delete()
+        self.assertEqual(
+            FrequentMeal.objects.get(
+                meal_type=FoodLog.LUNCH, name_key='soup').count, 1)
+        self.assertMatchesRebuild()
+
+    def test_top_meals_are_limited_per_type_in_one_query(self):
+        for i in range(8):
+            FoodLog.objects.create(
+                user=self.user, timestamp=at(date(2025, 8, 1 + i)),
+                meal_name=f'Dish {i}', meal_type=FoodLog.DINNER,
+                calories_in=600)
+        with self.assertNumQueries(1):
+            meals = list(FrequentMeal.top_for_user(self.user))
+        self.assertEqual(
+            [meal.meal_type for meal in meals].count(FoodLog.DINNER),
+            FrequentMeal.TOP_N)
+        self.assertEqual(meals[2].meal_name, 'Dish 7')
+
+    def test_import_updates_frequent_meals(self):
+        data = (
+            "timestamp,meal_name,meal_desc,meal_type,calories_in\n"
+            "2025-09-10 08:00,Porridge,,breakfast,310\n"
+            "2025-09-10 13:00,Soup,,lunch,400\n"
+        )
+        import_logs(self.user, 'food', io.BytesIO(data.encode()), 'csv')
+        self.assertEqual(
+            FrequentMeal.objects.get(name_key='porridge').count, 4)
+        self.assertTrue(FrequentMeal.objects.filter(name_key='soup').exists())
+        self.assertMatchesRebuild()
+
+    def test_quick_log_and_endpoint(self):
+        self.client.force_login(self.user)
+        results = self.client.get('/tracker/api/quick-log/').json()['results']
+        porridge = results['breakfast'][0]
+        self.assertEqual(porridge['meal_name'], 'Porridge')
+
+        url = f"/tracker/food/quick-log/{porridge['id']}/"
+        self.assertEqual(self.client.get(url).status_code, 405)
+        response = self.client.post(url)
+        self.assertRedirects(
+            response, reverse('calorie_tracker:home'),
+            fetch_redirect_response=False)
+        logged = FoodLog.objects.filter(
+            user=self.user, meal_name='Porridge').latest('timestamp')
+        self.assertEqual(logged.calories_in, 303)
+        self.assertEqual(
+            FrequentMeal.objects.get(name_key='porridge').count, 4)
+
+        other = User.objects.create_user('stranger')
+        self.client.force_login(other)
+        self.assertEqual(self.client.post(url).status_code, 404)
+
+
+class HeatmapTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('painter', password='secret')
+        FoodLog.objects.create(
+            user=cls.user, timestamp=at(date(2021, 1, 1)),
+            meal_name='Cake', meal_type=FoodLog.SNACK, calories_in=450.5)
+        FoodLog.objects.create(
+            user=cls.user, timestamp=at(date(2025, 12, 31)),
+            meal_name='Soup', meal_type=FoodLog.DINNER, calories_in=600)
+        CardioLog.objects.create(
+            user=cls.user, timestamp=at(date(2025, 12, 31)),
+            cardio_name='Run', duration=30, calories_out=250)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_series_are_dense_and_indexed_by_day_offset(self):
+        start, end = date(2021, 1, 1), date(2025, 12, 31)
+        with self.assertNumQueries(1):
+            result = heatmap.get_heatmap.uncached(self.user, start, end)
+        self.assertEqual(result['days'], 1826)
+
+        calories_in = heatmap.decode_series(result['calories_in'])
+        net = heatmap.decode_series(result['net'])
+        self.assertEqual(len(calories_in), 1826)
+        self.assertEqual(calories_in[0], 450.5)
+        self.assertEqual(net[-1], 350)
+        self.assertEqual(sum(net[1:-1]), 0)
+
+    def test_endpoint(self):
+        self.client.force_login(self.user)
+        url = '/tracker/api/heatmap/'
+        response = self.client.get(
+            url, {'start': '2025-12-01', 'end': '2025-12-31'})
+        result = response.json()
+        self.assertEqual(result['encoding'], 'base64-float32le')
+        self.assertEqual(
+            heatmap.decode_series(result['calories_out'])[30], 250)
+
+        # the ETag is checked before anything is computed
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                url, {'start': '2025-12-01', 'end': '2025-12-31'},
+                HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        for params in ({'start': '2019-01-01', 'end': '2025-12-31'},
+                       {'start': '2025-12-31', 'end': '2025-12-01'},
+                       {'end': 'soon'}):
+            self.assertEqual(
+                self.client.get(url, params).status_code, 400)
+
+
+class TrendsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('trender', password='secret')
+        cls.user.profile.weight = 80
+        cls.user.profile.weight_goal = 75
+        cls.user.profile.cardio_goal = 500
+        cls.user.profile.save()
+        cls.today = date(2025, 9, 30)  # a Tuesday
+        for i in range(60):
+            day = cls.today - timedelta(days=i)
+            FoodLog.objects.create(
+                user=cls.user, timestamp=at(day),
+                meal_name='Meal', meal_type=FoodLog.LUNCH,
+                calories_in=2000 if i % 2 else 1600)
+            if day.weekday() in (0, 2) and i < 30:
+                CardioLog.objects.create(
+                    user=cls.user, timestamp=at(day), cardio_name='Run',
+                    duration=30, calories_out=300)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_vector_helpers_match_plain_loops(self):
+        values = np.array([float(v) for v in range(1, 41)])
+        averages = trends.moving_average(values, 7)
+        for i in (0, 3, 6, 20, 39):
+            window = values[max(0, i - 6):i + 1]
+            self.assertAlmostEqual(averages[i], window.mean())
+
+        alpha = 2 / (trends.EWMA_SPAN + 1)
+        smoothed = trends.ewma(values)
+        for i in (0, 5, 39):
+            weights = (1 - alpha) ** np.arange(i + 1)
+            expected = (values[i::-1] * weights).sum() / weights.sum()
+            self.assertAlmostEqual(smoothed[i], expected, places=3)
+
+        mondays, totals = trends.weekly_totals(date(2025, 9, 3), np.ones(12))
+        self.assertEqual(mondays, [date(2025, 9, 1), date(2025, 9, 8)])
+        self.assertEqual(list(totals), [5, 7])
+
+    def test_goal_projection(self):
+        net = np.full(30, 1400.0)
+        # maintenance 2400, so 1000 kcal a day under: 5kg in 38.5 days
+        self.assertEqual(
+            trends.project_goal_date(self.today, net, 80, 75),
+            self.today + timedelta(days=39))
+        self.assertIsNone(trends.project_goal_date(self.today, net, 80, 85))
+        self.assertIsNone(trends.project_goal_date(self.today, net, None, 75))
+
+    def test_goal_projection_skips_days_without_logs(self):
+        # logged every third day; the gaps must not read as fasting
+        net = np.zeros(30)
+        net[::3] = 1400
+        logged = net > 0
+        self.assertEqual(
+            trends.project_goal_date(self.today, net, 80, 75, logged),
+            self.today + timedelta(days=39))
+        # too few logged days in the window to project from
+        logged[:18] = False
+        self.assertIsNone(
+            trends.project_goal_date(self.today, net, 80, 75, logged))
+
+        # the page's projection, after a fortnight without logs
+        FoodLog.objects.filter(
+            user=self.user,
+            local_date__gt=self.today - timedelta(days=14)).delete()
+        result = trends.get_trends.uncached(
+            self.user, self.today, 80, 75, 500)
+        # 16 logged days at 1800 in, 1500 of cardio: 693.75 kcal a day
+        # under maintenance, so 5kg in 55.5 days
+        self.assertEqual(
+            result['projected_date'], self.today + timedelta(days=56))
+
+    def test_trends_load_the_history_once(self):
+        with self.assertNumQueries(1):
+            result = trends.get_trends.uncached(
+                self.user, self.today, 80, 75, 500)
+        self.assertEqual(result['latest']['date'], self.today)
+        # four 1600 and three 2000 calorie days, two runs
+        self.assertAlmostEqual(
+            result['latest']['net_7'], (4 * 1600 + 3 * 2000 - 600) / 7)
+        # this week has one run so far, the four before it two each
+        self.assertEqual(
+            [week['met'] for week in result['weeks'][:6]],
+            [False, True, True, True, True, False])
+        # the unfinished current week is left out
+        self.assertEqual(result['adherence'], 4 / 9)
+        self.assertIsNotNone(result['projected_date'])
+
+    def test_page(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/tracker/trends/')
+        self.assertContains(response, 'Weeks meeting cardio goal')
+
+
+class WeightSeriesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('weigher', password='secret')
+        start = at(date(2023, 1, 1), 7)
+        WeightMeasurement.objects.bulk_create(
+            WeightMeasurement(
+                user=cls.user,
+                measured_at=start + timedelta(days=i),
+                weight=90 - i / 100 + (5 if i == 400 else 0))
+            for i in range(1000)
+        )
+
+    def test_lttb_keeps_ends_and_spikes(self):
+        x = np.arange(1000, dtype=float)
+        y = np.zeros(1000)
+        y[437] = 10
+        indices = charts.lttb(x, y, 50)
+        self.assertEqual(len(indices), 50)
+        self.assertEqual((indices[0], indices[-1]), (0, 999))
+        self.assertIn(437, indices)
+        self.assertTrue((np.diff(indices) > 0).all())
+        self.assertEqual(len(charts.lttb(x[:20], y[:20], 50)), 20)
+
+    def test_profile_weight_follows_the_latest_measurement(self):
+        self.assertIsNone(UserProfile.objects.get(user=self.user).weight)
+        latest = WeightMeasurement.objects.create(user=self.user, weight=70)
+        self.assertEqual(UserProfile.objects.get(user=self.user).weight, 70)
+        latest.delete()
+        self.assertEqual(
+            UserProfile.objects.get(user=self.user).weight,
+            Decimal('80.01'))
+        with self.assertRaises(ValueError):
+            WeightMeasurement.objects.first().save()
+
+    def test_profile_form_records_a_measurement(self):
+        self.client.force_login(self.user)
+        self.client.post('/tracker/profile/update', {
+            'weight': '72.5', 'timezone': 'UTC'})
+        self.assertEqual(
+            self.user.weight_measurements.latest('measured_at').weight,
+            Decimal('72.5'))
+        self.assertEqual(self.user.weight_measurements.count(), 1001)
+
+    def test_admin_shows_measurements_read_only(self):
+        staff = User.objects.create_superuser('scales', password='secret')
+        self.client.force_login(staff)
+        measurement = self.user.weight_measurements.first()
+        url = f'/admin/calorie_tracker/weightmeasurement/{measurement.pk}/'
+        url += 'change/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'name="weight"')
+        response = self.client.post(url, {
+            'user': self.user.pk, 'weight': '1',
+            'measured_at_0': '2023-01-01', 'measured_at_1': '07:00:00'})
+        self.assertEqual(response.status_code, 403)
+        measurement.refresh_from_db()
+        self.assertNotEqual(measurement.weight, 1)
+
+        response = self.client.get(
+            '/admin/calorie_tracker/weightmeasurement/',
+            {'user': self.user.pk})
+        self.assertEqual(response.status_code, 200)
+        # the autocomplete filter, not a link per user
+        self.assertNotContains(response, 'user__id__exact')
+
+    def test_endpoint(self):
+        self.client.force_login(self.user)
+        url = '/tracker/api/weight-series/'
+        result = self.client.get(url, {'points': 100}).json()
+        self.assertEqual(result['count'], 1000)
+        self.assertEqual(len(result['points']), 100)
+        # the one-day spike on day 400 survives
+        self.assertIn(91, [weight for _, weight in result['points']])
+
+        result = self.client.get(
+            url, {'start': '2023-01-01', 'end': '2023-01-10'}).json()
+        self.assertEqual(len(result['points']), 10)
+        self.assertEqual(self.client.get(url, {'points': 1}).status_code, 400)
+
+
+class LargeTableAdminTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_superuser('staff', password='secret')
+        cls.users = [
+            User.objects.create_user(f'logger-{i}') for i in range(3)]
+        for i, user in enumerate(cls.users):
+            for year in (2023, 2025):
+                FoodLog.objects.create(
+                    user=user, timestamp=at(date(year, 3, 1 + i)),
+                    meal_name=f'Meal {i}', meal_desc='Secret recipe',
+                    meal_type=FoodLog.LUNCH, calories_in=500)
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def test_paginator_estimates_past_the_exact_count_limit(self):
+        logs = FoodLog.objects.order_by('-timestamp')
+        with mock.patch.object(pagination, 'EXACT_COUNT_LIMIT', 4):
+            with CaptureQueriesContext(connection) as captured:
+                count = pagination.EstimatedCountPaginator(logs, 2).count
+            self.assertGreaterEqual(count, 6)
+            self.assertNotIn('COUNT', captured[0]['sql'])
+            paginator = pagination.EstimatedCountPaginator(
+                logs.filter(meal_type=FoodLog.LUNCH), 2)
+            self.assertEqual(paginator.count, 4)
+            self.assertTrue(paginator.capped)
+
+            response = self.client.get(
+                '/admin/calorie_tracker/foodlog/', {'meal_type': 'lunch'})
+            self.assertContains(response, 'Only the first 4 matching rows')
+        paginator = pagination.EstimatedCountPaginator(
+            logs.filter(user=self.users[0]), 2)
+        self.assertEqual(paginator.count, 2)
+        self.assertFalse(paginator.capped)
+
+    def test_changelist_lists_no_users_and_loads_list_columns(self):
+        url = '/admin/calorie_tracker/foodlog/'
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, '?user=')
+        sql = '\n'.join(query['sql'] for query in captured)
+        # a small table is counted exactly, but never past the limit
+        self.assertIn('LIMIT 10001) subquery', sql)
+        self.assertNotIn('meal_desc', sql)
+        self.assertNotContains(response, 'matching rows are listed')
+
+        links = [choice['title'] for choice in
+                 response.context['cl'].index_date_hierarchy['choices']]
+        self.assertEqual(links, ['2023', '2024', '2025'])
+
+        # the filter's suggestions come from the admin's autocomplete view
+        results = self.client.get('/admin/autocomplete/', {
+            'app_label': 'calorie_tracker', 'model_name': 'foodlog',
+            'field_name': 'user', 'term': 'logger-1',
+        }).json()['results']
+        self.assertEqual(results, [
+            {'id': str(self.users[1].pk), 'text': 'logger-1'}])
+
+        user = self.users[1]
+        response = self.client.get(url, {'user': user.pk})
+        self.assertEqual(
+            {log.user_id for log in response.context['cl'].result_list},
+            {user.pk})
+        self.assertContains(response, user.username)
+
+        response = self.client.get(
+            url, {'timestamp__year': 2025, 'timestamp__month': 3})
+        self.assertEqual(
+            len(response.context['cl'].index_date_hierarchy['choices']), 3)
+
+    def test_changelist_rejects_bad_lookups(self):
+        url = '/admin/calorie_tracker/foodlog/'
+        for user in ('abc', '\u00b2'):
+            response = self.client.get(url, {'user': user})
+            self.assertRedirects(
+                response, f'{url}?e=1', fetch_redirect_response=False)
+        response = self.client.get(
+            '/admin/calorie_tracker/weightmeasurement/', {'user': 'abc'})
+        self.assertEqual(response.status_code, 302)
+
+        for params in ({'timestamp__day': 5}, {'timestamp__month': 3},
+                       {'timestamp__month': 3, 'timestamp__day': 5}):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(
+                response.context['cl'].index_date_hierarchy['show'])
+
+    def test_actions_still_get_full_rows(self):
+        user = self.users[0]
+        logs = FoodLog.objects.filter(user=user)
+        url = f'/admin/calorie_tracker/foodlog/?user={user.pk}'
+        self.client.post(url, {
+            'action': 'delete_selected',
+            'index': 0,
+            '_selected_action': list(logs.values_list('pk', flat=True)),
+            'post': 'yes',
+        })
+        self.assertFalse(logs.exists())
+        # the rollup was decremented, which needs the deleted rows' values
+        self.assertEqual(
+            sum(DailyTotals.objects.filter(user=user).values_list(
+                'calories_in', flat=True)), 0)
+
+    def test_bench_compares_against_the_stock_admin(self):
+        out = io.StringIO()
+        call_command(
+            'bench_admin', repeat=1, output='-',
+            stdout=out, stderr=io.StringIO())
+        changelists = json.loads(out.getvalue())['models']['FoodLog'][
+            'changelists']
+        self.assertIn('large[user filter]', changelists)
+        self.assertIn('stock[user filter]', changelists)
+
+
+class CompactionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('archivist', password='secret')
+        seed_user(cls.user, 'median', 0.25, date(2021, 3, 31), seed=3)
+        FoodLog.objects.create(
+            user=cls.user, timestamp=at(date(2025, 6, 1)),
+            meal_name='Recent', meal_type=FoodLog.LUNCH, calories_in=500)
+
+    def setUp(self):
+        cache.clear()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(self.settings(MEDIA_ROOT=media.name))
+
+    def snapshot(self):
+        return (
+            [get_year_summary.uncached(self.user, 2021)],
+            FoodLog.total_food_month(self.user, 2021, 2),
+            CardioLog.total_burn_month(self.user, 2021, 3),
+            list(FrequentMeal.objects.filter(user=self.user).values_list(
+                'name_key', 'meal_type', 'count', 'score').order_by('pk')),
+        )
+
+    def compact(self, **options):
+        call_command(
+            'compact_logs', before=date(2024, 1, 1), stdout=io.StringIO(),
+            **options)
+
+    def test_compaction_archives_logs_and_keeps_totals(self):
+        before = self.snapshot()
+        old_ids = set(FoodLog.objects.filter(
+            local_date__year__lt=2024).values_list('pk', flat=True))
+        days = DailyTotals.objects.filter(user=self.user).count() - 1
+        self.compact(batch_days=20)
+
+        self.assertEqual(self.snapshot(), before)
+        self.assertEqual(
+            list(FoodLog.objects.values_list('meal_name', flat=True)),
+            ['Recent'])
+        self.assertEqual(
+            len(compaction.list_archives(self.user.pk)), -(-days // 20))
+        self.assertEqual(
+            DailyTotals.reconcile_user(self.user.pk), (0, 0, 0))
+
+        # logs added to a compacted day still count, and uncount
+        day = DailyTotals.objects.filter(compacted=True).latest('date').date
+        log = FoodLog.objects.create(
+            user=self.user, timestamp=at(day),
+            meal_name='Late entry', meal_type=FoodLog.SNACK, calories_in=99)
+        log.delete()
+        self.assertEqual(self.snapshot(), before)
+
+        call_command(
+            'restore_logs', 'archivist', start=date(2020, 1, 1),
+            stdout=io.StringIO())
+        self.assertEqual(self.snapshot(), before)
+        self.assertEqual(
+            set(FoodLog.objects.filter(
+                local_date__year__lt=2024).values_list('pk', flat=True)),
+            old_ids)
+        self.assertEqual(compaction.list_archives(self.user.pk), [])
+        self.assertFalse(DailyTotals.objects.filter(compacted=True).exists())
+        self.assertEqual(
+            DailyTotals.reconcile_user(self.user.pk, dry_run=True),
+            (0, 0, 0))
+
+    def test_interrupted_runs_resume(self):
+        before = self.snapshot()
+        compact_days = compaction.compact_days
+        calls = []
+
+        def fail_third_batch(user_id, days):
+            calls.append(days)
+            if len(calls) == 3:
+                # after writing the archive, before the deletes commit
+                compaction._write_archive(user_id, days, [{'kind': 'x'}])
+                raise RuntimeError("interrupted")
+            return compact_days(user_id, days)
+
+        with mock.patch.object(
+                compaction, 'compact_days', fail_third_batch):
+            with self.assertRaises(RuntimeError):
+                self.compact(batch_days=10)
+        self.assertTrue(FoodLog.objects.filter(
+            local_date__year=2021).exists())
+
+        self.compact(batch_days=30)
+        self.assertEqual(self.snapshot(), before)
+        self.assertFalse(FoodLog.objects.filter(
+            local_date__year__lt=2024).exists())
+
+        # the aborted batch's archive is left over, nothing is duplicated
+        restored = compaction.restore_archives(self.user.pk)
+        self.assertEqual(
+            restored,
+            FoodLog.objects.filter(local_date__year__lt=2024).count()
+            + CardioLog.objects.filter(local_date__year__lt=2024).count())
+        self.assertEqual(self.snapshot(), before)
+
+    def test_log_added_while_a_batch_is_archived_is_kept(self):
+        user = User.objects.create_user('racer', password='secret')
+        day = date(2020, 1, 1)
+        FoodLog.objects.create(
+            user=user, timestamp=at(day), meal_name='Old',
+            meal_type=FoodLog.LUNCH, calories_in=100)
+        write_archive = compaction._write_archive
+
+        def write_then_import(user_id, days, records):
+            name = write_archive(user_id, days, records)
+            FoodLog.objects.create(
+                user=user, timestamp=at(day), meal_name='Imported',
+                meal_type=FoodLog.SNACK, calories_in=50)
+            return name
+
+        with mock.patch.object(
+                compaction, '_write_archive', write_then_import):
+            self.assertEqual(compaction.compact_days(user.pk, [day]), 1)
+        self.assertEqual(
+            list(FoodLog.objects.filter(user=user).values_list(
+                'meal_name', flat=True)),
+            ['Imported'])
+        self.assertEqual(
+            DailyTotals.objects.get(user=user, date=day).calories_in, 150)
+
+        # the next run archives it, and a restore brings both back
+        list(compaction.compact_user(user.pk, date(2020, 1, 2)))
+        self.assertFalse(FoodLog.objects.filter(user=user).exists())
+        self.assertEqual(compaction.restore_archives(user.pk), 2)
+        self.assertEqual(
+            DailyTotals.reconcile_user(user.pk, dry_run=True), (0, 0, 0))
+
+    def test_back_dated_log_on_a_compacted_day_keeps_earlier_archive(self):
+        user = User.objects.create_user('backdated', password='secret')
+        days = [date(2020, 1, 1), date(2020, 1, 2), date(2020, 1, 3)]
+        for day, calories in zip(days, (100, 200, 300)):
+            FoodLog.objects.create(
+                user=user, timestamp=at(day), meal_name='Old',
+                meal_type=FoodLog.LUNCH, calories_in=calories)
+        list(compaction.compact_user(user.pk, date(2020, 1, 4)))
+        FoodLog.objects.create(
+            user=user, timestamp=at(days[0]), meal_name='Late',
+            meal_type=FoodLog.SNACK, calories_in=50)
+        list(compaction.compact_user(user.pk, date(2020, 1, 4)))
+
+        def totals():
+            return list(DailyTotals.objects.filter(user=user).order_by(
+                'date').values_list('calories_in', flat=True))
+
+        self.assertEqual(totals(), [150, 200, 300])
+        self.assertEqual(
+            [archive[:2] for archive in compaction.list_archives(user.pk)],
+            [(days[0], days[0]), (days[0], days[2])])
+
+        # restoring the 2nd brings back the 1st's archives too
+        self.assertEqual(
+            compaction.restore_archives(user.pk, days[1], days[1]), 4)
+        self.assertEqual(totals(), [150, 200, 300])
+        self.assertEqual(
+            sorted(FoodLog.objects.filter(user=user).values_list(
+                'calories_in', flat=True)),
+            [50, 100, 200, 300])
+        self.assertEqual(
+            DailyTotals.reconcile_user(user.pk, dry_run=True), (0, 0, 0))
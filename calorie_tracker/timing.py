@@ -0,0 +1,113 @@
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.backends.django import DjangoTemplates
+import contextvars
+import threading
+import time
+
+# per-request phase timings for ServerTimingMiddleware
+#
+# the middleware puts a RequestTimings in a context variable for the
+# request; the query wrapper and the template backend below add to it.
+# Every connection, on whichever thread, gets the wrapper when it opens,
+# and sync_to_async copies the context variable into its worker threads,
+# so queries the async views run elsewhere count towards their request.
+
+current_timings = contextvars.ContextVar('current_timings', default=None)
+
+
+class RequestTimings:
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.render = 0.0
+        self.view_started = None
+        self.view = None
+        self._lock = threading.Lock()
+
+    def view_finished(self):
+        if self.view is None and self.view_started is not None:
+            # a render() inside the view counts as rendering, not view time
+            elapsed = time.perf_counter() - self.view_started
+            self.view = elapsed - self.render
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            # concurrent queries from worker threads
+            with self._lock:
+                self.db += elapsed
+                self.queries += 1
+
+    def metrics(self):
+        """
+        (name, milliseconds, description) per phase
+
+        Query time overlaps the view and render phases it happened in, and
+        queries run concurrently on several threads add up.
+        """
+        total = time.perf_counter() - self.started
+        metrics = [
+            ('db', self.db, f'{self.queries} queries'),
+        ]
+        if self.view is not None:
+            metrics.append(('view', self.view, 'view code'))
+        metrics += [
+            ('render', self.render, 'templates'),
+            ('total', total, 'request'),
+        ]
+        return [
+            (name, round(seconds * 1000, 1), desc)
+            for name, seconds, desc in metrics
+        ]
+
+
+def record_query(execute, sql, params, many, context):
+    timings = current_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    return timings(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    # fires again on reconnects, the wrapper list outlives them
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class _TimedTemplate:
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        timings = current_timings.get()
+        if timings is None:
+            return self.template.render(context, request)
+        started = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            timings.render += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    The Django template backend, timing each top-level render
+    """
+
+    def from_string(self, template_code):
+        return _TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return _TimedTemplate(super().get_template(template_name))
@@ -0,0 +1,183 @@
+from datetime import timedelta
+import math
+import numpy as np
+from .models import DailyTotals
+from .summary_cache import cached_summary
+
+# trend analytics over a user's whole daily history
+#
+# the DailyTotals rows are loaded once into dense NumPy arrays, one slot
+# per day from the first logged day to today, and every statistic is a
+# vectorized pass over them: moving averages from cumulative sums, the
+# EWMA as a convolution with a truncated exponential kernel, and weekly
+# totals with bincount.
+
+MOVING_WINDOWS = (7, 30)
+EWMA_SPAN = 14  # days; alpha = 2 / (span + 1), as in pandas
+EWMA_TOLERANCE = 1e-6  # kernel weights below this are dropped
+MAINTENANCE_KCAL_PER_KG = 30  # rough daily maintenance per kg bodyweight
+KCAL_PER_KG = 7700  # energy in a kg of body fat
+PROJECTION_WINDOW = 30  # days of recent net calories the forecast uses
+MIN_PROJECTION_DAYS = 7  # logged days in the window needed to forecast
+RECENT_DAYS = 14
+RECENT_WEEKS = 12
+
+
+def load_daily_series(user, end_date):
+    """
+    Get (start date, calories in, calories out) up to end_date
+
+    The arrays hold one float64 per day from the user's first DailyTotals
+    row, zero on days without logs. start is None when there are no rows.
+    """
+    rows = (
+        DailyTotals.objects
+        .filter(user=user, date__lte=end_date)
+        .order_by('date')
+        .values_list('date', 'calories_in', 'calories_out')
+    )
+    rows = list(rows)
+    if not rows:
+        return None, np.zeros(0), np.zeros(0)
+
+    start_date = rows[0][0]
+    days = (end_date - start_date).days + 1
+    offsets = np.fromiter(
+        ((row[0] - start_date).days for row in rows), np.intp, len(rows))
+    calories_in, calories_out = np.zeros(days), np.zeros(days)
+    calories_in[offsets] = [row[1] for row in rows]
+    calories_out[offsets] = [row[2] for row in rows]
+    return start_date, calories_in, calories_out
+
+
+def moving_average(values, window):
+    """
+    Trailing mean over `window` days; the first days average what exists
+    """
+    sums = np.cumsum(values)
+    sums[window:] = sums[window:] - sums[:-window]
+    return sums / np.minimum(np.arange(1, len(values) + 1), window)
+
+
+def ewma(values, span=EWMA_SPAN):
+    """
+    Exponentially weighted moving average
+
+    Computed as one convolution with the weights alpha * (1 - alpha) ** k,
+    cut off once they fall below EWMA_TOLERANCE, and normalised by the
+    weights actually used so the start of the series is not biased to 0.
+    """
+    if not len(values):
+        return np.zeros(0)
+    alpha = 2 / (span + 1)
+    length = math.ceil(math.log(EWMA_TOLERANCE) / math.log(1 - alpha))
+    kernel = alpha * (1 - alpha) ** np.arange(min(length, len(values)))
+    smoothed = np.convolve(values, kernel)[:len(values)]
+    weights = np.cumsum(kernel)
+    weights = np.concatenate(
+        [weights, np.full(len(values) - len(weights), weights[-1])])
+    return smoothed / weights
+
+
+def weekly_totals(start_date, values):
+    """
+    Get (Mondays, totals) for each calendar week the series touches
+    """
+    if not len(values):
+        return [], np.zeros(0)
+    weeks = (np.arange(len(values)) + start_date.weekday()) // 7
+    totals = np.bincount(weeks, weights=values)
+    first_monday = start_date - timedelta(days=start_date.weekday())
+    mondays = [first_monday + timedelta(weeks=i) for i in range(len(totals))]
+    return mondays, totals
+
+
+def project_goal_date(today, net, weight, weight_goal, logged=None):
+    """
+    Estimate when weight_goal is reached at the recent rate of change
+
+    The daily energy balance is the mean net calories of the logged days
+    among the last PROJECTION_WINDOW less a maintenance estimate from the
+    current weight; logged is a boolean mask over net, by default every
+    day. Unlogged days would count as eating nothing. Returns None if
+    there is no weight or goal, fewer than MIN_PROJECTION_DAYS logged
+    days, or the balance points away from the goal; today if the goal is
+    already met.
+    """
+    if not weight or not weight_goal or not len(net):
+        return None
+    weight, weight_goal = float(weight), float(weight_goal)
+    if weight == weight_goal:
+        return today
+
+    recent = net[-PROJECTION_WINDOW:]
+    if logged is not None:
+        recent = recent[logged[-PROJECTION_WINDOW:]]
+    if len(recent) < MIN_PROJECTION_DAYS:
+        return None
+    balance = recent.mean() - MAINTENANCE_KCAL_PER_KG * weight
+    kg_per_day = balance / KCAL_PER_KG
+    days = (weight_goal - weight) / kg_per_day if kg_per_day else -1
+    if days < 0 or days > 365 * 100:
+        return None
+    return today + timedelta(days=math.ceil(days))
+
+
+@cached_summary
+def get_trends(user, today, weight=None, weight_goal=None, cardio_goal=None):
+    """
+    Trend analytics up to today, for the trends page
+
+    The profile values are arguments, not read here, so they are part of
+    the cache key.
+
+    :return:
+    dict containing
+    recent, the last RECENT_DAYS days with their averages, newest first,
+    weeks, the last RECENT_WEEKS weeks' cardio against cardio_goal,
+    adherence, the share of those weeks meeting the goal,
+    latest, today's averages, and projected_date
+    """
+    start_date, calories_in, calories_out = load_daily_series(user, today)
+    net = calories_in - calories_out
+    averages = {
+        f'net_{window}': moving_average(net, window)
+        for window in MOVING_WINDOWS
+    }
+    averages['intake_ewma'] = ewma(calories_in)
+
+    recent = [
+        {
+            'date': today - timedelta(days=i),
+            'net': float(net[-1 - i]),
+            **{name: float(values[-1 - i])
+               for name, values in averages.items()},
+        }
+        for i in range(min(RECENT_DAYS, len(net)))
+    ]
+
+    mondays, burnt = weekly_totals(start_date, calories_out)
+    weeks = [
+        {
+            'monday': monday,
+            'calories_out': float(total),
+            'met': bool(cardio_goal and total >= cardio_goal),
+        }
+        for monday, total in zip(
+            mondays[-RECENT_WEEKS:], burnt[-RECENT_WEEKS:])
+    ]
+    # the current week is still in progress
+    finished = [week for week in weeks if week['monday'] + timedelta(
+        days=6) < today]
+    adherence = None
+    if cardio_goal and finished:
+        adherence = sum(week['met'] for week in finished) / len(finished)
+
+    return {
+        'recent': recent,
+        'weeks': weeks[::-1],
+        'adherence': adherence,
+        'latest': recent[0] if recent else None,
+        'projected_date': project_goal_date(
+            today, net, weight, weight_goal, logged=calories_in > 0),
+    }
@@ -2,6 +2,8 @@ from django.urls import path
 from . import views
 from .views import (
     DashboardView,
+    AsyncDashboardView,
+    TrendsView,
     ProfileDetailView,
     ProfileUpdateView,
     FoodDetailView,
@@ -11,6 +13,7 @@ from .views import (
     FoodCreateView,
     FoodUpdateView,
     FoodDeleteView,
+    FoodHistoryView,
     CardioDetailView,
     CardioDayView,
     CardioCalendarWeekView,
@@ -18,6 +21,8 @@ from .views import (
     CardioCreateView,
     CardioUpdateView,
     CardioDeleteView,
+    CardioHistoryView,
+    ImportLogsView,
 )
 
 app_name = 'calorie_tracker'
@@ -33,6 +38,31 @@ urlpatterns = [
         'rolling-week-summary/',
         views.rolling_week_summary,
         name='rolling_week_summary'),
+    path('trends/', TrendsView.as_view(), name='trends'),
+
+    # Async overview URLS, for ASGI deployments
+
+    path('async/', AsyncDashboardView.as_view(), name='home_async'),
+    path(
+        'async/daily-summary/',
+        views.async_daily_summary,
+        name='async_daily_summary'),
+    path(
+        'async/calendar-week-summary/',
+        views.async_calendar_week_summary,
+        name='async_calendar_week_summary'),
+    path(
+        'async/rolling-week-summary/',
+        views.async_rolling_week_summary,
+        name='async_rolling_week_summary'),
+    path(
+        'async/yearly-summary/',
+        views.async_yearly_summary,
+        name='async_yearly_summary'),
+    path(
+        'async/yearly-summary/<int:year>/',
+        views.async_yearly_summary,
+        name='async_yearly_summary'),
 
     # User profile URLS
 
@@ -43,6 +73,14 @@ urlpatterns = [
 
     path('food/', FoodDayView.as_view(), name='food_day'),
     path('food/add/', FoodCreateView.as_view(), name='add_food'),
+    path(
+        'food/quick-log/<int:pk>/',
+        views.quick_log,
+        name='quick_log'),
+    path(
+        'food/autocomplete/',
+        views.meal_autocomplete,
+        name='meal_autocomplete'),
 
     path('food/<int:pk>/', FoodDetailView.as_view(), name='food_detail'),
     path(
@@ -61,6 +99,7 @@ urlpatterns = [
         'food/week/rolling/',
         FoodRollingWeekView.as_view(),
         name='food_rolling_week'),
+    path('food/history/', FoodHistoryView.as_view(), name='food_history'),
 
     # Cardio URLS
 
@@ -89,4 +128,40 @@ urlpatterns = [
         'cardio/week/rolling/',
         CardioRollingWeekView.as_view(),
         name='cardio_rolling_week'),
+    path(
+        'cardio/history/',
+        CardioHistoryView.as_view(),
+        name='cardio_history'),
+
+    # Import URLS
+
+    path('import/', ImportLogsView.as_view(), name='import_logs'),
+
+    # Export URLS
+
+    path(
+        'export/<str:kind>.<str:fmt>',
+        views.export_logs,
+        name='export_logs'),
+
+    # API URLS
+
+    path(
+        'api/summary/<str:panel>/',
+        views.summary_api,
+        name='summary_api'),
+    path(
+        'api/history/<str:kind>/',
+        views.history_api,
+        name='history_api'),
+    path('api/quick-log/', views.quick_log_api, name='quick_log_api'),
+    path('api/heatmap/', views.heatmap_api, name='heatmap_api'),
+    path(
+        'api/weight-series/',
+        views.weight_series_api,
+        name='weight_series_api'),
+
+    # Metrics URLS
+
+    path('metrics/', views.metrics, name='metrics'),
 ]
@@ -1,154 +1,283 @@
-from django.db.models import Sum
+from asgiref.sync import sync_to_async
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.shortcuts import render, get_object_or_404
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
+from django.core.exceptions import BadRequest
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseBadRequest,
+    JsonResponse,
+    StreamingHttpResponse)
+from django.db import close_old_connections
+from django.shortcuts import render, redirect, get_object_or_404
+from django.template.response import TemplateResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import (
+    condition,
+    require_POST,
+    require_safe
+)
 from django.views.generic import (
     CreateView,
     UpdateView,
     DeleteView,
     ListView,
     DetailView,
-    TemplateView)
+    TemplateView,
+    FormView)
 from django.urls import reverse_lazy
 from django.utils import timezone
-from datetime import timedelta
-from .models import UserProfile, FoodLog, CardioLog
-from .forms import ProfileForm, FoodForm, CardioForm
-from .services import (
-    net_calorie_day,
-    net_calorie_rolling_week,
-    net_calorie_calendar_week,
-    net_calorie_month,
-    net_calorie_year
+from django.utils.functional import SimpleLazyObject
+from datetime import MAXYEAR, MINYEAR, date, datetime, time, timedelta
+import asyncio
+from .models import (
+    UserProfile,
+    FoodLog,
+    CardioLog,
+    DailyTotals,
+    FrequentMeal,
+    WeightMeasurement,
+    user_timezone
+)
+from .forms import ProfileForm, FoodForm, CardioForm, ImportForm
+from .importers import guess_format, import_logs
+from .metrics import merged_histograms, render_prometheus
+from .pagination import (
+    PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    InvalidCursor,
+    keyset_page
+)
+from .summary_cache import SUMMARY_TIMEOUT, data_version
+from .autocomplete import suggest_meals
+from .charts import DEFAULT_POINTS, MAX_POINTS, weight_series
+from .heatmap import MAX_DAYS, get_heatmap
+from .trends import get_trends
+from .exporters import (
+    EXPORT_KINDS,
+    EXPORT_FORMATS,
+    STREAMERS,
+    iter_log_rows
 )
 from .tables import (
     get_day_summary,
     get_calendar_week_summary,
     get_rolling_week_summary,
-    get_year_summary
+    get_year_summary,
+    get_dashboard_summary
 )
 
 
+def _in_own_thread(func):
+    """
+    Wrap a sync function to run on a worker thread with its own database
+    connection, so it can overlap with async ORM queries
+
+    The connection is closed afterwards, unless persistent connections
+    (CONN_MAX_AGE) say to keep it.
+    """
+    def run(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(run, thread_sensitive=False)
+
+
 # overview/dashboard view
 
+
+def _dashboard_panels(user):
+    """
+    Cache keys for the dashboard's summary fragments
+
+    Each panel is cached per user, panel and the date its window starts
+    from, under the data version every log write bumps.
+    """
+    today = timezone.localdate()
+    return {
+        'panel_timeout': SUMMARY_TIMEOUT,
+        'panel_version': data_version(user.pk),
+        'panel_dates': {
+            'day': today,
+            'rolling': today,
+            'calendar': today - timedelta(days=today.weekday()),
+            'year': today.year,
+        },
+    }
+
+
+def _dashboard_context(user_profile, cardio_logs_day, summary):
+    """
+    Template context for the dashboard, shared by the sync and async views
+
+    The summary values are lazy, so a summary passed in lazily is only
+    computed if a cached panel fragment misses.
+    """
+    context = {
+        # set page title
+        'page_title': 'Dashboard',
+
+        # user goals
+        'weight': user_profile.weight,
+        'height': user_profile.height,
+        'weight_goal': user_profile.weight_goal,
+        'cardio_goal': user_profile.cardio_goal,
+        'weight_difference': user_profile.weight_difference,
+        'bmi': user_profile.bmi,
+        'user_profile': user_profile,
+
+        # cardio logs listed under today's table
+        'cardio_logs_day': cardio_logs_day,
+
+        # net calories
+        'net_calorie_day': SimpleLazyObject(
+            lambda: summary['net']['day']),
+        'net_calorie_rolling_week': SimpleLazyObject(
+            lambda: summary['net']['rolling_week']),
+        'net_calorie_calendar_week': SimpleLazyObject(
+            lambda: summary['net']['calendar_week']),
+
+        # summary panels
+        'daily': SimpleLazyObject(lambda: _daily_panel(summary)),
+        'rolling': SimpleLazyObject(lambda: _rolling_panel(summary)),
+        'calendar': SimpleLazyObject(lambda: _calendar_panel(summary)),
+        'year': SimpleLazyObject(lambda: _year_panel(summary)),
+    }
+    return context
+
+
+def _daily_panel(summary):
+    daily_data = summary['daily']
+    return {
+        "date": daily_data["date"],
+        "table_data": daily_data["table_data"],
+        "food_total": daily_data["food_total"],
+        "exercise_total": daily_data["exercise_total"],
+        "net_calories": daily_data["net_calories"],
+
+        "daily_title": "Daily Summary"
+    }
+
+
+def _rolling_panel(summary):
+    rolling_data = summary['rolling']
+    return {
+        "rolling_days": rolling_data["days"],
+        "rolling_table_data": rolling_data["table_data"],
+        "rolling_food_totals": rolling_data["food_totals"],
+        "rolling_exercise_totals": rolling_data["exercise_totals"],
+        "rolling_net_calories": rolling_data["net_calories"],
+    }
+
+
+def _calendar_panel(summary):
+    calendar_data = summary['calendar']
+    return {
+        "days": calendar_data["days"],
+        "table_data": calendar_data["table_data"],
+        "food_totals": calendar_data["food_totals"],
+        "exercise_totals": calendar_data["exercise_totals"],
+        "net_calories": calendar_data["net_calories"],
+    }
+
+
+def _year_panel(summary):
+    # month and year summary data
+    year_data = summary['year']
+    return {
+        'table_data': {
+            'months': year_data['months'],
+            'food_monthly': year_data['food_totals'],
+            'exercise_monthly': year_data['exercise_totals'],
+            'net_monthly': year_data['net_calories'],
+        },
+        'summary_stats': {
+            'food_year': year_data['yearly_totals']['food_year'],
+            'cardio_year': year_data['yearly_totals']['cardio_year'],
+            'net_year': year_data['yearly_totals']['net_year'],
+        }
+    }
+
+
 class DashboardView(LoginRequiredMixin, TemplateView):
 
     template_name = 'overview/dashboard.html'
 
     def get_context_data(self, **kwargs):
-        if self.request.user.is_authenticated:
-            context = super().get_context_data(**kwargs)
+        context = super().get_context_data(**kwargs)
 
-            # set page title
-            context['page_title'] = 'Dashboard'
+        # every summary table comes from one fetch of the user's rows,
+        # made only if one of the cached panels is missing
+        user = self.request.user
+        context.update(_dashboard_context(
+            self.request.profile,
+            CardioLog.logs_for_day(user),
+            SimpleLazyObject(lambda: get_dashboard_summary(user))
+        ))
+        context.update(_dashboard_panels(user))
+        return context
 
-            # user goals
 
-            user_profile, created = UserProfile.objects.get_or_create(
-                user=self.request.user
-            )
+class TrendsView(LoginRequiredMixin, TemplateView):
+    template_name = 'overview/trends.html'
 
-            context['weight'] = user_profile.weight
-            context['height'] = user_profile.height
-            context['weight_goal'] = user_profile.weight_goal
-            context['cardio_goal'] = user_profile.cardio_goal
-            context['weight_difference'] = user_profile.weight_difference
-            context['bmi'] = user_profile.bmi
-            context['user_profile'] = user_profile
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        user_profile = self.request.profile
+        context['page_title'] = "Trends"
+        context['user_profile'] = user_profile
+        context['trends'] = get_trends(
+            self.request.user,
+            timezone.localdate(),
+            user_profile.weight,
+            user_profile.weight_goal,
+            user_profile.cardio_goal
+        )
+        return context
 
-        # food logs
-        context['food_logs_day'] = FoodLog.logs_for_day(
-            self.request.user)
-        context['food_logs_rolling_week'] = FoodLog.logs_for_rolling_week(
-            self.request.user)
-        context['food_logs_calendar_week'] = FoodLog.logs_for_calendar_week(
-            self.request.user)
 
-        # cardio logs
-        context['cardio_logs_day'] = CardioLog.logs_for_day(
-            self.request.user)
-        context['cardio_logs_rolling_week'] = CardioLog.logs_for_rolling_week(
-            self.request.user)
-        context['cardio_logs_calendar_week'] = (
-            CardioLog
-            .logs_for_calendar_week(self.request.user))
+class AsyncDashboardView(TemplateView):
+    """
+    The dashboard for ASGI deployments
 
-        # net calories
-        context['net_calorie_day'] = net_calorie_day(
-            self.request.user)
-        context['net_calorie_rolling_week'] = net_calorie_rolling_week(
-            self.request.user)
-        context['net_calorie_calendar_week'] = net_calorie_calendar_week(
-            self.request.user)
+    Today's cardio logs and the summary tables are independent and fetched
+    concurrently; UserTimezoneMiddleware has already loaded the profile.
+    The async ORM runs every query on one shared thread, so the summary,
+    the expensive part, runs on a thread of its own with its own
+    connection.
+    """
+    template_name = 'overview/dashboard.html'
 
-        # daily summary data
-
-        daily_data = get_day_summary(self.request.user)
-        context.update({
-            'daily': {
-                "date": daily_data["date"],
-                "table_data": daily_data["table_data"],
-                "food_total": daily_data["food_total"],
-                "exercise_total": daily_data["exercise_total"],
-                "net_calories": daily_data["net_calories"],
-
-                "daily_title": "Daily Summary"
-            }
-        })
-
-        # Rolling week summary data
-        rolling_data = get_rolling_week_summary(self.request.user)
-        context.update({
-            'rolling': {
-                "rolling_days": rolling_data["days"],
-                "rolling_table_data": rolling_data["table_data"],
-                "rolling_food_totals": rolling_data["food_totals"],
-                "rolling_exercise_totals": rolling_data["exercise_totals"],
-                "rolling_net_calories": rolling_data["net_calories"],
-            }
-        })
-
-        # Calendar week summary data
-        calendar_data = get_calendar_week_summary(self.request.user)
-        context.update({
-            'calendar': {
-                "days": calendar_data["days"],
-                "table_data": calendar_data["table_data"],
-                "food_totals": calendar_data["food_totals"],
-                "exercise_totals": calendar_data["exercise_totals"],
-                "net_calories": calendar_data["net_calories"],
-            }
-        })
-
-        # month and year summary data
-        year_data = get_year_summary(self.request.user)
-        context.update({
-            'year': {
-                'table_data': {
-                    'months': year_data['months'],
-                    'food_monthly': year_data['food_totals'],
-                    'exercise_monthly': year_data['exercise_totals'],
-                    'net_monthly': year_data['net_calories'],
-                },
-                'summary_stats': {
-                    'food_year': year_data['yearly_totals']['food_year'],
-                    'cardio_year': year_data['yearly_totals']['cardio_year'],
-                    'net_year': year_data['yearly_totals']['net_year'],
-                }
-            }
-        })
+    async def get(self, request, *args, **kwargs):
+        request.user = await request.auser()
+        if not request.user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
 
-        return context
+        async def cardio_logs_day():
+            return [log async for log in CardioLog.logs_for_day(request.user)]
 
+        cardio_logs, summary = await asyncio.gather(
+            cardio_logs_day(),
+            _in_own_thread(get_dashboard_summary)(request.user),
+        )
 
-# fucntional view for viewing summary tables
+        context = self.get_context_data(**kwargs)
+        context.update(
+            _dashboard_context(request.profile, cardio_logs, summary))
+        context.update(_dashboard_panels(request.user))
+        return self.render_to_response(context)
 
 
-def daily_summary(request):
-    user = request.user
-    summary = get_day_summary(user)
+# fucntional view for viewing summary tables
 
-    context = {
+
+def _daily_summary_context(summary):
+    return {
         "date": summary["date"],
         "table_data": summary["table_data"],
         "food_total": summary["food_total"],
@@ -156,175 +285,105 @@ def daily_summary(request):
         "net_calories": summary["net_calories"],
         "daily_title": "Daily Summary",
     }
-    return render(request, "overview/daily_summary.html", context)
-
-
-def calendar_week_summary(request):
-    user = request.user
-    today = timezone.now().date()
-
-    # Get start and end of current week (Monday to Sunday)
-    start_of_week = today - timedelta(days=today.weekday())
-    days = [start_of_week + timedelta(days=i) for i in range(7)]
-    day_names = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
-
-    meal_types = [
-        FoodLog.BREAKFAST,
-        FoodLog.LUNCH,
-        FoodLog.DINNER,
-        FoodLog.SNACK
-    ]
-
-    # Prepare data structure
-    table_data = {meal: [] for meal in meal_types}
-    food_totals = []
-    exercise_totals = []
-    net_calories = []
-
-    for day in days:
-        # For each meal type
-        for meal in meal_types:
-            total = (
-                FoodLog.objects.filter(
-                    user=user, meal_type=meal, timestamp__date=day)
-                .aggregate(Sum('calories_in'))['calories_in__sum'] or 0
-            )
-            table_data[meal].append(total)
 
-        # Daily totals
-        food_total = FoodLog.total_food_day(user, date=day)
-        exercise_total = CardioLog.total_burn_day(user, date=day)
-        net = food_total - exercise_total
 
-        food_totals.append(food_total)
-        exercise_totals.append(exercise_total)
-        net_calories.append(net)
-
-    context = {
+def _calendar_week_summary_context(summary):
+    return {
         "week_type": "Calendar Week",
-        "days": day_names,
-        "table_data": table_data,
-        "food_totals": food_totals,
-        "exercise_totals": exercise_totals,
-        "net_calories": net_calories,
+        "days": summary["days"],
+        "table_data": summary["table_data"],
+        "food_totals": summary["food_totals"],
+        "exercise_totals": summary["exercise_totals"],
+        "net_calories": summary["net_calories"],
         "calendar_title": "Weekly Summary",
     }
 
-    return render(request, "overview/calendar_week_summary.html", context)
-
-
-def rolling_week_summary(request):
-    user = request.user
-    today = timezone.now().date()
-
-    days = [today - timedelta(days=i) for i in range(7)]
 
-    day_names = [day.strftime("%a") for day in days]
+def _rolling_week_summary_context(summary):
+    return {
+        "week_type": "Rolling Week",
+        "days": summary["days"],
+        "table_data": summary["table_data"],
+        "food_totals": summary["food_totals"],
+        "exercise_totals": summary["exercise_totals"],
+        "net_calories": summary["net_calories"],
+        "rolling_title": "Rolling Summary",
+    }
 
-    meal_types = [
-        FoodLog.BREAKFAST,
-        FoodLog.LUNCH,
-        FoodLog.DINNER,
-        FoodLog.SNACK
-    ]
 
-    table_data = {meal: [] for meal in meal_types}
-    food_totals = []
-    exercise_totals = []
-    net_calories = []
-
-    for day in days:
-        for meal in meal_types:
-            total = (
-                FoodLog.objects.filter(
-                    user=user, meal_type=meal, timestamp__date=day)
-                .aggregate(Sum('calories_in'))['calories_in__sum'] or 0
-            )
-            table_data[meal].append(total)
+def _yearly_summary_context(summary):
+    return {
+        "monthly_title": "Monthly Summary",
+        'table_data': {
+            'months': summary['months'],
+            'food_monthly': summary['food_totals'],
+            'exercise_monthly': summary['exercise_totals'],
+            'net_monthly': summary['net_calories'],
+        },
+        'summary_stats': summary['yearly_totals'],
+    }
 
-        food_total = FoodLog.total_food_day(user, date=day)
-        exercise_total = CardioLog.total_burn_day(user, date=day)
-        net = food_total - exercise_total
 
-        food_totals.append(food_total)
-        exercise_totals.append(exercise_total)
-        net_calories.append(net)
+def daily_summary(request):
+    summary = get_day_summary(request.user)
+    context = _daily_summary_context(summary)
+    return render(request, "overview/daily_summary.html", context)
 
-    days.reverse()
-    day_names = [day.strftime("%a") for day in days]
-    food_totals.reverse()
-    exercise_totals.reverse()
-    net_calories.reverse()
 
-    for meal in meal_types:
-        table_data[meal].reverse()
+def calendar_week_summary(request):
+    summary = get_calendar_week_summary(request.user)
+    context = _calendar_week_summary_context(summary)
+    return render(request, "overview/calendar_week_summary.html", context)
 
-    context = {
-        "week_type": "Rolling Week",
-        "days": day_names,
-        "table_data": table_data,
-        "food_totals": food_totals,
-        "exercise_totals": exercise_totals,
-        "net_calories": net_calories,
-        "rolling_title": "Rolling Summary",
-    }
 
+def rolling_week_summary(request):
+    summary = get_rolling_week_summary(request.user)
+    context = _rolling_week_summary_context(summary)
     return render(request, "overview/rolling_week_summary.html", context)
 
 
 def yearly_summary(request, year=None):
-    user = request.user
-    year = year or timezone.now().date().year
-    year = int(year)
-
-    months = [
-        'Jan',
-        'Feb',
-        'Mar',
-        'Apr',
-        'May',
-        'Jun',
-        'Jul',
-        'Aug',
-        'Sep',
-        'Oct',
-        'Nov',
-        'Dec'
-    ]
+    year = year or timezone.localdate().year
+    summary = get_year_summary(request.user, int(year))
+    context = _yearly_summary_context(summary)
+    return render(request, 'overview/yearly_summary.html', context)
 
-    food_monthly = []
-    cardio_monthly = []
-    net_monthly = []
 
-    for month in range(1, 13):
-        food_total = FoodLog.total_food_month(user, year, month)
-        cardio_total = CardioLog.total_burn_month(user, year, month)
-        net_total = net_calorie_month(user, year, month)
+# async summary views for ASGI deployments
+# the summary functions are sync (ORM plus cache) so each runs on a worker
+# thread, and the response is rendered by the handler off the event loop
 
-        food_monthly.append(food_total)
-        cardio_monthly.append(cardio_total)
-        net_monthly.append(net_total)
 
-    food_year = FoodLog.total_food_year(user, year)
-    cardio_year = CardioLog.total_burn_year(user, year)
-    net_year = net_calorie_year(user, year)
+def _async_summary_view(template_name, get_summary, build_context):
+    async def view(request, **kwargs):
+        request.user = await request.auser()
+        if not request.user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        # the year window runs to the start of the next year
+        if not MINYEAR <= kwargs.get('year', MINYEAR) < MAXYEAR:
+            raise Http404("Year out of range")
+        summary = await _in_own_thread(get_summary)(request.user, **kwargs)
+        return TemplateResponse(
+            request, template_name, build_context(summary))
+    return view
 
-    context = {
-        "monthly_title": "Monthly Summary",
-        'table_data': {
-            'months': months,
-            'food_monthly': food_monthly,
-            'exercise_monthly': cardio_monthly,
-            'net_monthly': net_monthly,
-        },
-        'summary_stats': {
-            'food_year': food_year,
-            'cardio_year': cardio_year,
-            'net_year': net_year,
-        }
-    }
 
-    return render(request, 'overview/yearly_summary.html', context)
+async_daily_summary = _async_summary_view(
+    'overview/daily_summary.html',
+    get_day_summary,
+    _daily_summary_context)
+async_calendar_week_summary = _async_summary_view(
+    'overview/calendar_week_summary.html',
+    get_calendar_week_summary,
+    _calendar_week_summary_context)
+async_rolling_week_summary = _async_summary_view(
+    'overview/rolling_week_summary.html',
+    get_rolling_week_summary,
+    _rolling_week_summary_context)
+async_yearly_summary = _async_summary_view(
+    'overview/yearly_summary.html',
+    get_year_summary,
+    _yearly_summary_context)
 
 
 # user profile view
@@ -340,9 +399,7 @@ class ProfileDetailView(LoginRequiredMixin, DetailView):
         return context
 
     def get_object(self, queryset=None):
-        profile, created = UserProfile.objects.get_or_create(
-            user=self.request.user)
-        return profile
+        return self.request.profile
 
 # Views for viewing food logs
 
@@ -399,6 +456,7 @@ class FoodRollingWeekView(ListView):
             self.request.user)
         return context
 
+
 # Views for viewing cardio logs
 
 
@@ -454,6 +512,42 @@ class CardioRollingWeekView(ListView):
             self.request.user)
         return context
 
+
+# keyset-paginated history of food/cardio logs
+
+
+class LogHistoryMixin(LoginRequiredMixin):
+    """
+    Browse all of a user's logs, newest first, one keyset page at a time
+    """
+
+    def get_queryset(self):
+        logs = self.model.objects.filter(user=self.request.user)
+        try:
+            page, self.next_cursor = keyset_page(
+                logs, self.request.GET.get('cursor'))
+        except InvalidCursor as e:
+            raise BadRequest(e)
+        return page
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['next_cursor'] = self.next_cursor
+        return context
+
+
+class FoodHistoryView(LogHistoryMixin, ListView):
+    model = FoodLog
+    template_name = 'food/food_history.html'
+    context_object_name = 'food_logs'
+
+
+class CardioHistoryView(LogHistoryMixin, ListView):
+    model = CardioLog
+    template_name = 'cardio/cardio_history.html'
+    context_object_name = 'cardio_logs'
+
+
 # Create/update/delete Views for adding logs with forms
 
 
@@ -467,6 +561,7 @@ class FoodCreateView(CreateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['page_title'] = "Log Meal"
+        context['quick_meals'] = _quick_meals(self.request.user)
         return context
 
     def form_valid(self, form):
@@ -475,6 +570,24 @@ class FoodCreateView(CreateView):
         return super().form_valid(form)
 
 
+@login_required
+@require_POST
+def quick_log(request, pk):
+    """
+    Log a FrequentMeal again, now
+    """
+    meal = get_object_or_404(FrequentMeal, pk=pk, user=request.user)
+    FoodLog.objects.create(
+        user=request.user,
+        meal_name=meal.meal_name,
+        meal_desc=meal.meal_desc,
+        meal_type=meal.meal_type,
+        calories_in=meal.calories_in,
+    )
+    messages.success(request, f"{meal.meal_name} logged!")
+    return redirect('calorie_tracker:home')
+
+
 class FoodUpdateView(UpdateView):
     model = FoodLog
     form_class = FoodForm
@@ -580,10 +693,8 @@ class ProfileUpdateView(LoginRequiredMixin, UpdateView):
     success_url = reverse_lazy('calorie_tracker:profile_detail')
 
     def get_object(self, queryset=None):
-        # Get or create the profile for the logged-in user
-        profile, created = UserProfile.objects.get_or_create(
-            user=self.request.user)
-        return profile
+        # the logged-in user's profile, loaded by UserTimezoneMiddleware
+        return self.request.profile
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -596,4 +707,306 @@ class ProfileUpdateView(LoginRequiredMixin, UpdateView):
 
     def form_valid(self, form):
         messages.success(self.request, "Goal info saved successfully!")
+        response = super().form_valid(form)
+        if 'weight' in form.changed_data and self.object.weight is not None:
+            # a new weigh-in, which also keeps it as the profile's weight
+            WeightMeasurement.objects.create(
+                user=self.request.user, weight=self.object.weight)
+        if 'timezone' in form.changed_data:
+            # existing logs were bucketed into days in the old timezone
+            tzinfo = self.object.tzinfo
+            FoodLog.refresh_local_dates(self.request.user, tzinfo)
+            CardioLog.refresh_local_dates(self.request.user, tzinfo)
+            DailyTotals.reconcile_user(self.request.user.pk)
+        return response
+
+
+# bulk import of food/cardio history
+
+
+class ImportLogsView(LoginRequiredMixin, FormView):
+    form_class = ImportForm
+    template_name = 'import/import_logs.html'
+    success_url = reverse_lazy('calorie_tracker:import_logs')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['page_title'] = "Import History"
+        return context
+
+    def form_valid(self, form):
+        upload = form.cleaned_data['file']
+        try:
+            stats = import_logs(
+                self.request.user,
+                form.cleaned_data['kind'],
+                upload.file,
+                guess_format(upload.name)
+            )
+        except ValueError as e:
+            # batches before the bad record are already saved
+            form.add_error('file', f"Could not read file: {e}")
+            return self.form_invalid(form)
+
+        messages.success(
+            self.request,
+            f"Imported {stats['created']} logs "
+            f"({stats['duplicates']} duplicates skipped, "
+            f"{stats['invalid']} invalid rows)."
+        )
+        for line_number, errors in stats['errors']:
+            messages.warning(self.request, f"Row {line_number}: {errors}")
         return super().form_valid(form)
+
+
+# streaming export of food/cardio history
+
+
+@login_required
+@gzip_page
+def export_logs(request, kind, fmt):
+    if kind not in EXPORT_KINDS or fmt not in EXPORT_FORMATS:
+        raise Http404("Unknown export")
+
+    # optional inclusive date range
+    dates = {}
+    try:
+        for param in ('start', 'end'):
+            value = request.GET.get(param)
+            dates[param] = date.fromisoformat(value) if value else None
+    except ValueError:
+        return HttpResponseBadRequest("Dates must be YYYY-MM-DD")
+
+    rows = iter_log_rows(kind, request.user, dates['start'], dates['end'])
+    response = StreamingHttpResponse(
+        STREAMERS[fmt](kind, rows),
+        content_type=EXPORT_FORMATS[fmt]
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{kind}_logs.{fmt}"')
+    return response
+
+
+# read-only JSON summaries for polling clients
+
+SUMMARY_PANELS = {
+    'day': get_day_summary,
+    'calendar-week': get_calendar_week_summary,
+    'rolling-week': get_rolling_week_summary,
+    'year': get_year_summary,
+}
+
+
+def _summary_args(request, panel):
+    """
+    Positional arguments for a summary panel, or None if the request is
+    invalid
+    """
+    if panel not in SUMMARY_PANELS:
+        return None
+    if panel != 'year':
+        return ()
+    year = request.GET.get('year')
+    if not year:
+        return ()
+    # isdigit alone is true of digits int() rejects, like '²'
+    if not (year.isascii() and year.isdigit()):
+        return None
+    # the window runs to the start of the next year, which must exist too
+    if not MINYEAR <= int(year) < MAXYEAR:
+        return None
+    return (int(year),)
+
+
+def _summary_etag(request, panel):
+    # the data version is a single cache read, so a client revalidating
+    # unchanged data gets its 304 before any aggregate is computed; the
+    # local date is included as "today" moves the day and week panels
+    args = _summary_args(request, panel)
+    if args is None:
+        return None
+    version = data_version(request.user.pk)
+    parts = [panel, *args, timezone.localdate(), version]
+    return '-'.join(map(str, parts))
+
+
+@login_required
+@require_safe
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_summary_etag)
+def summary_api(request, panel):
+    args = _summary_args(request, panel)
+    if panel not in SUMMARY_PANELS:
+        raise Http404("Unknown summary")
+    if args is None:
+        return JsonResponse(
+            {'error': f"year must be from {MINYEAR} to {MAXYEAR - 1}"},
+            status=400)
+
+    summary = SUMMARY_PANELS[panel](request.user, *args)
+    return JsonResponse(summary)
+
+
+@login_required
+@require_safe
+def history_api(request, kind):
+    if kind not in EXPORT_KINDS:
+        raise Http404("Unknown log kind")
+    model, fields = EXPORT_KINDS[kind]
+
+    try:
+        page_size = min(
+            int(request.GET.get('page_size', PAGE_SIZE)), MAX_PAGE_SIZE)
+        if page_size < 1:
+            raise ValueError
+        logs, next_cursor = keyset_page(
+            model.objects.filter(user=request.user).only('id', *fields),
+            request.GET.get('cursor'),
+            page_size
+        )
+    except ValueError:
+        # InvalidCursor is a ValueError
+        return HttpResponseBadRequest("Invalid page_size or cursor")
+
+    return JsonResponse({
+        'results': [
+            {'id': log.pk, **{field: getattr(log, field) for field in fields}}
+            for log in logs
+        ],
+        'next_cursor': next_cursor,
+    })
+
+
+# meal name suggestions, see autocomplete.py
+
+
+@login_required
+@require_safe
+def meal_autocomplete(request):
+    return JsonResponse({
+        'results': suggest_meals(request.user.pk, request.GET.get('q', '')),
+    })
+
+
+# frequent meals to log again, see FrequentMeal
+
+
+def _quick_meals(user):
+    """
+    The user's top FrequentMeals as (meal type, label, meals) triples
+    """
+    by_type = {}
+    for meal in FrequentMeal.top_for_user(user):
+        by_type.setdefault(meal.meal_type, []).append(meal)
+    return [
+        (meal_type, label, by_type[meal_type])
+        for meal_type, label in FoodLog.MEAL_CHOICES
+        if meal_type in by_type
+    ]
+
+
+@login_required
+@require_safe
+def quick_log_api(request):
+    return JsonResponse({
+        'results': {
+            meal_type: [
+                {
+                    'id': meal.pk,
+                    'meal_name': meal.meal_name,
+                    'calories_in': meal.calories_in,
+                    'count': meal.count,
+                    'last_used': meal.last_used,
+                }
+                for meal in meals
+            ]
+            for meal_type, _, meals in _quick_meals(request.user)
+        },
+    })
+
+
+# calendar heatmap series, see heatmap.py
+
+
+def _heatmap_range(request):
+    """
+    The requested (start, end) dates, by default the year up to today
+
+    Raises ValueError for malformed dates or a span over MAX_DAYS.
+    """
+    end = request.GET.get('end')
+    end = date.fromisoformat(end) if end else timezone.localdate()
+    start = request.GET.get('start')
+    start = (
+        date.fromisoformat(start) if start
+        else end - timedelta(days=364)
+    )
+    if not 0 < (end - start).days + 1 <= MAX_DAYS:
+        raise ValueError(f"Span must be 1 to {MAX_DAYS} days")
+    return start, end
+
+
+def _heatmap_etag(request):
+    try:
+        start, end = _heatmap_range(request)
+    except ValueError:
+        return None
+    version = data_version(request.user.pk)
+    return f'heatmap-{start}-{end}-{version}'
+
+
+@login_required
+@require_safe
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_heatmap_etag)
+def heatmap_api(request):
+    try:
+        start, end = _heatmap_range(request)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    return JsonResponse(get_heatmap(request.user, start, end))
+
+
+# weight history chart series
+
+
+@login_required
+@require_safe
+def weight_series_api(request):
+    try:
+        points = min(
+            int(request.GET.get('points', DEFAULT_POINTS)), MAX_POINTS)
+        if points < 3:
+            raise ValueError
+        dates = {}
+        for param in ('start', 'end'):
+            value = request.GET.get(param)
+            dates[param] = date.fromisoformat(value) if value else None
+    except ValueError:
+        return HttpResponseBadRequest(
+            "points must be a number from 3 and dates YYYY-MM-DD")
+
+    tzinfo = user_timezone(request.user)
+    start = dates['start'] and datetime.combine(
+        dates['start'], time.min, tzinfo=tzinfo)
+    end = dates['end'] and datetime.combine(
+        dates['end'], time.max, tzinfo=tzinfo)
+    series, count = weight_series(request.user, points, start, end)
+    return JsonResponse({
+        'count': count,
+        'points': [
+            [measured_at, float(weight)] for measured_at, weight in series
+        ],
+    })
+
+
+# request metrics for the Prometheus scraper
+
+
+@staff_member_required
+@require_safe
+def metrics(request):
+    return HttpResponse(
+        render_prometheus(merged_histograms()),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -0,0 +1,61 @@
+from django.db.models import Q
+from django.utils import timezone
+from datetime import timedelta, date
+from calendar import monthrange
+
+# half-open date windows shared by the models, services and tables
+# every window is a (start, end) pair of dates, end exclusive
+
+
+def day_window(day=None):
+    day = day or timezone.localdate()
+    return day, day + timedelta(days=1)
+
+
+def rolling_week_window(reference_date=None):
+    """
+    The last 7 days, including the reference date
+    """
+    reference_date = reference_date or timezone.localdate()
+    start_date = reference_date - timedelta(days=6)
+    return start_date, reference_date + timedelta(days=1)
+
+
+def calendar_week_window(reference_date=None):
+    """
+    Monday to Sunday of the reference date's week
+    """
+    reference_date = reference_date or timezone.localdate()
+    start_of_week = reference_date - timedelta(days=reference_date.weekday())
+    return start_of_week, start_of_week + timedelta(days=7)
+
+
+def month_window(year=None, month=None):
+    if year is None or month is None:
+        today = timezone.localdate()
+        year = year or today.year
+        month = month or today.month
+
+    _, last_day = monthrange(year, month)
+    start_date = date(year, month, 1)
+    return start_date, start_date + timedelta(days=last_day)
+
+
+def year_window(year=None):
+    year = year or timezone.localdate().year
+    return date(year, 1, 1), date(year + 1, 1, 1)
+
+
+def days_window(start_date, end_date):
+    """
+    Window covering start_date to end_date, both inclusive
+    """
+    return start_date, end_date + timedelta(days=1)
+
+
+def date_filter(window, field_name='date'):
+    start_date, end_date = window
+    return Q(**{
+        f'{field_name}__gte': start_date,
+        f'{field_name}__lt': end_date,
+    })
@@ -1,2 +1,55 @@
 //  js for step by step form submission
 
+//  meal name suggestions on the food form, filling in the meal type and
+//  calories last used for the chosen meal when those are still empty
+
+document.addEventListener("DOMContentLoaded", function () {
+    const form = document.querySelector("form[data-autocomplete-url]");
+    if (!form) {
+        return;
+    }
+    const nameInput = form.querySelector("#id_meal_name");
+    const typeInput = form.querySelector("#id_meal_type");
+    const caloriesInput = form.querySelector("#id_calories_in");
+    const datalist = form.querySelector("#meal-suggestions");
+    let suggestions = [];
+    let pending = null;
+
+    nameInput.setAttribute("list", datalist.id);
+    nameInput.setAttribute("autocomplete", "off");
+
+    nameInput.addEventListener("input", function () {
+        const query = nameInput.value.trim();
+        const match = suggestions.find((s) => s.meal_name === query);
+        if (match) {
+            if (!typeInput.value) {
+                typeInput.value = match.meal_type;
+            }
+            if (!caloriesInput.value) {
+                caloriesInput.value = match.calories_in;
+            }
+            return;
+        }
+
+        if (pending) {
+            pending.abort();
+        }
+        if (!query) {
+            datalist.replaceChildren();
+            return;
+        }
+        pending = new AbortController();
+        const url = form.dataset.autocompleteUrl + "?q=" + encodeURIComponent(query);
+        fetch(url, { signal: pending.signal })
+            .then((response) => response.json())
+            .then((data) => {
+                suggestions = data.results;
+                datalist.replaceChildren(...suggestions.map((s) => {
+                    const option = document.createElement("option");
+                    option.value = s.meal_name;
+                    return option;
+                }));
+            })
+            .catch(() => {});
+    });
+});